@@ -0,0 +1,277 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+from sqlalchemy import and_, func, literal_column, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import get_db_session
+from models import Hotel, Room, RoomOffer
+from pricing import to_epoch_seconds
+
+logger = logging.getLogger(__name__)
+
+# Как долго индекс в памяти (SQLite) считается свежим; создание предложений сразу запускает перестройку.
+# Перестройка идёт в фоне, запросы тем временем отвечают по предыдущему индексу
+AVAILABILITY_INDEX_TTL_SECONDS = float(os.getenv("AVAILABILITY_INDEX_TTL_SECONDS", "60"))
+# Интервалов в одном блоке индекса: для блока хранится максимальный end
+AVAILABILITY_BLOCK_SIZE = 1024
+# Цены в индексе могут отставать: кандидатов перепроверяем в БД, первая порция — limit * FACTOR,
+# каждая следующая (если совпадений в БД не хватило) вдвое больше
+AVAILABILITY_CANDIDATE_FACTOR = 4
+
+
+def _period(start, end):
+    return func.tstzrange(start, end, literal_column("'[)'"))
+
+
+class AvailabilityIndex:
+    # Интервальный индекс для SQLite: периоды доступных предложений отсортированы по началу,
+    # для каждого блока из AVAILABILITY_BLOCK_SIZE интервалов хранится максимальный конец.
+    # Запрос «покрывает [start, end)»: префикс с началом <= start (бинарный поиск), из него только блоки
+    # с max_end >= end, внутри блока — векторная проверка NumPy. Тип номера хранится кодом и фильтруется в индексе
+
+    def __init__(self, block_size: int = AVAILABILITY_BLOCK_SIZE):
+        self._block_size = block_size
+        self._starts = np.empty(0)
+        self._ends = np.empty(0)
+        self._prices = np.empty(0)
+        self._offer_ids = np.empty(0, dtype=np.int64)
+        self._room_ids = np.empty(0, dtype=np.int64)
+        self._room_types = np.empty(0, dtype=np.int32)
+        self._room_type_codes: dict[str, int] = {}
+        self._block_max_end = np.empty(0)
+        self._built_at: float | None = None
+        self._ready = False
+        # Растёт при каждом invalidate: перестройка, начатая до него, не считается свежей
+        self._generation = 0
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+
+    def __len__(self) -> int:
+        return len(self._offer_ids)
+
+    def _prepare(self, rows) -> tuple:
+        # rows: (offer_id, room_id, room_type, start_date, end_date, price). Без обращений к self-состоянию,
+        # кроме block_size: выполняется в потоке, пока запросы читают текущие массивы
+        room_type_codes: dict[str, int] = {}
+        if rows:
+            offer_ids, room_ids, room_types, starts, ends, prices = zip(*rows)
+        else:
+            offer_ids = room_ids = room_types = starts = ends = prices = ()
+        starts = np.array([to_epoch_seconds(s) for s in starts], dtype=np.float64)
+        order = np.argsort(starts, kind="stable")
+        ends = np.array([to_epoch_seconds(e) for e in ends], dtype=np.float64)[order]
+        if len(order):
+            block_max_end = np.maximum.reduceat(ends, np.arange(0, len(order), self._block_size))
+        else:
+            block_max_end = np.empty(0)
+        return (
+            starts[order],
+            ends,
+            np.asarray(prices, dtype=np.float64)[order],
+            np.asarray(offer_ids, dtype=np.int64)[order],
+            np.asarray(room_ids, dtype=np.int64)[order],
+            np.array([room_type_codes.setdefault(t, len(room_type_codes)) for t in room_types],
+                     dtype=np.int32)[order],
+            room_type_codes,
+            block_max_end,
+        )
+
+    def _install(self, arrays: tuple, fresh: bool) -> None:
+        # Все массивы подменяются разом (без await между присваиваниями)
+        (self._starts, self._ends, self._prices, self._offer_ids, self._room_ids, self._room_types,
+         self._room_type_codes, self._block_max_end) = arrays
+        self._ready = True
+        self._built_at = time.monotonic() if fresh else None
+
+    def build(self, rows) -> None:
+        self._install(self._prepare(rows), fresh=True)
+
+    def invalidate(self) -> None:
+        self._built_at = None
+        self._generation += 1
+        self.schedule_refresh()
+
+    def is_fresh(self, ttl: float = AVAILABILITY_INDEX_TTL_SECONDS) -> bool:
+        return self._built_at is not None and time.monotonic() - self._built_at < ttl
+
+    async def refresh(self, db: AsyncSession) -> None:
+        async with self._lock:
+            if self.is_fresh():
+                return
+            started = time.perf_counter()
+            generation = self._generation
+            result = await db.execute(
+                select(RoomOffer.id, RoomOffer.room_id, Room.room_type, RoomOffer.start_date, RoomOffer.end_date,
+                       RoomOffer.current_price)
+                .join(Room, Room.id == RoomOffer.room_id)
+                .where(RoomOffer.available > 0)
+            )
+            rows = result.all()
+            # Разбор дат и сортировка миллиона строк — в потоке, чтобы не блокировать event loop
+            arrays = await asyncio.to_thread(self._prepare, rows)
+            self._install(arrays, fresh=generation == self._generation)
+            logger.info(f"Availability index: {len(rows)} offers in {time.perf_counter() - started:.2f}s")
+
+    def schedule_refresh(self) -> asyncio.Task | None:
+        # Перестройка в фоне со своей сессией; вне event loop (синхронный код) не запускается
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return None
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._refresh_in_background())
+        return self._task
+
+    async def _refresh_in_background(self) -> None:
+        try:
+            async with get_db_session() as db:
+                await self.refresh(db)
+        except Exception:
+            logger.exception("Availability index rebuild failed")
+
+    async def ensure(self) -> None:
+        # Устаревший индекс перестраивается в фоне; запрос ждёт только самую первую сборку
+        if self.is_fresh():
+            return
+        task = self.schedule_refresh()
+        if not self._ready and task is not None:
+            # shield: отмена запроса не прерывает общую перестройку
+            await asyncio.shield(task)
+            if not self._ready:
+                raise RuntimeError("Availability index is not built")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def covering(self, start: float, end: float) -> np.ndarray:
+        # Позиции интервалов с start_date <= start и end_date >= end
+        prefix = int(np.searchsorted(self._starts, start, side="right"))
+        if prefix == 0:
+            return np.empty(0, dtype=np.int64)
+        blocks = np.flatnonzero(self._block_max_end[:(prefix - 1) // self._block_size + 1] >= end)
+        matches = []
+        for block in blocks.tolist():
+            lo = block * self._block_size
+            hi = min(lo + self._block_size, prefix)
+            matches.append(lo + np.flatnonzero(self._ends[lo:hi] >= end))
+        return np.concatenate(matches) if matches else np.empty(0, dtype=np.int64)
+
+    def cheapest_per_room(self, start: float, end: float, room_type: str | None = None) -> np.ndarray:
+        # offer_id самого дешёвого (по цене в индексе) предложения каждого номера, по возрастанию цены
+        positions = self.covering(start, end)
+        if room_type is not None:
+            code = self._room_type_codes.get(room_type)
+            if code is None:
+                return np.empty(0, dtype=np.int64)
+            positions = positions[self._room_types[positions] == code]
+        positions = positions[np.argsort(self._prices[positions], kind="stable")]
+        # Первое вхождение номера в отсортированном по цене списке — его самое дешёвое предложение
+        _, first = np.unique(self._room_ids[positions], return_index=True)
+        return self._offer_ids[positions[np.sort(first)]]
+
+
+availability_index = AvailabilityIndex()
+
+
+def _result_columns():
+    return (
+        RoomOffer.id, RoomOffer.current_price, RoomOffer.start_date, RoomOffer.end_date, RoomOffer.available,
+        Room.id, Room.room_number, Room.room_type,
+        Hotel.id, Hotel.name, Hotel.address, Hotel.rating,
+    )
+
+
+def _to_dicts(rows) -> list[dict]:
+    return [
+        {
+            "offer_id": offer_id,
+            "current_price": price,
+            "start_date": start_date,
+            "end_date": end_date,
+            "available": available,
+            "room": {"id": room_id, "room_number": room_number, "room_type": room_type},
+            "hotel": {"id": hotel_id, "name": name, "address": address, "rating": rating},
+        }
+        for (offer_id, price, start_date, end_date, available, room_id, room_number, room_type,
+             hotel_id, name, address, rating) in rows
+    ]
+
+
+async def _search_postgres(db: AsyncSession, start: datetime, end: datetime, limit: int,
+                           room_type: str | None, max_price: float | None) -> list[dict]:
+    # tstzrange(start_date, end_date) @> окно — по GiST-индексу ix_room_offers_period_gist
+    # (частичный, available > 0); самое дешёвое предложение на номер — row_number()
+    ranked = (
+        select(
+            RoomOffer.id,
+            func.row_number().over(
+                partition_by=RoomOffer.room_id, order_by=(RoomOffer.current_price, RoomOffer.id)
+            ).label("rank")
+        )
+        .where(
+            # Литерал, а не параметр: иначе планировщик не докажет условие частичного индекса
+            RoomOffer.available > literal_column("0"),
+            _period(RoomOffer.start_date, RoomOffer.end_date).op("@>")(_period(start, end)),
+        )
+    )
+    if max_price is not None:
+        ranked = ranked.where(RoomOffer.current_price <= max_price)
+    if room_type is not None:
+        ranked = ranked.join(Room, Room.id == RoomOffer.room_id).where(Room.room_type == room_type)
+    ranked = ranked.subquery()
+    result = await db.execute(
+        select(*_result_columns())
+        .join(ranked, and_(ranked.c.id == RoomOffer.id, ranked.c.rank == 1))
+        .join(Room, Room.id == RoomOffer.room_id)
+        .join(Hotel, Hotel.id == Room.hotel_id)
+        .order_by(RoomOffer.current_price, RoomOffer.id)
+        .limit(limit)
+    )
+    return _to_dicts(result.all())
+
+
+async def _search_memory(db: AsyncSession, start: datetime, end: datetime, limit: int,
+                         room_type: str | None, max_price: float | None) -> list[dict]:
+    # Кандидаты из индекса в памяти (тип номера отфильтрован в индексе), затем выборки по id порциями:
+    # актуальные цена и остаток; порции берутся, пока в БД не наберётся limit совпадений
+    await availability_index.ensure()
+    candidates = availability_index.cheapest_per_room(to_epoch_seconds(start), to_epoch_seconds(end), room_type)
+    rows, offset, batch = [], 0, limit * AVAILABILITY_CANDIDATE_FACTOR
+    while offset < len(candidates) and len(rows) < limit:
+        offer_ids = candidates[offset:offset + batch].tolist()
+        offset += len(offer_ids)
+        batch *= 2
+        query = (
+            select(*_result_columns())
+            .join(Room, Room.id == RoomOffer.room_id)
+            .join(Hotel, Hotel.id == Room.hotel_id)
+            .where(RoomOffer.id.in_(offer_ids), RoomOffer.available > 0)
+            .order_by(RoomOffer.current_price, RoomOffer.id)
+            .limit(limit)
+        )
+        if room_type is not None:
+            query = query.where(Room.room_type == room_type)
+        if max_price is not None:
+            query = query.where(RoomOffer.current_price <= max_price)
+        rows.extend((await db.execute(query)).all())
+    # Цены в индексе могут отставать, поэтому порции сливаются по актуальной цене
+    rows.sort(key=lambda row: (row[1], row[0]))
+    return _to_dicts(rows[:limit])
+
+
+async def search_available(db: AsyncSession, start: datetime, end: datetime, limit: int = 50,
+                           room_type: str | None = None, max_price: float | None = None) -> list[dict]:
+    # Номера с бронируемым предложением, период которого целиком покрывает [start, end), по цене
+    # Даты без часового пояса считаются UTC, как в pricing.to_epoch_seconds
+    start, end = (value if value.tzinfo else value.replace(tzinfo=timezone.utc) for value in (start, end))
+    if db.get_bind().dialect.name == "postgresql":
+        return await _search_postgres(db, start, end, limit, room_type, max_price)
+    return await _search_memory(db, start, end, limit, room_type, max_price)
@@ -0,0 +1,361 @@
+# Воспроизводимый нагрузочный прогон API внутри процесса: наполняет БД из DATABASE_URL
+# (Postgres или SQLite) и гоняет регистрацию/логин, список предложений, просмотры, бронирования
+# и WebSocket-ленту цен. Результат — JSON (throughput, p50/p99, SQL-запросов на запрос),
+# который можно сохранять по коммитам и сравнивать.
+# Запуск из корня проекта:
+#   python -m benchmarks.bench_api --hotels 20 --rooms-per-hotel 10 --offers-per-room 5 --output bench.json
+#   python -m benchmarks.bench_api --scenarios list_offers,book --requests 2000 --concurrency 100
+import argparse
+import asyncio
+import json
+import platform
+import random
+import subprocess
+import time
+import uuid
+from datetime import datetime, timedelta, UTC
+
+import httpx
+from sqlalchemy import insert
+
+from main import app
+from database import AsyncSessionLocal, engine
+from migrate import upgrade
+from instrumentation import request_sql_seconds, request_sql_statements, track_queries
+from models import User, Hotel, Room, RoomOffer, OfferView
+from quotes import issue_quote
+from rollups import rebuild_rollups
+from ratelimit import rate_limiter
+from utils import create_access_token, hash_password
+
+SCENARIOS = ("register", "login", "list_offers", "view", "book", "websocket")
+PASSWORD = "bench-password"
+# Строк в одном многострочном INSERT при наполнении
+SEED_CHUNK_SIZE = 1000
+
+
+def _percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def _insert_many(db, model, rows: list[dict]) -> list[int]:
+    ids = []
+    for offset in range(0, len(rows), SEED_CHUNK_SIZE):
+        result = await db.scalars(
+            insert(model).returning(model.id, sort_by_parameter_order=True),
+            rows[offset:offset + SEED_CHUNK_SIZE]
+        )
+        ids.extend(result.all())
+    return ids
+
+
+async def seed(args, rng: random.Random) -> dict:
+    # Данные каждого прогона помечаются run_id, поэтому прогоны можно повторять на одной БД
+    # Схема через миграции: lifespan проверяет версию схемы (SCHEMA_CHECK=strict)
+    await upgrade(engine)
+    run_id = uuid.uuid4().hex[:8]
+    hashed = hash_password(PASSWORD)  # один bcrypt на всех, иначе наполнение упирается в хеширование
+    now = datetime.now(UTC)
+    started = time.perf_counter()
+    async with AsyncSessionLocal() as db:
+        owner_ids = await _insert_many(db, User, [
+            {"email": f"owner-{run_id}-{i}@bench.example", "hashed_password": hashed, "role": "business"}
+            for i in range(max(1, args.hotels // 10))
+        ])
+        user_emails = [f"user-{run_id}-{i}@bench.example" for i in range(args.users)]
+        user_ids = await _insert_many(db, User, [
+            {"email": email, "hashed_password": hashed, "role": "regular"} for email in user_emails
+        ])
+        hotel_ids = await _insert_many(db, Hotel, [
+            {"name": f"Bench hotel {run_id}-{i}", "address": "-", "owner_id": owner_ids[i % len(owner_ids)]}
+            for i in range(args.hotels)
+        ])
+        room_ids = await _insert_many(db, Room, [
+            {"hotel_id": hotel_id, "room_number": str(100 + i), "room_type": rng.choice(("single", "double", "suite"))}
+            for hotel_id in hotel_ids for i in range(args.rooms_per_hotel)
+        ])
+        offers = []
+        for room_id in room_ids:
+            for i in range(args.offers_per_room):
+                start = now + timedelta(days=rng.randint(0, 60))
+                price = round(rng.uniform(50, 500), 2)
+                offers.append({
+                    "room_id": room_id, "start_date": start, "end_date": start + timedelta(days=rng.randint(1, 7)),
+                    "initial_price": price, "current_price": price, "min_price": round(price * 0.6, 2),
+                    "popularity_factor": 1.0, "available": args.available, "created_at": now
+                })
+        offer_ids = await _insert_many(db, RoomOffer, offers)
+        views = [
+            {"offer_id": rng.choice(offer_ids), "timestamp": now - timedelta(minutes=rng.uniform(0, 600))}
+            for _ in range(args.views)
+        ]
+        for offset in range(0, len(views), SEED_CHUNK_SIZE):
+            await db.execute(insert(OfferView), views[offset:offset + SEED_CHUNK_SIZE])
+        await db.commit()
+        await rebuild_rollups(db)
+    tokens = [
+        create_access_token({"sub": email, "uid": user_id, "role": "regular"})
+        for email, user_id in zip(user_emails, user_ids)
+    ]
+    return {
+        "run_id": run_id,
+        "user_emails": user_emails,
+        "tokens": tokens,
+        "offer_ids": offer_ids,
+        "prices": [offer["current_price"] for offer in offers],
+        "hotel_ids": hotel_ids,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def _summary(latencies: list[float], elapsed: float, failures: int, statuses: dict, sql: dict | None) -> dict:
+    return {
+        "requests": len(latencies),
+        "failures": failures,
+        "statuses": statuses,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": round(_percentile(latencies, 0.50) * 1000, 2),
+            "p99": round(_percentile(latencies, 0.99) * 1000, 2),
+            "max": round(max(latencies, default=0.0) * 1000, 2),
+        },
+        "sql": sql,
+    }
+
+
+async def run_http(client: httpx.AsyncClient, count: int, concurrency: int, method: str, route: str,
+                   make_request) -> dict:
+    # make_request(i) -> (url, kwargs); SQL на запрос берётся из гистограммы RequestMetricsMiddleware
+    sql_before = request_sql_statements.totals(method=method, route=route)
+    sql_seconds_before = request_sql_seconds.value(method=method, route=route)
+    latencies: list[float] = []
+    statuses: dict[str, int] = {}
+    failures = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        nonlocal failures
+        url, kwargs = make_request(i)
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            latencies.append(time.perf_counter() - started)
+        statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+        if response.status_code >= 400:
+            failures += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(count)))
+    elapsed = time.perf_counter() - started
+
+    statements, observed = request_sql_statements.totals(method=method, route=route)
+    observed -= sql_before[1]
+    sql = {
+        "statements_per_request": round((statements - sql_before[0]) / observed, 2) if observed else None,
+        "sql_ms_per_request": round(
+            (request_sql_seconds.value(method=method, route=route) - sql_seconds_before) * 1000 / observed, 3
+        ) if observed else None,
+    }
+    return _summary(latencies, elapsed, failures, statuses, sql)
+
+
+async def _websocket_client(path: str, duration: float) -> tuple[float | None, int]:
+    # Минимальный ASGI-клиент WebSocket: httpx не умеет WebSocket, а TestClient работает в своём потоке
+    messages: asyncio.Queue = asyncio.Queue()
+    disconnect = asyncio.Event()
+    connected = False
+
+    async def receive():
+        nonlocal connected
+        if not connected:
+            connected = True
+            return {"type": "websocket.connect"}
+        await disconnect.wait()
+        return {"type": "websocket.disconnect", "code": 1000}
+
+    async def send(message):
+        if message["type"] == "websocket.send":
+            await messages.put(json.loads(message.get("text") or message["bytes"]))
+        elif message["type"] == "websocket.close":
+            disconnect.set()
+
+    scope = {
+        "type": "websocket", "asgi": {"version": "3.0"}, "scheme": "ws", "http_version": "1.1",
+        "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"",
+        "headers": [(b"host", b"bench")], "client": ("127.0.0.1", 0), "server": ("bench", 80),
+        "subprotocols": [], "state": {},
+    }
+    started = time.perf_counter()
+    task = asyncio.create_task(app(scope, receive, send))
+    first_message = None
+    received = 0
+    deadline = started + duration
+    try:
+        while (remaining := deadline - time.perf_counter()) > 0:
+            try:
+                message = await asyncio.wait_for(messages.get(), remaining)
+            except asyncio.TimeoutError:
+                break
+            if "error" in message:
+                break
+            received += 1
+            if first_message is None:
+                first_message = time.perf_counter() - started
+    finally:
+        disconnect.set()
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+    return first_message, received
+
+
+async def run_websocket(offer_ids: list[int], clients: int, duration: float) -> dict:
+    # WebSocket не проходит через HTTP-middleware: SQL считается на весь сценарий
+    # (рукопожатия и тикеры цен наследуют контекст этой задачи)
+    with track_queries("bench_websocket") as stats:
+        started = time.perf_counter()
+        results = await asyncio.gather(*(
+            _websocket_client(f"/api/hotels/ws/rooms/offers/{offer_ids[i % len(offer_ids)]}", duration)
+            for i in range(clients)
+        ))
+        elapsed = time.perf_counter() - started
+    first = [latency for latency, _ in results if latency is not None]
+    messages = sum(received for _, received in results)
+    return {
+        "connections": clients,
+        "offers": min(clients, len(offer_ids)),
+        "failures": clients - len(first),
+        "seconds": round(elapsed, 3),
+        "messages": messages,
+        "messages_per_sec": round(messages / elapsed, 1) if elapsed else 0.0,
+        "first_price_ms": {
+            "p50": round(_percentile(first, 0.50) * 1000, 2),
+            "p99": round(_percentile(first, 0.99) * 1000, 2),
+        },
+        "sql": {
+            "statements": stats.statements,
+            "statements_per_connection": round(stats.statements / clients, 2) if clients else None,
+            "statements_per_message": round(stats.statements / messages, 3) if messages else None,
+        },
+    }
+
+
+async def main(args):
+    rng = random.Random(args.seed)
+    data = await seed(args, rng)
+    offer_ids, tokens = data["offer_ids"], data["tokens"]
+    auth = [{"Authorization": f"Bearer {token}"} for token in tokens]
+    scenarios = [name for name in args.scenarios.split(",") if name]
+    results = {}
+    # Бенчмарк меряет сами обработчики: без --rate-limit лимиты запросов отключены
+    rate_limiter.enabled = args.rate_limit
+
+    # Lifespan нужен для буфера просмотров и ленты цен; ASGITransport его сам не запускает
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for name in scenarios:
+                if name == "register":
+                    results[name] = await run_http(
+                        client, args.auth_requests, args.concurrency, "POST", "/api/users/register",
+                        lambda i: ("/api/users/register", {"json": {
+                            "email": f"new-{data['run_id']}-{i}@bench.example", "password": PASSWORD, "role": "regular"
+                        }})
+                    )
+                elif name == "login":
+                    results[name] = await run_http(
+                        client, args.auth_requests, args.concurrency, "POST", "/api/users/login",
+                        lambda i: ("/api/users/login", {"json": {
+                            "email": data["user_emails"][i % len(data["user_emails"])], "password": PASSWORD
+                        }})
+                    )
+                elif name == "list_offers":
+                    def list_request(i):
+                        params = {"limit": args.page_size, "sort": rng.choice(("id", "price"))}
+                        if i % 2:
+                            params["available_only"] = "true"
+                        if i % 3 == 0:
+                            params["hotel_id"] = rng.choice(data["hotel_ids"])
+                        return "/api/hotels/rooms/offers/", {"params": params, "headers": auth[i % len(auth)]}
+
+                    results[name] = await run_http(
+                        client, args.requests, args.concurrency, "GET", "/api/hotels/rooms/offers/", list_request
+                    )
+                elif name == "view":
+                    results[name] = await run_http(
+                        client, args.requests, args.concurrency, "POST", "/api/hotels/rooms/offers/{offer_id}/view",
+                        lambda i: (f"/api/hotels/rooms/offers/{rng.choice(offer_ids)}/view", {})
+                    )
+                elif name == "book":
+                    def book_request(i):
+                        # Котировка выдаётся так же, как в списке предложений или WebSocket-ленте
+                        index = rng.randrange(len(offer_ids))
+                        quote = issue_quote(offer_ids[index], data["prices"][index])
+                        return f"/api/hotels/rooms/offers/{offer_ids[index]}/book", {
+                            "params": {"quote": quote.token},
+                            "headers": {**auth[i % len(auth)], "Idempotency-Key": uuid.uuid4().hex},
+                        }
+
+                    results[name] = await run_http(
+                        client, args.requests, args.concurrency, "POST", "/api/hotels/rooms/offers/{offer_id}/book",
+                        book_request
+                    )
+                elif name == "websocket":
+                    results[name] = await run_websocket(
+                        rng.sample(offer_ids, min(args.ws_offers, len(offer_ids))), args.ws_clients, args.ws_seconds
+                    )
+                else:
+                    raise SystemExit(f"Неизвестный сценарий: {name}")
+
+    await engine.dispose()
+    report = {
+        "benchmark": "api",
+        "commit": _git_commit(),
+        "started_at": datetime.now(UTC).isoformat(),
+        "database": engine.dialect.name,
+        "python": platform.python_version(),
+        "params": {key: value for key, value in vars(args).items() if key != "output"},
+        "seed": {
+            "users": args.users, "hotels": args.hotels, "rooms": len(data["hotel_ids"]) * args.rooms_per_hotel,
+            "offers": len(offer_ids), "views": args.views, "seconds": data["seconds"],
+        },
+        "scenarios": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--hotels", type=int, default=20)
+    parser.add_argument("--rooms-per-hotel", type=int, default=10)
+    parser.add_argument("--offers-per-room", type=int, default=5)
+    parser.add_argument("--views", type=int, default=10000)
+    parser.add_argument("--available", type=int, default=1000, help="мест в каждом предложении")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=500, help="запросов на сценарий")
+    parser.add_argument("--auth-requests", type=int, default=50, help="запросов регистрации/логина (bcrypt)")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--ws-clients", type=int, default=100)
+    parser.add_argument("--ws-offers", type=int, default=10, help="сколько разных предложений у WebSocket-клиентов")
+    parser.add_argument("--ws-seconds", type=float, default=5.0)
+    parser.add_argument("--seed", type=int, default=42, help="seed генератора данных и запросов")
+    parser.add_argument("--rate-limit", action="store_true", help="не отключать лимиты запросов")
+    parser.add_argument("--output", help="дополнительно записать JSON-отчёт в файл")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,127 @@
+# Поиск доступных номеров на даты при 1M предложений: полный просмотр (start_date <= окно,
+# end_date >= окно без индекса по периоду) против search_available — GiST по tstzrange в Postgres
+# или интервальный индекс в памяти для SQLite.
+# Запуск из корня проекта (нужен DATABASE_URL):
+#   python -m benchmarks.bench_availability --offers 1000000 --queries 200
+#   python -m benchmarks.bench_availability --skip-seed --queries 500   # повторный прогон на тех же данных
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from datetime import datetime, timedelta, UTC
+
+from sqlalchemy import func, insert, select
+
+from availability import availability_index, search_available
+from database import AsyncSessionLocal, engine
+from migrate import upgrade
+from models import User, Hotel, Room, RoomOffer
+
+SEED_CHUNK_SIZE = 5000
+
+
+def _percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+async def seed(args, rng: random.Random, base: datetime) -> None:
+    await upgrade(engine)
+    async with AsyncSessionLocal() as db:
+        user = User(email=f"bench-{uuid.uuid4().hex}@example.com", hashed_password="-", role="business")
+        db.add(user)
+        await db.flush()
+        hotel_ids = (await db.scalars(
+            insert(Hotel).returning(Hotel.id, sort_by_parameter_order=True),
+            [{"name": f"Bench hotel {i}", "address": "-", "owner_id": user.id} for i in range(args.hotels)]
+        )).all()
+        room_ids = (await db.scalars(
+            insert(Room).returning(Room.id, sort_by_parameter_order=True),
+            [{"hotel_id": hotel_ids[i % len(hotel_ids)], "room_number": str(i), "room_type": rng.choice(("single", "double"))}
+             for i in range(args.rooms)]
+        )).all()
+        await db.commit()
+        started = time.perf_counter()
+        for offset in range(0, args.offers, SEED_CHUNK_SIZE):
+            rows = []
+            for _ in range(min(SEED_CHUNK_SIZE, args.offers - offset)):
+                start = base + timedelta(hours=rng.randrange(0, args.horizon_days * 24))
+                price = round(rng.uniform(50, 500), 2)
+                rows.append({
+                    "room_id": rng.choice(room_ids), "start_date": start,
+                    "end_date": start + timedelta(days=rng.randint(1, 14)), "initial_price": price,
+                    "current_price": price, "min_price": price * 0.6, "popularity_factor": 1.0,
+                    "available": 0 if rng.random() < 0.2 else rng.randint(1, 5), "created_at": base
+                })
+            await db.execute(insert(RoomOffer), rows)
+            await db.commit()
+        print(f"Seeded {args.offers} offers in {time.perf_counter() - started:.1f}s")
+
+
+async def full_scan(db, start: datetime, end: datetime, limit: int) -> list:
+    # Без индекса по периоду: условие по двум колонкам, сортировка по цене
+    result = await db.execute(
+        select(RoomOffer.id, RoomOffer.room_id, RoomOffer.current_price)
+        .where(RoomOffer.available > 0, RoomOffer.start_date <= start, RoomOffer.end_date >= end)
+        .order_by(RoomOffer.current_price, RoomOffer.id)
+        .limit(limit * 4)
+    )
+    return result.all()
+
+
+async def measure(name: str, windows, run) -> dict:
+    latencies, results = [], 0
+    for start, end in windows:
+        started = time.perf_counter()
+        results += len(await run(start, end))
+        latencies.append(time.perf_counter() - started)
+    return {
+        "queries": len(windows),
+        "p50_ms": round(_percentile(latencies, 0.50) * 1000, 2),
+        "p99_ms": round(_percentile(latencies, 0.99) * 1000, 2),
+        "avg_results": round(results / len(windows), 1),
+    }
+
+
+async def main(args):
+    rng = random.Random(args.seed)
+    base = datetime(2030, 1, 1, tzinfo=UTC)
+    if not args.skip_seed:
+        await seed(args, rng, base)
+    windows = []
+    for _ in range(args.queries):
+        start = base + timedelta(days=rng.uniform(0, args.horizon_days))
+        windows.append((start, start + timedelta(days=rng.randint(1, 5))))
+
+    report = {"dialect": engine.dialect.name, "limit": args.limit}
+    async with AsyncSessionLocal() as db:
+        report["offers"] = (await db.execute(select(func.count(RoomOffer.id)))).scalar_one()
+        report["full_scan"] = await measure("full_scan", windows, lambda s, e: full_scan(db, s, e, args.limit))
+        if engine.dialect.name != "postgresql":
+            started = time.perf_counter()
+            availability_index.invalidate()
+            await availability_index.refresh(db)
+            report["memory_index_build_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        report["search_available"] = await measure(
+            "search_available", windows, lambda s, e: search_available(db, s, e, args.limit)
+        )
+    await engine.dispose()
+    report["speedup_p50"] = round(report["full_scan"]["p50_ms"] / max(report["search_available"]["p50_ms"], 1e-3), 1)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--offers", type=int, default=1_000_000)
+    parser.add_argument("--rooms", type=int, default=50_000)
+    parser.add_argument("--hotels", type=int, default=2_000)
+    parser.add_argument("--horizon-days", type=int, default=365)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--skip-seed", action="store_true", help="использовать уже наполненную БД")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,127 @@
+# Бенчмарк бронирования одного "горячего" предложения множеством параллельных клиентов.
+# Сравнивает старый путь (SELECT ... FOR UPDATE, расчёт цены, UPDATE) с условным UPDATE ... RETURNING.
+# Запуск из корня проекта (нужен DATABASE_URL, осмысленные цифры — на Postgres):
+#   python -m benchmarks.bench_booking --workers 50 --duration 10
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from datetime import datetime, timedelta, UTC
+
+from sqlalchemy import select, update, delete
+
+from database import AsyncSessionLocal, engine
+from migrate import upgrade
+from models import User, Hotel, Room, RoomOffer, Booking
+from pricing import calculate_dynamic_price
+
+
+async def seed_offer(available: int) -> tuple[int, int]:
+    await upgrade(engine)
+    async with AsyncSessionLocal() as db:
+        user = User(email=f"bench-{uuid.uuid4().hex}@example.com", hashed_password="-", role="business")
+        db.add(user)
+        await db.flush()
+        hotel = Hotel(name="Bench hotel", address="-", owner_id=user.id)
+        db.add(hotel)
+        await db.flush()
+        room = Room(hotel_id=hotel.id, room_number="1", room_type="single")
+        db.add(room)
+        await db.flush()
+        now = datetime.now(UTC)
+        offer = RoomOffer(
+            room_id=room.id, start_date=now, end_date=now + timedelta(days=1), initial_price=100.0,
+            current_price=100.0, min_price=50.0, popularity_factor=1.0, available=available
+        )
+        db.add(offer)
+        await db.commit()
+        return user.id, offer.id
+
+
+async def book_locking(offer_id: int, user_id: int) -> bool:
+    # Путь до изменения: блокировка строки на всё время расчёта цены
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(RoomOffer).filter(RoomOffer.id == offer_id).with_for_update())
+        offer = result.scalar_one()
+        if offer.available <= 0:
+            await db.rollback()
+            return False
+        calculate_dynamic_price(offer)
+        offer.available -= 1
+        await db.commit()
+        return True
+
+
+async def book_atomic(offer_id: int, user_id: int) -> bool:
+    # Путь book_offer: чтение без блокировки, запись бронирования и условный UPDATE ... RETURNING
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(RoomOffer).filter(RoomOffer.id == offer_id))
+        offer = result.scalar_one()
+        if offer.available <= 0:
+            return False
+        price = calculate_dynamic_price(offer)
+        db.add(Booking(offer_id=offer_id, user_id=user_id, price=price, idempotency_key=uuid.uuid4().hex))
+        await db.flush()
+        result = await db.execute(
+            update(RoomOffer)
+            .where(RoomOffer.id == offer_id, RoomOffer.available > 0)
+            .values(available=RoomOffer.available - 1)
+            .returning(RoomOffer.available)
+        )
+        if result.scalar_one_or_none() is None:
+            await db.rollback()
+            return False
+        await db.commit()
+        return True
+
+
+async def run_mode(book, workers: int, duration: float, available: int) -> dict:
+    user_id, offer_id = await seed_offer(available)
+    booked = failed = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        nonlocal booked, failed
+        while time.perf_counter() < deadline:
+            try:
+                if await book(offer_id, user_id):
+                    booked += 1
+                else:
+                    return
+            except Exception:
+                failed += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    elapsed = time.perf_counter() - started
+
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(Booking).where(Booking.offer_id == offer_id))
+        await db.commit()
+    return {
+        "bookings": booked,
+        "errors": failed,
+        "seconds": round(elapsed, 3),
+        "bookings_per_sec": round(booked / elapsed, 1) if elapsed else 0.0
+    }
+
+
+async def main(args):
+    report = {
+        "database": engine.dialect.name,
+        "workers": args.workers,
+        "duration": args.duration,
+        "locking": await run_mode(book_locking, args.workers, args.duration, args.available),
+        "atomic": await run_mode(book_atomic, args.workers, args.duration, args.available),
+    }
+    await engine.dispose()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bookings/sec on one contested offer")
+    parser.add_argument("--workers", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--available", type=int, default=1_000_000)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,94 @@
+# Нагрузочный тест логина: параллельные POST /api/users/login внутри процесса
+# и задержка event loop, которую в это время видят остальные корутины (WebSocket, бронирования).
+# Запуск из корня проекта (нужен DATABASE_URL):
+#   python -m benchmarks.bench_login --concurrency 50 --logins 500
+#   PASSWORD_HASH_WORKERS=0 python -m benchmarks.bench_login   # bcrypt прямо в event loop, как раньше
+import argparse
+import asyncio
+import json
+import time
+import uuid
+
+import httpx
+
+from main import app, init_db
+from database import engine
+from utils import PASSWORD_HASH_WORKERS, password_queue_depth
+
+
+def _percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+async def monitor_loop_lag(interval: float, samples: list[float], stop: asyncio.Event) -> None:
+    # Опоздание пробуждения после sleep(interval) = время, на которое event loop был занят
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(time.perf_counter() - started - interval)
+
+
+async def main(args):
+    await init_db()
+    email = f"bench-{uuid.uuid4().hex}@example.com"
+    credentials = {"email": email, "password": "bench-password"}
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        response = await client.post("/api/users/register", json={**credentials, "role": "regular"})
+        response.raise_for_status()
+
+        latencies: list[float] = []
+        lag_samples: list[float] = []
+        max_queue_depth = 0.0
+        failures = 0
+        semaphore = asyncio.Semaphore(args.concurrency)
+        stop = asyncio.Event()
+
+        async def login():
+            nonlocal failures, max_queue_depth
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.post("/api/users/login", json=credentials)
+                latencies.append(time.perf_counter() - started)
+                max_queue_depth = max(max_queue_depth, password_queue_depth.value())
+                if response.status_code != 200:
+                    failures += 1
+
+        monitor = asyncio.create_task(monitor_loop_lag(args.lag_interval, lag_samples, stop))
+        started = time.perf_counter()
+        await asyncio.gather(*(login() for _ in range(args.logins)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await monitor
+
+    await engine.dispose()
+    print(json.dumps({
+        "password_hash_workers": PASSWORD_HASH_WORKERS,
+        "concurrency": args.concurrency,
+        "logins": args.logins,
+        "failures": failures,
+        "seconds": round(elapsed, 3),
+        "logins_per_sec": round(args.logins / elapsed, 1),
+        "latency_ms": {
+            "p50": round(_percentile(latencies, 0.50) * 1000, 2),
+            "p99": round(_percentile(latencies, 0.99) * 1000, 2),
+        },
+        "event_loop_lag_ms": {
+            "p50": round(_percentile(lag_samples, 0.50) * 1000, 2),
+            "p99": round(_percentile(lag_samples, 0.99) * 1000, 2),
+            "max": round(max(lag_samples, default=0.0) * 1000, 2),
+        },
+        "max_queue_depth": max_queue_depth,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Login throughput and event loop lag")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--logins", type=int, default=500)
+    parser.add_argument("--lag-interval", type=float, default=0.01)
+    asyncio.run(main(parser.parse_args()))
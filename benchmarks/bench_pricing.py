@@ -0,0 +1,89 @@
+# Микробенчмарк расчёта цен: векторный dynamic_prices против поштучного calculate_dynamic_price.
+# Запуск из корня проекта (БД не нужна):
+#   python -m benchmarks.bench_pricing --offers 1000000
+import argparse
+import json
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import numpy as np
+
+from pricing import calculate_dynamic_price, dynamic_prices, price_tick
+
+
+def make_offers(count: int, seed: int) -> dict[str, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    now = time.time()
+    initial_price = rng.uniform(50, 500, count)
+    return {
+        "offer_ids": np.arange(1, count + 1, dtype=np.int64),
+        "initial_price": initial_price,
+        "min_price": initial_price * rng.uniform(0.3, 0.8, count),
+        "popularity_factor": rng.uniform(0, 10, count),
+        "created_at": now - rng.uniform(0, 72 * 3600, count),
+    }
+
+
+def best_of(repeat: int, func) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main(args):
+    offers = make_offers(args.offers, args.seed)
+    now = time.time()
+    tick = price_tick(now)
+    columns = (offers["initial_price"], offers["min_price"], offers["popularity_factor"], offers["created_at"])
+
+    random_noise = best_of(args.repeat, lambda: dynamic_prices(
+        *columns, now=now, rng=np.random.default_rng(args.seed)
+    ))
+    deterministic = best_of(args.repeat, lambda: dynamic_prices(
+        *columns, now=now, offer_ids=offers["offer_ids"], tick=tick
+    ))
+
+    # Поштучный путь слишком медленный для 1M строк: меряем на выборке и экстраполируем
+    sample = min(args.scalar_sample, args.offers)
+    scalar_offers = [
+        SimpleNamespace(
+            id=int(offers["offer_ids"][i]),
+            initial_price=float(offers["initial_price"][i]),
+            min_price=float(offers["min_price"][i]),
+            popularity_factor=float(offers["popularity_factor"][i]),
+            created_at=datetime.fromtimestamp(float(offers["created_at"][i]), tz=timezone.utc),
+        )
+        for i in range(sample)
+    ]
+    scalar = best_of(1, lambda: [calculate_dynamic_price(offer, now=now, tick=tick) for offer in scalar_offers])
+    scalar_per_offer = scalar / sample
+
+    # Скалярная обёртка и векторный путь должны давать одинаковые цены при детерминированном шуме
+    vector_prices = dynamic_prices(
+        *(column[:sample] for column in columns), now=now, offer_ids=offers["offer_ids"][:sample], tick=tick
+    )
+    scalar_prices = np.array([calculate_dynamic_price(offer, now=now, tick=tick) for offer in scalar_offers])
+
+    print(json.dumps({
+        "offers": args.offers,
+        "vectorized_random_noise_sec": round(random_noise, 4),
+        "vectorized_deterministic_noise_sec": round(deterministic, 4),
+        "vectorized_offers_per_sec": round(args.offers / deterministic),
+        "scalar_sample": sample,
+        "scalar_sec_extrapolated": round(scalar_per_offer * args.offers, 2),
+        "speedup": round(scalar_per_offer * args.offers / deterministic, 1),
+        "scalar_matches_vectorized": bool(np.allclose(vector_prices, scalar_prices)),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Price 1M offers in one NumPy pass")
+    parser.add_argument("--offers", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--scalar-sample", type=int, default=20_000)
+    parser.add_argument("--seed", type=int, default=42)
+    main(parser.parse_args())
@@ -0,0 +1,117 @@
+# Сериализация большого списка предложений: ORM-объекты + RoomOfferResponse (прежний путь
+# get_room_offers) против SELECT по колонкам + orjson (serialization.py).
+# Запуск из корня проекта (нужен DATABASE_URL):
+#   python -m benchmarks.bench_serialization --offers 10000 --repeat 5
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from datetime import datetime, timedelta, UTC
+
+from sqlalchemy import insert, select
+
+from database import AsyncSessionLocal, engine
+from migrate import upgrade
+from models import User, Hotel, Room, RoomOffer
+from quotes import issue_quote
+from schemas import RoomOfferPage, RoomOfferResponse
+from serialization import OFFER_COLUMNS, FastJSONResponse, offer_to_dict
+
+
+async def seed(count: int) -> int:
+    await upgrade(engine)
+    now = datetime.now(UTC)
+    async with AsyncSessionLocal() as db:
+        user = User(email=f"bench-{uuid.uuid4().hex}@example.com", hashed_password="-", role="business")
+        db.add(user)
+        await db.flush()
+        hotel = Hotel(name="Bench hotel", address="-", owner_id=user.id)
+        db.add(hotel)
+        await db.flush()
+        room = Room(hotel_id=hotel.id, room_number="1", room_type="single")
+        db.add(room)
+        await db.flush()
+        rows = [
+            {"room_id": room.id, "start_date": now + timedelta(days=i % 90), "end_date": now + timedelta(days=i % 90 + 3),
+             "initial_price": 100.0 + i % 400, "current_price": 100.0 + i % 400, "min_price": 60.0,
+             "popularity_factor": 1.0, "available": 5, "created_at": now}
+            for i in range(count)
+        ]
+        for offset in range(0, count, 1000):
+            await db.execute(insert(RoomOffer), rows[offset:offset + 1000])
+        await db.commit()
+        return room.id
+
+
+def _encode_like_fastapi(page: RoomOfferPage) -> bytes:
+    # То, что делает FastAPI с response_model: model_dump(mode="json") и json.dumps в JSONResponse
+    return json.dumps(page.model_dump(mode="json"), ensure_ascii=False, allow_nan=False, indent=None,
+                      separators=(",", ":")).encode("utf-8")
+
+
+async def pydantic_path(room_id: int) -> tuple[float, float, bytes]:
+    started = time.perf_counter()
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(RoomOffer).filter(RoomOffer.room_id == room_id).order_by(RoomOffer.id))
+        offers = result.scalars().all()
+    fetched = time.perf_counter()
+    items = []
+    for offer in offers:
+        item = RoomOfferResponse.model_validate(offer)
+        quote = issue_quote(offer.id, offer.current_price)
+        item.quote, item.quote_expires_at = quote.token, quote.expires_at
+        items.append(item)
+    body = _encode_like_fastapi(RoomOfferPage(items=items, next_cursor=None))
+    return fetched - started, time.perf_counter() - fetched, body
+
+
+async def fast_path(room_id: int) -> tuple[float, float, bytes]:
+    started = time.perf_counter()
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(*OFFER_COLUMNS).filter(RoomOffer.room_id == room_id).order_by(RoomOffer.id)
+        )
+        rows = result.all()
+    fetched = time.perf_counter()
+    body = FastJSONResponse({"items": [offer_to_dict(row) for row in rows], "next_cursor": None}).body
+    return fetched - started, time.perf_counter() - fetched, body
+
+
+def _without_quotes(body: bytes) -> dict:
+    # Котировки содержат срок действия в секундах и могут отличаться между прогонами
+    page = json.loads(body)
+    for item in page["items"]:
+        item.pop("quote")
+        item.pop("quote_expires_at")
+    return page
+
+
+async def main(args):
+    room_id = await seed(args.offers)
+    report = {"offers": args.offers, "repeat": args.repeat}
+    bodies = {}
+    for name, path in (("pydantic", pydantic_path), ("orjson", fast_path)):
+        await path(room_id)  # прогрев
+        fetch_times, encode_times = [], []
+        for _ in range(args.repeat):
+            fetch_seconds, encode_seconds, bodies[name] = await path(room_id)
+            fetch_times.append(fetch_seconds)
+            encode_times.append(encode_seconds)
+        report[name] = {
+            "query_ms": round(min(fetch_times) * 1000, 2),
+            "serialize_ms": round(min(encode_times) * 1000, 2),
+            "total_ms": round(min(f + e for f, e in zip(fetch_times, encode_times)) * 1000, 2),
+            "bytes": len(bodies[name]),
+        }
+    await engine.dispose()
+    report["speedup"] = round(report["pydantic"]["total_ms"] / report["orjson"]["total_ms"], 2)
+    report["same_payload"] = _without_quotes(bodies["pydantic"]) == _without_quotes(bodies["orjson"])
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--offers", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    asyncio.run(main(parser.parse_args()))
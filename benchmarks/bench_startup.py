@@ -0,0 +1,105 @@
+# Холодный старт API-воркера: время импорта main и подготовки схемы при старте
+# (create_all, как было раньше, против проверки версии схемы). Каждый замер — в новом процессе.
+# Запуск из корня проекта (нужен DATABASE_URL):
+#   python -m benchmarks.bench_startup --runs 5
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+
+from database import engine
+from migrate import LATEST_VERSION, upgrade
+
+_IMPORT = """
+import json, sys, time
+started = time.perf_counter()
+import main
+print(json.dumps({"seconds": time.perf_counter() - started,
+                  "modules": len(sys.modules),
+                  "celery_loaded": "celery" in sys.modules}))
+"""
+
+_LIFESPAN = """
+import asyncio, json, time
+import main
+
+async def run():
+    started = time.perf_counter()
+    async with main.app.router.lifespan_context(main.app):
+        ready = time.perf_counter() - started
+    await main.engine.dispose()
+    return ready
+
+print(json.dumps({"seconds": asyncio.run(run())}))
+"""
+
+_CREATE_ALL = """
+import asyncio, json, time
+import main
+from database import Base
+
+async def run():
+    started = time.perf_counter()
+    async with main.engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    elapsed = time.perf_counter() - started
+    await main.engine.dispose()
+    return elapsed
+
+print(json.dumps({"seconds": asyncio.run(run())}))
+"""
+
+_SCHEMA_CHECK = """
+import asyncio, json, time
+import main
+from migrate import check_schema
+
+async def run():
+    started = time.perf_counter()
+    await check_schema(main.engine)
+    elapsed = time.perf_counter() - started
+    await main.engine.dispose()
+    return elapsed
+
+print(json.dumps({"seconds": asyncio.run(run())}))
+"""
+
+
+def _run(code: str, runs: int) -> dict:
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                                env={**os.environ, "AUTO_MIGRATE": "false"}).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    seconds = sorted(sample["seconds"] for sample in samples)
+    result = {"runs": runs, "min_ms": round(seconds[0] * 1000, 1), "median_ms": round(seconds[len(seconds) // 2] * 1000, 1)}
+    for key in ("modules", "celery_loaded"):
+        if key in samples[-1]:
+            result[key] = samples[-1][key]
+    return result
+
+
+async def prepare() -> None:
+    await upgrade(engine)
+    await engine.dispose()
+
+
+def main(args):
+    asyncio.run(prepare())
+    report = {
+        "dialect": engine.dialect.name,
+        "schema_version": LATEST_VERSION,
+        "import_main": _run(_IMPORT, args.runs),
+        "create_all": _run(_CREATE_ALL, args.runs),
+        "schema_check": _run(_SCHEMA_CHECK, args.runs),
+        "lifespan_startup": _run(_LIFESPAN, args.runs),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    main(parser.parse_args())
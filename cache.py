@@ -0,0 +1,202 @@
+import logging
+import os
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+import orjson
+
+from metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+# Общий кэш чтения: memory:// — в памяти процесса, redis://... — общий для всех воркеров
+CACHE_URL = os.getenv("CACHE_URL", "memory://")
+CACHE_SIZE = int(os.getenv("CACHE_SIZE", "10000"))
+
+cache_hits = Counter("cache_hits_total", "Read-through cache hits", ("namespace",))
+cache_misses = Counter("cache_misses_total", "Read-through cache misses", ("namespace",))
+cache_errors = Counter("cache_errors_total", "Cache backend errors (requests fell through to the database)")
+
+_MISSING = object()
+
+
+class TTLCache:
+    # LRU-кэш внутри процесса: запись живёт ttl секунд, при переполнении вытесняется самая старая
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 60.0):
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        item = self._data.get(key, _MISSING)
+        if item is _MISSING:
+            return default
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None) -> None:
+        self._data[key] = (time.monotonic() + (self._ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self._maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class CacheBackend(ABC):
+    # Хранилище байтов с TTL и счётчиками версий пространств имён (версия меняется при инвалидации)
+
+    @abstractmethod
+    async def get(self, key: str) -> bytes | None:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        ...
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        ...
+
+    @abstractmethod
+    async def version(self, namespace: str) -> int:
+        ...
+
+    @abstractmethod
+    async def bump(self, namespace: str) -> None:
+        ...
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryCache(CacheBackend):
+    # Кэш одного процесса; инвалидация видна только этому процессу (для нескольких воркеров — Redis)
+
+    def __init__(self, maxsize: int = CACHE_SIZE):
+        self._data = TTLCache(maxsize=maxsize)
+        # Версии хранятся отдельно: вытеснение из LRU не должно откатывать версию
+        self._versions: dict[str, int] = {}
+
+    async def get(self, key: str) -> bytes | None:
+        return self._data.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        self._data.set(key, value, ttl)
+
+    async def delete(self, key: str) -> None:
+        self._data.delete(key)
+
+    async def version(self, namespace: str) -> int:
+        return self._versions.get(namespace, 0)
+
+    async def bump(self, namespace: str) -> None:
+        self._versions[namespace] = self._versions.get(namespace, 0) + 1
+
+
+class RedisCache(CacheBackend):
+
+    def __init__(self, url: str, prefix: str = "cache"):
+        import redis.asyncio as redis
+
+        self._redis = redis.Redis.from_url(url)
+        self._prefix = prefix
+
+    async def get(self, key: str) -> bytes | None:
+        return await self._redis.get(f"{self._prefix}:{key}")
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        await self._redis.set(f"{self._prefix}:{key}", value, px=int(ttl * 1000))
+
+    async def delete(self, key: str) -> None:
+        await self._redis.delete(f"{self._prefix}:{key}")
+
+    async def version(self, namespace: str) -> int:
+        return int(await self._redis.get(f"{self._prefix}:version:{namespace}") or 0)
+
+    async def bump(self, namespace: str) -> None:
+        await self._redis.incr(f"{self._prefix}:version:{namespace}")
+
+    async def close(self) -> None:
+        await self._redis.aclose()
+
+
+def create_cache_backend(url: str = CACHE_URL) -> CacheBackend:
+    if url.startswith("memory://"):
+        return MemoryCache()
+    if url.startswith(("redis://", "rediss://")):
+        return RedisCache(url)
+    raise ValueError(f"Неизвестный кэш: {url}")
+
+
+class ReadThroughCache:
+    # Значения — JSON (orjson), ключ включает версию пространства имён: invalidate(namespace)
+    # делает недоступными все его записи сразу, старые доживают свой TTL. Ошибки бэкенда не ломают
+    # запрос — значение читается из БД
+
+    def __init__(self, backend: CacheBackend):
+        self.backend = backend
+
+    def use(self, backend: CacheBackend) -> None:
+        # Подмена бэкенда (например, на свежий MemoryCache в тестах)
+        self.backend = backend
+
+    async def _key(self, namespace: str, key: str) -> str:
+        return f"{namespace}:{await self.backend.version(namespace)}:{key}"
+
+    async def get_or_load(self, namespace: str, key: str, loader: Callable[[], Awaitable[Any]],
+                          ttl: float) -> Any:
+        # None от loader не кэшируется (нет строки — спросим БД снова)
+        try:
+            full_key = await self._key(namespace, key)
+            raw = await self.backend.get(full_key)
+        except Exception:
+            logger.exception(f"Cache read failed for {namespace}:{key}")
+            cache_errors.inc()
+            return await loader()
+        if raw is not None:
+            cache_hits.inc(namespace=namespace)
+            return orjson.loads(raw)
+        cache_misses.inc(namespace=namespace)
+        value = await loader()
+        if value is not None:
+            try:
+                await self.backend.set(full_key, orjson.dumps(value, option=orjson.OPT_UTC_Z), ttl)
+            except Exception:
+                logger.exception(f"Cache write failed for {namespace}:{key}")
+                cache_errors.inc()
+        return value
+
+    async def delete(self, namespace: str, key: str) -> None:
+        try:
+            await self.backend.delete(await self._key(namespace, key))
+        except Exception:
+            logger.exception(f"Cache delete failed for {namespace}:{key}")
+            cache_errors.inc()
+
+    async def invalidate(self, namespace: str) -> None:
+        try:
+            await self.backend.bump(namespace)
+        except Exception:
+            logger.exception(f"Cache invalidation failed for {namespace}")
+            cache_errors.inc()
+
+    async def close(self) -> None:
+        await self.backend.close()
+
+
+cache = ReadThroughCache(create_cache_backend())
@@ -1,8 +1,15 @@
 import os
+import time
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
-from typing import AsyncGenerator
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from typing import AsyncGenerator, AsyncIterator
+from metrics import Counter, Gauge
+from instrumentation import install_query_hooks, record_pool_wait
 
 # Загружаем переменные окружения из .env
 load_dotenv()
@@ -11,8 +18,78 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise ValueError("DATABASE_URL не найден в .env файле")
 
+
+def _env_bool(name: str, default: bool) -> bool:
+    return os.getenv(name, str(default)).lower() in ("1", "true", "yes")
+
+
+# Логирование SQL (дорого под нагрузкой, поэтому выключено по умолчанию)
+SQL_ECHO = _env_bool("SQL_ECHO", False)
+# Настройки пула соединений
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = _env_bool("DB_POOL_PRE_PING", True)
+# Кэш подготовленных выражений asyncpg (0 — для pgbouncer в режиме transaction)
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+
+pool_checkouts = Counter("db_pool_checkouts_total", "Connections checked out from the pool")
+pool_wait_seconds = Counter("db_pool_wait_seconds_total", "Time spent waiting for a pooled connection")
+pool_timeouts = Counter("db_pool_timeouts_total", "Pool checkouts that timed out")
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    # Пул, который учитывает время ожидания свободного соединения
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            pool_timeouts.inc()
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            pool_wait_seconds.inc(waited)
+            record_pool_wait(waited)
+
+
+def create_engine_from_env(url: str = DATABASE_URL) -> AsyncEngine:
+    options = {"echo": SQL_ECHO, "pool_pre_ping": DB_POOL_PRE_PING}
+    if not url.startswith("sqlite"):
+        options.update(
+            poolclass=InstrumentedPool,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+        )
+    if "+asyncpg" in url:
+        options["connect_args"] = {
+            "statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+            "prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+        }
+    new_engine = create_async_engine(url, **options)
+    event.listen(new_engine.sync_engine, "checkout", lambda *args: pool_checkouts.inc())
+    install_query_hooks(new_engine)
+    return new_engine
+
+
 # Создаём асинхронный движок SQLAlchemy
-engine = create_async_engine(DATABASE_URL, echo=True)
+engine = create_engine_from_env()
+
+
+def _pool_stat(name: str) -> float:
+    # У StaticPool/NullPool (например, SQLite в памяти) этих счётчиков нет
+    stat = getattr(engine.pool, name, None)
+    return max(stat(), 0) if stat else 0
+
+
+# Текущее состояние пула основного движка (считывается при выдаче /metrics)
+Gauge("db_pool_size", "Configured pool size", callback=lambda: _pool_stat("size"))
+Gauge("db_pool_checked_out", "Connections currently checked out", callback=lambda: _pool_stat("checkedout"))
+Gauge("db_pool_overflow", "Connections open beyond pool_size", callback=lambda: _pool_stat("overflow"))
 
 # Фабрика для создания асинхронных сессий
 AsyncSessionLocal = async_sessionmaker(
@@ -28,10 +105,15 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
         yield session
 
 
-# Удобная функция для получения сессии вручную
-async def get_db_session() -> AsyncSession:
+# Сессия для фоновых задач и кода вне запросов: async with get_db_session() as db
+@asynccontextmanager
+async def get_db_session() -> AsyncIterator[AsyncSession]:
     async with AsyncSessionLocal() as session:
-        return session
+        try:
+            yield session
+        except Exception:
+            await session.rollback()
+            raise
 
 
 # Базовый класс моделей
@@ -0,0 +1,150 @@
+import logging
+import os
+import time
+from collections import Counter as StatementCounter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Iterator
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from metrics import Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+# Одинаковый SQL, выполненный столько раз за запрос или задачу, считается признаком N+1
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "10"))
+
+_SQL_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 500)
+
+request_duration = Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ("method", "route")
+)
+requests_total = Counter("http_requests_total", "HTTP requests", ("method", "route", "status"))
+request_sql_statements = Histogram(
+    "http_request_sql_statements", "SQL statements per HTTP request", ("method", "route"),
+    buckets=_SQL_COUNT_BUCKETS
+)
+request_sql_seconds = Counter(
+    "http_request_sql_seconds_total", "Time spent executing SQL in HTTP requests", ("method", "route")
+)
+request_pool_wait_seconds = Counter(
+    "http_request_pool_wait_seconds_total", "Time HTTP requests waited for a pooled connection", ("method", "route")
+)
+job_duration = Histogram("job_duration_seconds", "Background job duration", ("job",),
+                         buckets=(0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0))
+job_sql_statements = Counter("job_sql_statements_total", "SQL statements executed by background jobs", ("job",))
+job_sql_seconds = Counter("job_sql_seconds_total", "Time background jobs spent executing SQL", ("job",))
+n_plus_one_suspected = Counter(
+    "n_plus_one_suspected_total",
+    "Requests or jobs that repeated the same SQL statement N_PLUS_ONE_THRESHOLD+ times",
+    ("route",)
+)
+
+
+@dataclass
+class QueryStats:
+    statements: int = 0
+    sql_seconds: float = 0.0
+    pool_wait_seconds: float = 0.0
+    by_statement: StatementCounter = field(default_factory=StatementCounter)
+
+
+_current_stats: ContextVar[QueryStats | None] = ContextVar("query_stats", default=None)
+
+
+def current_query_stats() -> QueryStats | None:
+    return _current_stats.get()
+
+
+def record_pool_wait(seconds: float) -> None:
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.pool_wait_seconds += seconds
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Время старта — в контексте выполнения, а не в стеке conn.info: при ошибке запроса after_cursor_execute
+    # не вызывается, и контекст просто уходит вместе с ним
+    context._query_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = context._query_started
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.sql_seconds += time.perf_counter() - started
+        stats.by_statement[statement] += 1
+
+
+def install_query_hooks(engine: AsyncEngine) -> None:
+    event.listen(engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine.sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def _check_n_plus_one(route: str, stats: QueryStats) -> None:
+    if not stats.by_statement:
+        return
+    statement, count = stats.by_statement.most_common(1)[0]
+    if count >= N_PLUS_ONE_THRESHOLD:
+        n_plus_one_suspected.inc(route=route)
+        compact = " ".join(statement.split())[:200]
+        logger.warning(f"Possible N+1 in {route}: statement executed {count} times: {compact}")
+
+
+@contextmanager
+def track_queries(job: str) -> Iterator[QueryStats]:
+    # Учёт SQL для фоновых задач: with track_queries("reprice_shard"): ...
+    stats = QueryStats()
+    token = _current_stats.set(stats)
+    started = time.perf_counter()
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+        job_duration.observe(time.perf_counter() - started, job=job)
+        job_sql_statements.inc(stats.statements, job=job)
+        job_sql_seconds.inc(stats.sql_seconds, job=job)
+        _check_n_plus_one(f"job:{job}", stats)
+
+
+class RequestMetricsMiddleware:
+    # ASGI-middleware: латентность, число и время SQL, ожидание пула — по шаблону маршрута
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        token = _current_stats.set(stats)
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_stats.reset(token)
+            elapsed = time.perf_counter() - started
+            route = scope.get("route")
+            # Шаблон пути (/rooms/offers/{offer_id}/book), чтобы не плодить метки на каждый id
+            path = route.path if route is not None else "unmatched"
+            method = scope["method"]
+            request_duration.observe(elapsed, method=method, route=path)
+            requests_total.inc(method=method, route=path, status=status_code)
+            request_sql_statements.observe(stats.statements, method=method, route=path)
+            request_sql_seconds.inc(stats.sql_seconds, method=method, route=path)
+            request_pool_wait_seconds.inc(stats.pool_wait_seconds, method=method, route=path)
+            _check_n_plus_one(f"{method} {path}", stats)
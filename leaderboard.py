@@ -0,0 +1,342 @@
+import asyncio
+import heapq
+import logging
+import os
+import time
+import uuid
+import weakref
+from abc import ABC, abstractmethod
+from bisect import bisect_left, insort
+from itertools import islice
+from typing import Iterable, Literal
+
+import orjson
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Room, RoomOffer
+
+logger = logging.getLogger(__name__)
+
+# Рейтинги строит и обновляет только пересчёт цен (tasks.update_all_offers), API отдаёт то, что построено.
+# memory:// — в памяти процесса (пересчёт в том же процессе: eager-задачи, тесты), redis://... — общие ZSET
+LEADERBOARD_URL = os.getenv("LEADERBOARD_URL", "memory://")
+# Как часто пересчёт цен перестраивает рейтинги целиком (убирает удалённые предложения)
+LEADERBOARD_REBUILD_SECONDS = float(os.getenv("LEADERBOARD_REBUILD_SECONDS", "3600"))
+# Максимальный размер топа в ответе
+LEADERBOARD_MAX_SIZE = 100
+# Сколько предложений читается за шаг при полной перестройке
+LEADERBOARD_LOAD_CHUNK_SIZE = 10000
+
+Board = Literal["cheapest", "trending"]
+BOARDS: tuple[Board, ...] = ("cheapest", "trending")
+
+
+def _score(board: Board, entry: dict) -> float:
+    # Меньше — выше в рейтинге: cheapest по цене, trending по убыванию popularity_factor
+    if board == "cheapest":
+        return entry["current_price"]
+    return -(entry["popularity_factor"] if entry["popularity_factor"] is not None else 1.0)
+
+
+def _scopes(entry: dict) -> tuple[int | None, ...]:
+    # Общий рейтинг и рейтинг отеля (у предложения без номера — только общий)
+    return (None,) if entry["hotel_id"] is None else (None, entry["hotel_id"])
+
+
+def offer_entry(offer_id: int, hotel_id: int, room_id: int, current_price: float,
+                popularity_factor: float | None) -> dict:
+    return {"offer_id": offer_id, "hotel_id": hotel_id, "room_id": room_id,
+            "current_price": current_price, "popularity_factor": popularity_factor}
+
+
+class LeaderboardBackend(ABC):
+    # Рейтинги по каждому board: общий и по каждому отелю (scope None — общий)
+
+    @abstractmethod
+    async def replace(self, entries: list[dict]) -> None:
+        ...
+
+    @abstractmethod
+    async def upsert(self, entries: list[dict]) -> None:
+        ...
+
+    @abstractmethod
+    async def remove(self, entries: list[dict]) -> None:
+        ...
+
+    @abstractmethod
+    async def top(self, board: Board, hotel_id: int | None, limit: int) -> list[dict]:
+        ...
+
+    @abstractmethod
+    async def missing(self, offer_ids: list[int]) -> set[int]:
+        # Какие из offer_ids отсутствуют в рейтинге
+        ...
+
+    @abstractmethod
+    async def built_at(self) -> float | None:
+        # Время последней полной перестройки (epoch), None — рейтинги ещё не построены
+        ...
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryLeaderboard(LeaderboardBackend):
+    # Отсортированные списки ключей (score, offer_id) по отелям: вставка и удаление — bisect, топ отеля —
+    # срез O(K). Общего списка нет (поштучные вставки в список из миллиона ключей дороги): общий топ —
+    # слияние голов списков отелей, O(H + K log H), и он кэшируется до следующего обновления.
+    # Крупные пакеты (пересчёт цен меняет почти все предложения отеля) применяются сортировкой, а не поштучно
+
+    def __init__(self):
+        self._entries: dict[int, dict] = {}
+        self._keys: dict[tuple[Board, int | None], list[tuple[float, int]]] = {}
+        self._global_top: dict[Board, list[tuple[float, int]]] = {}
+        self._built_at: float | None = None
+
+    def _apply(self, removed: Iterable[dict], added: Iterable[dict]) -> None:
+        changes: dict[tuple[Board, int | None], tuple[set, list]] = {}
+        for entries, slot in ((removed, 0), (added, 1)):
+            for entry in entries:
+                for board in BOARDS:
+                    change = changes.setdefault((board, entry["hotel_id"]), (set(), []))[slot]
+                    key = (_score(board, entry), entry["offer_id"])
+                    change.add(key) if slot == 0 else change.append(key)
+        for list_key, (drop, add) in changes.items():
+            keys = self._keys.setdefault(list_key, [])
+            if (len(drop) + len(add)) * 32 < len(keys):
+                for key in drop:
+                    position = bisect_left(keys, key)
+                    if position < len(keys) and keys[position] == key:
+                        del keys[position]
+                for key in add:
+                    insort(keys, key)
+            else:
+                keys = [key for key in keys if key not in drop] if drop else keys
+                keys.extend(add)
+                keys.sort()
+                self._keys[list_key] = keys
+            if not keys:
+                del self._keys[list_key]
+        if changes:
+            self._global_top.clear()
+
+    async def replace(self, entries: list[dict]) -> None:
+        # Без await внутри: читатели в том же event loop не видят частично построенных рейтингов
+        self._entries = {}
+        self._keys = {}
+        self._apply([], entries)
+        self._entries.update((entry["offer_id"], entry) for entry in entries)
+        self._built_at = time.time()
+
+    async def upsert(self, entries: list[dict]) -> None:
+        previous = [self._entries[entry["offer_id"]] for entry in entries if entry["offer_id"] in self._entries]
+        self._apply(previous, entries)
+        self._entries.update((entry["offer_id"], entry) for entry in entries)
+
+    async def remove(self, entries: list[dict]) -> None:
+        previous = [self._entries.pop(entry["offer_id"]) for entry in entries if entry["offer_id"] in self._entries]
+        self._apply(previous, [])
+
+    async def top(self, board: Board, hotel_id: int | None, limit: int) -> list[dict]:
+        if hotel_id is not None:
+            keys = self._keys.get((board, hotel_id), [])
+        else:
+            keys = self._global_top.get(board)
+            if keys is None:
+                # Списки предложений без номера (hotel_id None) тоже входят в общий топ
+                lists = [keys for (list_board, _), keys in self._keys.items() if list_board == board]
+                keys = self._global_top[board] = list(islice(heapq.merge(*lists), LEADERBOARD_MAX_SIZE))
+        return [self._entries[offer_id] for _, offer_id in keys[:limit]]
+
+    async def missing(self, offer_ids: list[int]) -> set[int]:
+        return {offer_id for offer_id in offer_ids if offer_id not in self._entries}
+
+    async def built_at(self) -> float | None:
+        return self._built_at
+
+
+class RedisLeaderboard(LeaderboardBackend):
+    # ZSET на каждый board и scope (score — как в _score) и HASH offer_id -> JSON строки рейтинга.
+    # Пересчёт цен обновляет их пакетами ZADD/ZREM в одном pipeline; топ — ZRANGE + HMGET
+
+    def __init__(self, url: str, prefix: str = "leaderboard"):
+        self._url = url
+        self._prefix = prefix
+        self._clients = weakref.WeakKeyDictionary()
+
+    @property
+    def _redis(self):
+        # Воркер Celery запускает каждую задачу в новом event loop (asyncio.run), а соединения
+        # redis.asyncio привязаны к loop, в котором созданы: у каждого loop свой клиент.
+        # Клиент закрывается через close() в том же loop (задачи — в конце asyncio.run, приложение — при остановке)
+        import redis.asyncio as redis
+
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            client = self._clients[loop] = redis.Redis.from_url(self._url)
+        return client
+
+    def _zset(self, board: Board, hotel_id: int | None, prefix: str | None = None) -> str:
+        return f"{prefix or self._prefix}:{board}:" + ("global" if hotel_id is None else f"hotel:{hotel_id}")
+
+    async def replace(self, entries: list[dict]) -> None:
+        # Полная перестройка: новые ключи пишутся под временным префиксом и подменяют старые в одной
+        # транзакции MULTI/EXEC (RENAME, UNLINK ключей, которых больше нет): читатели видят либо старые
+        # рейтинги, либо новые целиком. Перестройки не пересекаются: их запускает координатор пересчёта цен
+        # под общей блокировкой (tasks.repricing_lock)
+        staging = f"{self._prefix}:staging:{uuid.uuid4().hex}"
+        staged: set[str] = set()
+        try:
+            for offset in range(0, len(entries), LEADERBOARD_LOAD_CHUNK_SIZE):
+                staged |= await self._write(entries[offset:offset + LEADERBOARD_LOAD_CHUNK_SIZE], staging)
+            current = set()
+            for board in BOARDS:
+                async for key in self._redis.scan_iter(match=f"{self._prefix}:{board}:*", count=1000):
+                    current.add(key.decode())
+            async with self._redis.pipeline(transaction=True) as pipe:
+                for key in current - {key.replace(staging, self._prefix, 1) for key in staged}:
+                    pipe.unlink(key)
+                if f"{staging}:offers" not in staged:
+                    pipe.unlink(f"{self._prefix}:offers")
+                for key in staged:
+                    pipe.rename(key, key.replace(staging, self._prefix, 1))
+                pipe.set(f"{self._prefix}:built", time.time())
+                await pipe.execute()
+        except Exception:
+            if staged:
+                await self._redis.unlink(*staged)
+            raise
+
+    async def _write(self, entries: list[dict], prefix: str | None = None) -> set[str]:
+        # Возвращает записанные ключи
+        if not entries:
+            return set()
+        prefix = prefix or self._prefix
+        zsets: dict[str, dict[str, float]] = {}
+        for entry in entries:
+            for board in BOARDS:
+                for scope in _scopes(entry):
+                    zsets.setdefault(self._zset(board, scope, prefix), {})[str(entry["offer_id"])] = _score(board, entry)
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.hset(f"{prefix}:offers", mapping={str(entry["offer_id"]): orjson.dumps(entry) for entry in entries})
+            for key, members in zsets.items():
+                pipe.zadd(key, members)
+            await pipe.execute()
+        return {f"{prefix}:offers", *zsets}
+
+    async def upsert(self, entries: list[dict]) -> None:
+        await self._write(entries)
+
+    async def remove(self, entries: list[dict]) -> None:
+        if not entries:
+            return
+        members: dict[str, list[str]] = {}
+        for entry in entries:
+            for board in BOARDS:
+                for scope in _scopes(entry):
+                    members.setdefault(self._zset(board, scope), []).append(str(entry["offer_id"]))
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.hdel(f"{self._prefix}:offers", *(str(entry["offer_id"]) for entry in entries))
+            for key, offer_ids in members.items():
+                pipe.zrem(key, *offer_ids)
+            await pipe.execute()
+
+    async def top(self, board: Board, hotel_id: int | None, limit: int) -> list[dict]:
+        offer_ids = await self._redis.zrange(self._zset(board, hotel_id), 0, limit - 1)
+        if not offer_ids:
+            return []
+        rows = await self._redis.hmget(f"{self._prefix}:offers", offer_ids)
+        return [orjson.loads(row) for row in rows if row is not None]
+
+    async def missing(self, offer_ids: list[int]) -> set[int]:
+        if not offer_ids:
+            return set()
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for offer_id in offer_ids:
+                pipe.hexists(f"{self._prefix}:offers", str(offer_id))
+            exists = await pipe.execute()
+        return {offer_id for offer_id, found in zip(offer_ids, exists) if not found}
+
+    async def built_at(self) -> float | None:
+        value = await self._redis.get(f"{self._prefix}:built")
+        return None if value is None else float(value)
+
+    async def close(self) -> None:
+        client = self._clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+
+def create_leaderboard_backend(url: str = LEADERBOARD_URL) -> LeaderboardBackend:
+    if url.startswith("memory://"):
+        return MemoryLeaderboard()
+    if url.startswith(("redis://", "rediss://")):
+        return RedisLeaderboard(url)
+    raise ValueError(f"Неизвестное хранилище рейтингов: {url}")
+
+
+class Leaderboard:
+    # Топ предложений: cheapest — самые дешёвые, trending — самые популярные, общий и по отелю.
+    # В рейтинге только доступные предложения (available > 0)
+
+    def __init__(self, backend: LeaderboardBackend, rebuild_seconds: float = LEADERBOARD_REBUILD_SECONDS):
+        self.backend = backend
+        self._rebuild_seconds = rebuild_seconds
+
+    def use(self, backend: LeaderboardBackend) -> None:
+        self.backend = backend
+
+    async def rebuild(self, db: AsyncSession) -> int:
+        started = time.perf_counter()
+        entries, last_id = [], 0
+        while True:
+            # Keyset-пагинация по id, как в пересчёте цен
+            result = await db.execute(
+                select(RoomOffer.id, Room.hotel_id, RoomOffer.room_id, RoomOffer.current_price,
+                       RoomOffer.popularity_factor)
+                .join(Room, Room.id == RoomOffer.room_id)
+                .where(RoomOffer.available > 0, RoomOffer.id > last_id)
+                .order_by(RoomOffer.id)
+                .limit(LEADERBOARD_LOAD_CHUNK_SIZE)
+            )
+            rows = result.all()
+            if not rows:
+                break
+            entries.extend(offer_entry(*row) for row in rows)
+            last_id = rows[-1][0]
+        await self.backend.replace(entries)
+        logger.info(f"Leaderboard: {len(entries)} offers in {time.perf_counter() - started:.2f}s")
+        return len(entries)
+
+    async def ensure(self, db: AsyncSession) -> None:
+        # Вызывается только координатором пересчёта цен: перестройка, если рейтингов ещё нет или
+        # с прошлой прошло больше rebuild_seconds (так уходят удалённые из БД предложения)
+        built_at = await self.backend.built_at()
+        if built_at is None or time.time() - built_at >= self._rebuild_seconds:
+            await self.rebuild(db)
+
+    async def apply(self, available: list[dict], unavailable: list[dict], unchanged: list[dict]) -> None:
+        # Инкрементальное обновление из пересчёта цен: available — изменившиеся доступные предложения,
+        # unchanged — доступные без изменений (в рейтинг попадают, только если их там нет, например
+        # снова появившиеся в продаже). Рейтинг, который ещё не построен, не трогаем: его целиком построит
+        # ensure. Ошибка хранилища не прерывает пересчёт
+        try:
+            if await self.backend.built_at() is None:
+                return
+            missing = await self.backend.missing([entry["offer_id"] for entry in unchanged])
+            await self.backend.upsert([*available, *(entry for entry in unchanged if entry["offer_id"] in missing)])
+            await self.backend.remove(unavailable)
+        except Exception:
+            logger.exception("Leaderboard update failed")
+
+    async def top(self, board: Board, hotel_id: int | None, limit: int) -> list[dict]:
+        return await self.backend.top(board, hotel_id, limit)
+
+    async def close(self) -> None:
+        await self.backend.close()
+
+
+leaderboard = Leaderboard(create_leaderboard_backend())
@@ -1,97 +1,77 @@
-import math
-from datetime import datetime, timezone, timedelta
+import asyncio
 from fastapi import FastAPI
-from routes import users, hotels, favorites
-from database import Base, engine, get_db_session
-from models import RoomOffer
-from sqlalchemy import select, update
+from fastapi.responses import PlainTextResponse
+from routes import users, hotels, favorites, business
+from database import engine
+from migrate import check_schema, upgrade
+from view_buffer import view_buffer
+from cache import cache
+from ratelimit import rate_limiter
+from leaderboard import leaderboard
+from availability import availability_index
+from metrics import render_metrics
+from instrumentation import RequestMetricsMiddleware
+from price_feed import PRICE_FEED_MODE, PriceBusRelay
 from contextlib import asynccontextmanager
-from celery import Celery
-from celery.schedules import crontab
 
-# Создание таблиц при запуске
+# Применение миграций (python migrate.py); API при старте только сверяет версию схемы
 async def init_db():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    await upgrade(engine)
 
-# Функция расчета динамической цены (предполагается в routes.hotels)
-# from routes.hotels import calculate_dynamic_price  # Убедитесь, что она импортируется
-
-# Фоновая задача по обновлению цен и популярности
-async def update_offer_data():
-    async with get_db_session() as db:
-        result = await db.execute(select(RoomOffer))
-        offers = result.scalars().all()
-        for offer in offers:
-            # Обновление popularity_factor
-            twelve_hours_ago = datetime.now(timezone.utc) - timedelta(hours=12)
-            view_result = await db.execute(
-                """
-                SELECT COUNT(*) FROM offer_views
-                WHERE offer_id = :offer_id AND timestamp >= :since
-                """,
-                {"offer_id": offer.id, "since": twelve_hours_ago}
-            )
-            view_count = view_result.scalar()
-            new_popularity = min(math.log(view_count + 1), 5.0)
-            if new_popularity != offer.popularity_factor:
-                await db.execute(
-                    update(RoomOffer)
-                    .where(RoomOffer.id == offer.id)
-                    .values(popularity_factor=new_popularity)
-                )
-
-            # Обновление current_price
-            current_price = calculate_dynamic_price(offer)
-            if current_price != offer.current_price:
-                await db.execute(
-                    update(RoomOffer)
-                    .where(RoomOffer.id == offer.id)
-                    .values(current_price=current_price)
-                )
-        await db.commit()
-
-# Настройка Celery
-celery_app = Celery(
-    "tasks",
-    broker="redis://redis:6379/0",  # Используйте актуальный URL Redis
-    backend="redis://redis:6379/0"
-)
-celery_app.conf.update(
-    task_serializer="json",
-    accept_content=["json"],
-    result_serializer="json",
-    timezone="UTC",
-    enable_utc=True,
-)
-
-# Регистрация задачи Celery
-@celery_app.task
-async def update_all_offers():
-    await update_offer_data()
+# Фоновые задачи (пересчёт цен, очистка просмотров) и расписание Celery Beat — в tasks.py
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    await init_db()
-    # Настройка Celery Beat
-    celery_app.conf.beat_schedule = {
-        "update-offers": {
-            "task": "app.main.update_all_offers",
-            "schedule": crontab(minute="*/1"),  # Каждую минуту для тестирования, можно изменить на 5
-        },
-    }
+    await check_schema(engine)
+    await view_buffer.start()
+    if engine.dialect.name != "postgresql":
+        # Индекс доступности в памяти (SQLite) строится в фоне сразу, не в первом запросе
+        availability_index.schedule_refresh()
+    relay = publisher = None
+    if PRICE_FEED_MODE == "bus":
+        # Цены приходят из общей шины; публикатор работает отдельным процессом (price_publisher.py).
+        # Импорт здесь: в режиме local шина и публикатор процессу API не нужны
+        from pubsub import InMemoryPriceBus, create_price_bus
+        from price_publisher import run_publisher
+
+        bus = create_price_bus()
+        relay = PriceBusRelay(bus, hotels.price_broadcaster)
+        await relay.start()
+        if isinstance(bus, InMemoryPriceBus):
+            # Локальная шина видна только этому процессу, поэтому публикатор запускаем здесь же
+            publisher = asyncio.create_task(run_publisher(bus))
     yield
+    if publisher is not None:
+        publisher.cancel()
+        await asyncio.gather(publisher, return_exceptions=True)
+    if relay is not None:
+        await relay.stop()
+    # Останавливаем тикеры WebSocket-ленты цен
+    await hotels.price_broadcaster.close()
+    await availability_index.stop()
+    # Сбрасываем накопленные просмотры до завершения процесса
+    await view_buffer.stop()
+    await cache.close()
+    await rate_limiter.close()
+    await leaderboard.close()
 
 app = FastAPI(lifespan=lifespan)
+# Латентность и SQL-статистика по каждому маршруту, см. /metrics
+app.add_middleware(RequestMetricsMiddleware)
 
 app.include_router(users.router, prefix="/api/users")
 app.include_router(hotels.router, prefix="/api/hotels")
 app.include_router(favorites.router, prefix="/api/favorites")
+app.include_router(business.router, prefix="/api/business")
 
 @app.get("/")
 async def read_root():
     return {"message": "Welcome to the Hotel Booking API"}
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="127.0.0.1", port=8000)
\ No newline at end of file
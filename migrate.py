@@ -0,0 +1,116 @@
+import argparse
+import asyncio
+import importlib
+import logging
+import os
+import pkgutil
+import sys
+from datetime import datetime, UTC
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, func, insert, select, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+import migrations
+
+logger = logging.getLogger(__name__)
+
+# Проверка версии схемы при старте API: strict — не стартовать со старой схемой, warn — только лог, off — без проверки
+SCHEMA_CHECK = os.getenv("SCHEMA_CHECK", "strict")
+# Применять миграции при старте API (для разработки и тестов; в проде — python migrate.py перед деплоем)
+AUTO_MIGRATE = os.getenv("AUTO_MIGRATE", "false").lower() in ("1", "true", "yes", "on")
+# Ключ pg_advisory_xact_lock: параллельные запуски миграций выполняются по очереди
+MIGRATION_LOCK_KEY = 720_001
+
+schema_version = Table(
+    "schema_version",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("applied_at", DateTime(timezone=True), nullable=False),
+)
+
+
+def available_migrations() -> list[tuple[int, str]]:
+    # migrations/NNNN_<название>.py по возрастанию номера
+    names = sorted(module.name for module in pkgutil.iter_modules(migrations.__path__) if module.name[:4].isdigit())
+    return [(int(name[:4]), name) for name in names]
+
+
+LATEST_VERSION = available_migrations()[-1][0]
+
+
+async def _read_version(conn: AsyncConnection) -> int:
+    result = await conn.execute(select(func.max(schema_version.c.version)))
+    return result.scalar() or 0
+
+
+async def current_version(engine: AsyncEngine) -> int:
+    # Один SELECT; таблицы schema_version ещё нет — версия 0
+    async with engine.connect() as conn:
+        try:
+            return await _read_version(conn)
+        except DBAPIError:
+            return 0
+
+
+async def upgrade(engine: AsyncEngine, target: int | None = None) -> list[int]:
+    # Все недостающие миграции в одной транзакции (DDL в Postgres транзакционный)
+    applied = []
+    async with engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            await conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        await conn.run_sync(schema_version.create, checkfirst=True)
+        version = await _read_version(conn)
+        for number, name in available_migrations():
+            if number <= version or (target is not None and number > target):
+                continue
+            module = importlib.import_module(f"migrations.{name}")
+            await module.upgrade(conn)
+            await conn.execute(insert(schema_version).values(version=number, name=name, applied_at=datetime.now(UTC)))
+            applied.append(number)
+            logger.info(f"Applied migration {name}")
+    return applied
+
+
+async def check_schema(engine: AsyncEngine) -> int:
+    # Вызывается при старте API вместо create_all
+    if AUTO_MIGRATE:
+        await upgrade(engine)
+    if SCHEMA_CHECK == "off":
+        return LATEST_VERSION
+    version = await current_version(engine)
+    if version < LATEST_VERSION:
+        message = f"Database schema is at version {version}, expected {LATEST_VERSION}: run python migrate.py"
+        if SCHEMA_CHECK == "strict":
+            # Закрываем пул, иначе открытые соединения (потоки aiosqlite) не дают процессу завершиться
+            await engine.dispose()
+            raise RuntimeError(message)
+        logger.warning(message)
+    elif version > LATEST_VERSION:
+        logger.warning(f"Database schema version {version} is newer than this build ({LATEST_VERSION})")
+    return version
+
+
+async def _main(args) -> int:
+    from database import engine
+
+    try:
+        version = await current_version(engine)
+        if args.check:
+            print(f"schema version {version}, latest {LATEST_VERSION}")
+            return 0 if version >= LATEST_VERSION else 1
+        applied = await upgrade(engine, args.target)
+        print(f"Applied {applied}" if applied else f"Schema is up to date (version {version})")
+        return 0
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    # python migrate.py — применить миграции; --check — код 1, если есть неприменённые
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--check", action="store_true")
+    parser.add_argument("--target", type=int, help="применить миграции только до этой версии")
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(asyncio.run(_main(parser.parse_args())))
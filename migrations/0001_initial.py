@@ -0,0 +1,85 @@
+from sqlalchemy import (
+    Column, DateTime, Float, ForeignKey, Integer, MetaData, String, Table, UniqueConstraint
+)
+
+# Исходная схема, которую раньше создавал create_all при старте API. Таблицы описаны здесь же,
+# а не берутся из models.py: миграция должна давать одну и ту же схему при любых будущих моделях
+metadata = MetaData()
+
+Table(
+    "users", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("email", String, unique=True, index=True),
+    Column("hashed_password", String),
+    Column("role", String),
+)
+
+Table(
+    "hotels", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("name", String, index=True),
+    Column("address", String),
+    Column("description", String, nullable=True),
+    Column("rating", Float, nullable=True),
+    Column("owner_id", Integer, ForeignKey("users.id")),
+)
+
+Table(
+    "rooms", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("hotel_id", Integer, ForeignKey("hotels.id")),
+    Column("room_number", String, index=True),
+    Column("room_type", String),
+)
+
+Table(
+    "room_offers", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("room_id", Integer, ForeignKey("rooms.id")),
+    Column("start_date", DateTime(timezone=True), nullable=False),
+    Column("end_date", DateTime(timezone=True), nullable=False),
+    Column("initial_price", Float, nullable=False),
+    Column("current_price", Float, nullable=False),
+    Column("min_price", Float, nullable=False),
+    Column("popularity_factor", Float),
+    Column("created_at", DateTime(timezone=True)),
+    Column("available", Integer),
+)
+
+Table(
+    "offer_views", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("offer_id", Integer, ForeignKey("room_offers.id"), nullable=False),
+    Column("timestamp", DateTime(timezone=True), nullable=False, index=True),
+)
+
+Table(
+    "offer_view_rollups", metadata,
+    Column("offer_id", Integer, ForeignKey("room_offers.id"), primary_key=True),
+    Column("bucket_start", DateTime(timezone=True), primary_key=True),
+    Column("view_count", Integer, nullable=False),
+)
+
+Table(
+    "bookings", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("offer_id", Integer, ForeignKey("room_offers.id"), nullable=False),
+    Column("user_id", Integer, ForeignKey("users.id"), nullable=False),
+    Column("price", Float, nullable=False),
+    Column("idempotency_key", String, nullable=True),
+    Column("created_at", DateTime(timezone=True)),
+    UniqueConstraint("user_id", "idempotency_key", name="user_idempotency_key_unique"),
+)
+
+Table(
+    "favorites", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("user_id", Integer, ForeignKey("users.id"), nullable=False),
+    Column("room_id", Integer, ForeignKey("rooms.id"), nullable=False),
+    UniqueConstraint("user_id", "room_id", name="user_room_unique"),
+)
+
+
+async def upgrade(conn):
+    # checkfirst: на базах, созданных старым create_all, существующие таблицы пропускаются
+    await conn.run_sync(metadata.create_all, checkfirst=True)
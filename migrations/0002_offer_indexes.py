@@ -0,0 +1,61 @@
+from sqlalchemy import Column, DateTime, Float, Index, Integer, MetaData, String, Table, func, literal_column, text
+
+# Индексы под поиск предложений, бронирования и агрегаты просмотров. create_all не добавляет индексы
+# к уже существующим таблицам, поэтому они создаются отдельно (checkfirst — только недостающие).
+# Таблицы описаны здесь только нужными колонками
+metadata = MetaData()
+
+rooms = Table(
+    "rooms", metadata,
+    Column("hotel_id", Integer),
+    Column("room_type", String),
+)
+
+room_offers = Table(
+    "room_offers", metadata,
+    Column("id", Integer),
+    Column("room_id", Integer),
+    Column("start_date", DateTime(timezone=True)),
+    Column("end_date", DateTime(timezone=True)),
+    Column("current_price", Float),
+    Column("available", Integer),
+)
+
+bookings = Table("bookings", metadata, Column("offer_id", Integer))
+
+# Исходная схема (create_all до миграций) создавала offer_views без индекса по timestamp
+offer_views = Table("offer_views", metadata, Column("timestamp", DateTime(timezone=True)))
+
+offer_view_rollups = Table("offer_view_rollups", metadata, Column("bucket_start", DateTime(timezone=True)))
+
+INDEXES = (
+    Index("ix_rooms_hotel_id_room_type", rooms.c.hotel_id, rooms.c.room_type),
+    Index("ix_room_offers_room_id_id", room_offers.c.room_id, room_offers.c.id),
+    Index("ix_room_offers_start_end", room_offers.c.start_date, room_offers.c.end_date),
+    Index("ix_room_offers_price_id", room_offers.c.current_price, room_offers.c.id),
+    Index(
+        "ix_room_offers_available_price_id", room_offers.c.current_price, room_offers.c.id,
+        postgresql_where=text("available > 0"), sqlite_where=text("available > 0")
+    ),
+    Index("ix_bookings_offer_id", bookings.c.offer_id),
+    Index("ix_offer_views_timestamp", offer_views.c.timestamp),
+    Index("ix_offer_view_rollups_bucket_start", offer_view_rollups.c.bucket_start),
+)
+
+# Поиск «предложение покрывает даты» — GiST по tstzrange, только в Postgres
+PERIOD_GIST_INDEX = Index(
+    "ix_room_offers_period_gist",
+    func.tstzrange(room_offers.c.start_date, room_offers.c.end_date, literal_column("'[)'")),
+    postgresql_using="gist",
+    postgresql_where=text("available > 0"),
+)
+
+
+def _create_missing_indexes(sync_conn):
+    indexes = INDEXES + ((PERIOD_GIST_INDEX,) if sync_conn.dialect.name == "postgresql" else ())
+    for index in indexes:
+        index.create(sync_conn, checkfirst=True)
+
+
+async def upgrade(conn):
+    await conn.run_sync(_create_missing_indexes)
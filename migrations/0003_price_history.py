@@ -0,0 +1,21 @@
+from sqlalchemy import REAL, Column, DateTime, Integer, MetaData, Table, text
+
+# История цен предложений. В Postgres — секционирование по месяцам ts: здесь создаётся только
+# секция DEFAULT, месячные секции создаёт обслуживание перед пересчётом цен (price_history.ensure_partitions)
+metadata = MetaData()
+
+offer_price_history = Table(
+    "offer_price_history", metadata,
+    Column("offer_id", Integer, primary_key=True, autoincrement=False),
+    Column("ts", DateTime(timezone=True), primary_key=True),
+    Column("price", REAL, nullable=False),
+    postgresql_partition_by="RANGE (ts)",
+)
+
+
+async def upgrade(conn):
+    await conn.run_sync(metadata.create_all, checkfirst=True)
+    if conn.dialect.name == "postgresql":
+        await conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS offer_price_history_default PARTITION OF offer_price_history DEFAULT"
+        ))
@@ -0,0 +1 @@
+# Версионированные миграции схемы: NNNN_<название>.py с async def upgrade(conn), см. migrate.py
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Float, DateTime, UniqueConstraint
+from sqlalchemy import Column, Integer, String, ForeignKey, Float, REAL, DateTime, UniqueConstraint, Index, func, literal_column, text
 from sqlalchemy.orm import relationship
 from database import Base
 from datetime import datetime, UTC
@@ -35,6 +35,8 @@ class Room(Base):
     hotel = relationship("Hotel", back_populates="rooms")
     offers = relationship("RoomOffer", back_populates="room")
 
+    __table_args__ = (Index("ix_rooms_hotel_id_room_type", "hotel_id", "room_type"),)
+
 
 class RoomOffer(Base):
     __tablename__ = "room_offers"
@@ -51,15 +53,72 @@ class RoomOffer(Base):
     room = relationship("Room", back_populates="offers")
     views = relationship("OfferView", back_populates="offer", cascade="all, delete-orphan")
 
+    # Индексы под поиск предложений: keyset-пагинация по id или (current_price, id),
+    # пересечение периодов и фильтр по номеру/отелю
+    __table_args__ = (
+        Index("ix_room_offers_room_id_id", "room_id", "id"),
+        Index("ix_room_offers_start_end", "start_date", "end_date"),
+        Index("ix_room_offers_price_id", "current_price", "id"),
+        Index(
+            "ix_room_offers_available_price_id", "current_price", "id",
+            postgresql_where=text("available > 0"), sqlite_where=text("available > 0")
+        ),
+    )
+
+
+
+# Поиск «предложение покрывает даты» (tstzrange @> окно) по GiST-индексу периода — только в Postgres;
+# для SQLite см. availability.AvailabilityIndex
+Index(
+    "ix_room_offers_period_gist",
+    func.tstzrange(RoomOffer.start_date, RoomOffer.end_date, literal_column("'[)'")),
+    postgresql_using="gist",
+    postgresql_where=text("available > 0"),
+).ddl_if(dialect="postgresql")
 
 class OfferView(Base):
     __tablename__ = "offer_views"
     id = Column(Integer, primary_key=True, index=True)
     offer_id = Column(Integer, ForeignKey("room_offers.id"), nullable=False)
-    timestamp = Column(DateTime(timezone=True), nullable=False)
+    timestamp = Column(DateTime(timezone=True), nullable=False, index=True)
     offer = relationship("RoomOffer", back_populates="views")
 
 
+class OfferViewRollup(Base):
+    # Количество просмотров предложения в фиксированном временном интервале (например, 5 минут)
+    __tablename__ = "offer_view_rollups"
+    offer_id = Column(Integer, ForeignKey("room_offers.id"), primary_key=True)
+    bucket_start = Column(DateTime(timezone=True), primary_key=True)  # Начало интервала
+    view_count = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (Index("ix_offer_view_rollups_bucket_start", "bucket_start"),)
+
+
+class OfferPriceHistory(Base):
+    # Цена предложения после каждого пересчёта (только добавление, пишет repricing.reprice_offers).
+    # Компактная строка: REAL вместо double, без суррогатного id и внешнего ключа — первичный ключ
+    # (offer_id, ts) сразу служит индексом для выборки истории одного предложения.
+    # В Postgres таблица секционирована по месяцам ts, см. price_history.ensure_partitions
+    __tablename__ = "offer_price_history"
+    offer_id = Column(Integer, primary_key=True, autoincrement=False)
+    ts = Column(DateTime(timezone=True), primary_key=True)  # Время пересчёта
+    price = Column(REAL, nullable=False)
+
+    __table_args__ = {"postgresql_partition_by": "RANGE (ts)"}
+
+
+class Booking(Base):
+    __tablename__ = "bookings"
+    id = Column(Integer, primary_key=True, index=True)
+    offer_id = Column(Integer, ForeignKey("room_offers.id"), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    price = Column(Float, nullable=False)  # Цена, по которой забронировано
+    idempotency_key = Column(String, nullable=True)  # Ключ из заголовка Idempotency-Key
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(UTC))
+
+    __table_args__ = (UniqueConstraint("user_id", "idempotency_key", name="user_idempotency_key_unique"),)
+
+
 class Favorite(Base):
     __tablename__ = "favorites"
     id = Column(Integer, primary_key=True, index=True)
@@ -0,0 +1,156 @@
+import asyncio
+import logging
+import os
+from typing import Awaitable, Callable
+
+from pubsub import PriceBus
+from quotes import issue_quote
+
+logger = logging.getLogger(__name__)
+
+# local — каждый воркер сам читает цены из БД (тикер на предложение);
+# bus — цены считает price_publisher.py, воркеры только ретранслируют тики из PRICE_BUS_URL
+PRICE_FEED_MODE = os.getenv("PRICE_FEED_MODE", "local")
+# Как часто воркер сообщает публикатору, по каким предложениям есть подписчики
+PRICE_BUS_ANNOUNCE_SECONDS = float(os.getenv("PRICE_BUS_ANNOUNCE_SECONDS", "1"))
+
+
+def price_message(offer_id: int, current_price: float, popularity_factor: float) -> dict:
+    # Одна котировка на тик для всех подписчиков предложения
+    quote = issue_quote(offer_id, current_price)
+    return {
+        "offer_id": offer_id,
+        "current_price": current_price,
+        "popularity_factor": popularity_factor,
+        "quote": quote.token,
+        "quote_expires_at": quote.expires_at
+    }
+
+
+# Функция, которая по offer_id возвращает сообщение с ценой (или None, если предложения нет)
+PriceFetcher = Callable[[int], Awaitable[dict | None]]
+
+
+class PriceBroadcaster:
+    # Один тикер на offer_id: цена считается один раз за тик и рассылается всем подписчикам.
+    # Число подключений влияет только на память (очереди), но не на количество запросов к БД.
+    # Без fetch тикеры не запускаются: цены приходят извне через publish (PriceBusRelay)
+
+    def __init__(self, fetch: PriceFetcher | None, interval: float = 3.0):
+        self._fetch = fetch
+        self._interval = interval
+        self._subscribers: dict[int, set[asyncio.Queue]] = {}
+        self._tickers: dict[int, asyncio.Task] = {}
+        self._last: dict[int, dict] = {}
+
+    def subscribe(self, offer_id: int) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=1)
+        self._subscribers.setdefault(offer_id, set()).add(queue)
+        # Новый подписчик сразу получает последнюю известную цену, не дожидаясь тика
+        last = self._last.get(offer_id)
+        if last is not None:
+            queue.put_nowait(last)
+        if self._fetch is not None and offer_id not in self._tickers:
+            self._tickers[offer_id] = asyncio.create_task(self._run(offer_id))
+        return queue
+
+    def unsubscribe(self, offer_id: int, queue: asyncio.Queue) -> None:
+        subscribers = self._subscribers.get(offer_id)
+        if subscribers is None:
+            return
+        subscribers.discard(queue)
+        if not subscribers:
+            del self._subscribers[offer_id]
+            self._last.pop(offer_id, None)
+            ticker = self._tickers.pop(offer_id, None)
+            if ticker is not None:
+                ticker.cancel()
+
+    def publish(self, offer_id: int, message: dict) -> None:
+        if offer_id not in self._subscribers:
+            return
+        self._last[offer_id] = message
+        for queue in self._subscribers.get(offer_id, ()):
+            if queue.full():
+                # Медленный клиент получает только самую свежую цену
+                queue.get_nowait()
+            queue.put_nowait(message)
+
+    def offer_ids(self) -> list[int]:
+        return list(self._subscribers)
+
+    def stats(self) -> dict:
+        return {
+            "offers": len(self._subscribers),
+            "subscribers": sum(len(s) for s in self._subscribers.values()),
+        }
+
+    async def close(self) -> None:
+        tickers = list(self._tickers.values())
+        self._tickers.clear()
+        for ticker in tickers:
+            ticker.cancel()
+        await asyncio.gather(*tickers, return_exceptions=True)
+        self._subscribers.clear()
+        self._last.clear()
+
+    async def _run(self, offer_id: int) -> None:
+        try:
+            while offer_id in self._subscribers:
+                try:
+                    message = await self._fetch(offer_id)
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    logger.exception(f"Price tick failed for offer_id {offer_id}")
+                else:
+                    if message is None:
+                        self.publish(offer_id, {"error": "Offer not found"})
+                        return
+                    self.publish(offer_id, message)
+                await asyncio.sleep(self._interval)
+        finally:
+            if self._tickers.get(offer_id) is asyncio.current_task():
+                del self._tickers[offer_id]
+
+
+class PriceBusRelay:
+    # Ретрансляция тиков из шины локальным подписчикам; путь отправки цен не обращается к БД
+
+    def __init__(self, bus: PriceBus, broadcaster: PriceBroadcaster,
+                 announce_interval: float = PRICE_BUS_ANNOUNCE_SECONDS):
+        self._bus = bus
+        self._broadcaster = broadcaster
+        self._announce_interval = announce_interval
+        self._tasks: list[asyncio.Task] = []
+
+    async def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._listen()), asyncio.create_task(self._announce())]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self._bus.close()
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async for message in self._bus.listen():
+                    self._broadcaster.publish(message["offer_id"], message)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Price bus subscription failed, reconnecting")
+                await asyncio.sleep(1)
+
+    async def _announce(self) -> None:
+        while True:
+            try:
+                await self._bus.announce(self._broadcaster.offer_ids())
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Price bus announce failed")
+            await asyncio.sleep(self._announce_interval)
@@ -0,0 +1,169 @@
+import logging
+import math
+import os
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Iterable
+
+from sqlalchemy import Integer, and_, cast, delete, extract, func, insert, literal_column, select, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from models import OfferPriceHistory
+
+logger = logging.getLogger(__name__)
+
+# На сколько месяцев вперёд создаются секции (Postgres); строки вне секций попадают в секцию DEFAULT
+PRICE_HISTORY_MONTHS_AHEAD = int(os.getenv("PRICE_HISTORY_MONTHS_AHEAD", "3"))
+# Сколько хранится история: в Postgres удаляются целые месячные секции, в SQLite — строки
+PRICE_HISTORY_RETENTION_DAYS = int(os.getenv("PRICE_HISTORY_RETENTION_DAYS", "365"))
+# Верхняя граница числа точек в ответе с историей цены
+PRICE_HISTORY_MAX_POINTS = 1000
+
+_TABLE = OfferPriceHistory.__tablename__
+_PARTITION_NAME = re.compile(rf"^{_TABLE}_p(\d{{4}})(\d{{2}})$")
+
+
+def _month_start(value: datetime, months: int = 0) -> datetime:
+    index = value.year * 12 + value.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+async def _partitions(conn: AsyncConnection) -> list[str]:
+    result = await conn.execute(
+        text("SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+             "WHERE i.inhparent = CAST(:parent AS regclass)"),
+        {"parent": _TABLE}
+    )
+    return list(result.scalars())
+
+
+async def _create_partition(conn: AsyncConnection, name: str, lower: datetime, upper: datetime) -> None:
+    # Границы секций — литералы: DDL не принимает параметры
+    bounds = f"FOR VALUES FROM ('{lower.isoformat()}') TO ('{upper.isoformat()}')"
+    result = await conn.execute(
+        text(f"SELECT EXISTS (SELECT 1 FROM {_TABLE}_default WHERE ts >= :lower AND ts < :upper)"),
+        {"lower": lower, "upper": upper}
+    )
+    if not result.scalar():
+        await conn.execute(text(f"CREATE TABLE {name} PARTITION OF {_TABLE} {bounds}"))
+        return
+    # Строки месяца уже лежат в DEFAULT (секция не была создана вовремя): CREATE ... PARTITION OF
+    # с ними завершится ошибкой. Переносим их в новую таблицу и присоединяем её как секцию
+    await conn.execute(text(f"CREATE TABLE {name} (LIKE {_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    moved = await conn.execute(
+        text(f"WITH moved AS (DELETE FROM {_TABLE}_default WHERE ts >= :lower AND ts < :upper RETURNING *) "
+             f"INSERT INTO {name} SELECT * FROM moved"),
+        {"lower": lower, "upper": upper}
+    )
+    await conn.execute(text(f"ALTER TABLE {_TABLE} ATTACH PARTITION {name} {bounds}"))
+    logger.warning(f"Price history: moved {moved.rowcount} rows from the default partition into {name}")
+
+
+async def ensure_partitions(conn: AsyncConnection, now: datetime | None = None,
+                            months_ahead: int = PRICE_HISTORY_MONTHS_AHEAD) -> list[str]:
+    # Месячные секции offer_price_history_pYYYYMM с текущего месяца до months_ahead вперёд.
+    # Создаются только недостающие: CREATE ... PARTITION OF берёт эксклюзивную блокировку родителя.
+    # Каждая секция — в своей точке сохранения: ошибка одной не мешает остальным
+    if conn.dialect.name != "postgresql":
+        return []
+    now = now or datetime.now(timezone.utc)
+    existing = set(await _partitions(conn))
+    created = []
+    if f"{_TABLE}_default" not in existing:
+        await conn.execute(text(f"CREATE TABLE {_TABLE}_default PARTITION OF {_TABLE} DEFAULT"))
+        created.append(f"{_TABLE}_default")
+    for months in range(months_ahead + 1):
+        lower, upper = _month_start(now, months), _month_start(now, months + 1)
+        name = f"{_TABLE}_p{lower:%Y%m}"
+        if name in existing:
+            continue
+        try:
+            async with conn.begin_nested():
+                await _create_partition(conn, name, lower, upper)
+        except Exception:
+            logger.exception(f"Price history: failed to create partition {name}")
+            continue
+        created.append(name)
+    return created
+
+
+async def drop_expired_history(conn: AsyncConnection, now: datetime | None = None,
+                               retention_days: int = PRICE_HISTORY_RETENTION_DAYS) -> int:
+    # Postgres: DROP секций, целиком старше срока хранения (без VACUUM после массового DELETE).
+    # SQLite: обычный DELETE. Возвращает число удалённых секций или строк
+    cutoff = (now or datetime.now(timezone.utc)) - timedelta(days=retention_days)
+    if conn.dialect.name != "postgresql":
+        result = await conn.execute(delete(OfferPriceHistory).where(OfferPriceHistory.ts < cutoff))
+        return result.rowcount
+    dropped = 0
+    for name in await _partitions(conn):
+        match = _PARTITION_NAME.match(name)
+        if match is None:
+            continue
+        upper = _month_start(datetime(int(match[1]), int(match[2]), 1, tzinfo=timezone.utc), 1)
+        if upper <= cutoff:
+            await conn.execute(text(f"DROP TABLE {name}"))
+            dropped += 1
+    return dropped
+
+
+async def maintain_price_history(db: AsyncSession, now: datetime | None = None) -> dict:
+    # Вызывается координатором пересчёта цен (tasks.update_all_offers) перед запуском шардов
+    conn = await db.connection()
+    created = await ensure_partitions(conn, now)
+    dropped = await drop_expired_history(conn, now)
+    await db.commit()
+    if created or dropped:
+        logger.info(f"Price history: created partitions {created}, dropped {dropped}")
+    return {"created": created, "dropped": dropped}
+
+
+async def record_prices(db: AsyncSession, offer_ids: Iterable[int], prices: Iterable[float], ts: datetime) -> None:
+    # Одна точка на предложение за пересчёт; многострочный INSERT (executemany) без commit
+    rows = [{"offer_id": offer_id, "ts": ts, "price": price} for offer_id, price in zip(offer_ids, prices)]
+    if rows:
+        await db.execute(insert(OfferPriceHistory), rows)
+
+
+def _bucket_index(dialect: str, origin: int, width: int):
+    # Номер интервала шириной width секунд от origin (секунды epoch). Числа — литералы (целые),
+    # чтобы выражение в SELECT и GROUP BY совпадало текстуально
+    offset = extract("epoch", OfferPriceHistory.ts) - literal_column(str(int(origin)), Integer)
+    width = literal_column(str(int(width)), Integer)
+    if dialect == "postgresql":
+        # EXTRACT возвращает numeric, деление дробное
+        return cast(func.floor(offset / width), Integer)
+    # SQLite: STRFTIME('%s') — целое, деление целочисленное
+    return offset // width
+
+
+async def downsampled_history(db: AsyncSession, offer_id: int, since: datetime, until: datetime,
+                              points: int) -> tuple[int, list[dict]]:
+    # История [since, until), сжатая в БД до points интервалов: min/max/последняя цена и число точек.
+    # Последняя цена — join по (offer_id, max(ts)) через первичный ключ, поэтому запрос одинаков в Postgres и SQLite
+    # Интервалы на целых секундах: [since, until) целиком укладывается в points интервалов
+    origin, end = math.floor(since.timestamp()), math.ceil(until.timestamp())
+    width = max(1, -(-(end - origin) // max(1, points)))
+    bucket = _bucket_index(db.get_bind().dialect.name, origin, width).label("bucket")
+    buckets = (
+        select(
+            bucket,
+            func.min(OfferPriceHistory.price).label("min"),
+            func.max(OfferPriceHistory.price).label("max"),
+            func.max(OfferPriceHistory.ts).label("last_ts"),
+            func.count().label("count"),
+        )
+        .where(OfferPriceHistory.offer_id == offer_id, OfferPriceHistory.ts >= since, OfferPriceHistory.ts < until)
+        .group_by(bucket)
+        .subquery()
+    )
+    result = await db.execute(
+        select(buckets.c.bucket, buckets.c.min, buckets.c.max, OfferPriceHistory.price, buckets.c.count)
+        .join(OfferPriceHistory, and_(OfferPriceHistory.offer_id == offer_id,
+                                      OfferPriceHistory.ts == buckets.c.last_ts))
+        .order_by(buckets.c.bucket)
+    )
+    return width, [
+        {"ts": datetime.fromtimestamp(origin + int(index) * width, timezone.utc), "min": low, "max": high, "last": last, "count": count}
+        for index, low, high, last, count in result.all()
+    ]
@@ -0,0 +1,91 @@
+import asyncio
+import logging
+import time
+
+import numpy as np
+from sqlalchemy import select
+
+from database import get_db_session, engine
+from models import RoomOffer
+from price_feed import price_message
+from pricing import PRICE_TICK_SECONDS, dynamic_prices, price_tick, to_epoch_seconds
+from pubsub import PriceBus, create_price_bus
+
+logger = logging.getLogger(__name__)
+
+# Предложений в одном SELECT ... WHERE id IN (...)
+PUBLISH_CHUNK_SIZE = 1000
+
+
+async def publish_prices_once(bus: PriceBus) -> int:
+    # Один тик: цены всех предложений, на которые есть подписчики у любого API-воркера
+    offer_ids = await bus.active_offers()
+    if not offer_ids:
+        return 0
+    now = time.time()
+    tick = price_tick(now)
+    messages = []
+    async with get_db_session() as db:
+        for offset in range(0, len(offer_ids), PUBLISH_CHUNK_SIZE):
+            chunk = offer_ids[offset:offset + PUBLISH_CHUNK_SIZE]
+            result = await db.execute(
+                select(
+                    RoomOffer.id,
+                    RoomOffer.initial_price,
+                    RoomOffer.min_price,
+                    RoomOffer.popularity_factor,
+                    RoomOffer.created_at
+                ).where(RoomOffer.id.in_(chunk))
+            )
+            rows = result.all()
+            found = {row.id for row in rows}
+            messages.extend({"offer_id": offer_id, "error": "Offer not found"}
+                            for offer_id in chunk if offer_id not in found)
+            if not rows:
+                continue
+            ids, initial_price, min_price, popularity, created_at = zip(*rows)
+            popularity = [p if p is not None else 1.0 for p in popularity]
+            prices = dynamic_prices(
+                np.array(initial_price, dtype=np.float64),
+                np.array(min_price, dtype=np.float64),
+                np.array(popularity, dtype=np.float64),
+                np.array([to_epoch_seconds(c) for c in created_at], dtype=np.float64),
+                now=now,
+                offer_ids=np.array(ids, dtype=np.int64),
+                tick=tick
+            )
+            messages.extend(
+                price_message(offer_id, round(price, 2), pop)
+                for offer_id, price, pop in zip(ids, prices.tolist(), popularity)
+            )
+    await bus.publish(messages)
+    return len(messages)
+
+
+async def run_publisher(bus: PriceBus, interval: float = PRICE_TICK_SECONDS) -> None:
+    while True:
+        started = time.perf_counter()
+        try:
+            published = await publish_prices_once(bus)
+            if published:
+                logger.debug(f"Published {published} price ticks in {time.perf_counter() - started:.3f}s")
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Price publishing failed")
+        await asyncio.sleep(max(0.0, interval - (time.perf_counter() - started)))
+
+
+async def _main() -> None:
+    bus = create_price_bus()
+    try:
+        await run_publisher(bus)
+    finally:
+        await bus.close()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    # Отдельный процесс рядом с Celery-воркером: python price_publisher.py (нужен PRICE_BUS_URL=redis://...)
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main())
@@ -0,0 +1,83 @@
+import os
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+# Границы случайного шума цены (доля от базовой цены)
+PRICE_NOISE = 0.005
+# Максимальный popularity_factor (пересчёт цен и буфер просмотров)
+MAX_JOB_POPULARITY = 5.0
+# Длительность тика цены: в пределах тика детерминированный шум одинаков
+PRICE_TICK_SECONDS = float(os.getenv("PRICE_TICK_SECONDS", "3"))
+
+
+def to_epoch_seconds(value: datetime) -> float:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def price_tick(now: float | None = None) -> int:
+    return int((time.time() if now is None else now) // PRICE_TICK_SECONDS)
+
+
+def popularity_from_views(view_counts: np.ndarray) -> np.ndarray:
+    # Единственная формула popularity_factor — для пересчёта цен и для буфера просмотров:
+    # log(просмотры за окно + 1), не больше MAX_JOB_POPULARITY
+    return np.minimum(np.log(np.asarray(view_counts, dtype=np.float64) + 1), MAX_JOB_POPULARITY)
+
+
+def deterministic_noise(offer_ids: np.ndarray, tick: int) -> np.ndarray:
+    # Псевдослучайное число в [-PRICE_NOISE, PRICE_NOISE), зависящее только от (offer_id, tick):
+    # splitmix64 над offer_id и номером тика, чтобы проверка при бронировании воспроизвела цену клиента
+    x = (np.asarray(offer_ids, dtype=np.uint64) << np.uint64(32)) ^ np.uint64(tick & 0xFFFFFFFF)
+    x = x + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    x = x ^ (x >> np.uint64(31))
+    unit = (x >> np.uint64(11)).astype(np.float64) * (1.0 / (1 << 53))
+    return (unit * 2.0 - 1.0) * PRICE_NOISE
+
+
+def dynamic_prices(
+        initial_price: np.ndarray,
+        min_price: np.ndarray,
+        popularity_factor: np.ndarray,
+        created_at: np.ndarray,
+        now: float,
+        rng: np.random.Generator | None = None,
+        offer_ids: np.ndarray | None = None,
+        tick: int | None = None
+) -> np.ndarray:
+    # Цены для массива предложений за один проход. created_at и now — секунды Unix epoch.
+    # Шум: детерминированный, если переданы offer_ids и tick; иначе из rng (можно задать seed)
+    initial_price = np.asarray(initial_price, dtype=np.float64)
+    time_elapsed_hours = (now - np.asarray(created_at, dtype=np.float64)) / 3600
+    k = np.maximum(0.1, 1.0 - (np.asarray(popularity_factor, dtype=np.float64) - 1.0) * 0.01)
+    base_price = initial_price * np.exp(-k * time_elapsed_hours)
+    if offer_ids is not None and tick is not None:
+        noise = base_price * deterministic_noise(offer_ids, tick)
+    else:
+        rng = rng if rng is not None else np.random.default_rng()
+        noise = base_price * rng.uniform(-PRICE_NOISE, PRICE_NOISE, size=base_price.shape)
+    return np.maximum(base_price + noise, np.asarray(min_price, dtype=np.float64))
+
+
+def calculate_dynamic_price(offer, now: float | None = None, tick: int | None = None,
+                            rng: np.random.Generator | None = None) -> float:
+    # Цена одного предложения (ORM-объект или строка с теми же атрибутами).
+    # С tick шум детерминирован для (offer.id, tick)
+    now = time.time() if now is None else now
+    popularity_factor = offer.popularity_factor if offer.popularity_factor is not None else 1.0
+    prices = dynamic_prices(
+        np.array([offer.initial_price]),
+        np.array([offer.min_price]),
+        np.array([popularity_factor]),
+        np.array([to_epoch_seconds(offer.created_at)]),
+        now=now,
+        rng=rng,
+        offer_ids=np.array([offer.id]) if tick is not None else None,
+        tick=tick
+    )
+    return float(prices[0])
@@ -0,0 +1,119 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Iterable
+
+logger = logging.getLogger(__name__)
+
+# Шина цен между процессами: memory:// — в пределах процесса (тесты, один воркер), redis://... — общая
+PRICE_BUS_URL = os.getenv("PRICE_BUS_URL", "memory://")
+# Сколько секунд предложение считается активным после последнего анонса от API-воркера
+PRICE_BUS_ACTIVE_TTL = float(os.getenv("PRICE_BUS_ACTIVE_TTL", "10"))
+
+
+class PriceBus(ABC):
+    # API-воркеры анонсируют предложения, на которые есть подписчики, и слушают тики цен;
+    # публикатор читает активные предложения и рассылает по ним тики пакетом
+
+    @abstractmethod
+    async def publish(self, messages: list[dict]) -> None:
+        ...
+
+    @abstractmethod
+    def listen(self) -> AsyncIterator[dict]:
+        ...
+
+    @abstractmethod
+    async def announce(self, offer_ids: Iterable[int]) -> None:
+        ...
+
+    @abstractmethod
+    async def active_offers(self) -> list[int]:
+        ...
+
+    async def close(self) -> None:
+        pass
+
+
+class InMemoryPriceBus(PriceBus):
+
+    def __init__(self, active_ttl: float = PRICE_BUS_ACTIVE_TTL):
+        self._active_ttl = active_ttl
+        self._listeners: set[asyncio.Queue] = set()
+        self._active: dict[int, float] = {}
+
+    async def publish(self, messages: list[dict]) -> None:
+        for queue in self._listeners:
+            queue.put_nowait(messages)
+
+    async def listen(self) -> AsyncIterator[dict]:
+        queue = asyncio.Queue()
+        self._listeners.add(queue)
+        try:
+            while True:
+                for message in await queue.get():
+                    yield message
+        finally:
+            self._listeners.discard(queue)
+
+    async def announce(self, offer_ids: Iterable[int]) -> None:
+        expires_at = time.monotonic() + self._active_ttl
+        for offer_id in offer_ids:
+            self._active[offer_id] = expires_at
+
+    async def active_offers(self) -> list[int]:
+        now = time.monotonic()
+        self._active = {offer_id: expires for offer_id, expires in self._active.items() if expires > now}
+        return list(self._active)
+
+
+class RedisPriceBus(PriceBus):
+    # Тики публикуются одним сообщением на пакет в канал; активные предложения — sorted set со сроком в score
+
+    def __init__(self, url: str, channel: str = "prices", active_ttl: float = PRICE_BUS_ACTIVE_TTL):
+        import redis.asyncio as redis
+
+        self._redis = redis.Redis.from_url(url)
+        self._channel = channel
+        self._active_key = f"{channel}:active"
+        self._active_ttl = active_ttl
+
+    async def publish(self, messages: list[dict]) -> None:
+        await self._redis.publish(self._channel, json.dumps(messages))
+
+    async def listen(self) -> AsyncIterator[dict]:
+        pubsub = self._redis.pubsub()
+        await pubsub.subscribe(self._channel)
+        try:
+            async for message in pubsub.listen():
+                if message["type"] != "message":
+                    continue
+                for item in json.loads(message["data"]):
+                    yield item
+        finally:
+            await pubsub.unsubscribe(self._channel)
+            await pubsub.aclose()
+
+    async def announce(self, offer_ids: Iterable[int]) -> None:
+        expires_at = time.time() + self._active_ttl
+        mapping = {str(offer_id): expires_at for offer_id in offer_ids}
+        if mapping:
+            await self._redis.zadd(self._active_key, mapping)
+
+    async def active_offers(self) -> list[int]:
+        await self._redis.zremrangebyscore(self._active_key, "-inf", time.time())
+        return [int(offer_id) for offer_id in await self._redis.zrange(self._active_key, 0, -1)]
+
+    async def close(self) -> None:
+        await self._redis.aclose()
+
+
+def create_price_bus(url: str = PRICE_BUS_URL) -> PriceBus:
+    if url.startswith("memory://"):
+        return InMemoryPriceBus()
+    if url.startswith(("redis://", "rediss://")):
+        return RedisPriceBus(url)
+    raise ValueError(f"Неизвестная шина цен: {url}")
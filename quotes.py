@@ -0,0 +1,60 @@
+import base64
+import hashlib
+import hmac
+import os
+import time
+from dataclasses import dataclass
+
+from utils import SECRET_KEY
+
+# Сколько секунд котировка цены остаётся действительной для бронирования
+QUOTE_TTL_SECONDS = int(os.getenv("QUOTE_TTL_SECONDS", "30"))
+
+_QUOTE_KEY = hashlib.sha256(b"price-quote:" + SECRET_KEY.encode()).digest()
+
+
+class QuoteError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class Quote:
+    token: str
+    offer_id: int
+    price: float
+    expires_at: int
+
+
+def _sign(payload: str) -> str:
+    digest = hmac.new(_QUOTE_KEY, payload.encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
+
+
+def issue_quote(offer_id: int, price: float, ttl: int = QUOTE_TTL_SECONDS, now: float | None = None) -> Quote:
+    # Котировка: "<offer_id>.<цена в копейках>.<истекает, epoch>.<подпись>"
+    price_cents = int(round(price * 100))
+    expires_at = int(time.time() if now is None else now) + ttl
+    payload = f"{offer_id}.{price_cents}.{expires_at}"
+    return Quote(token=f"{payload}.{_sign(payload)}", offer_id=offer_id, price=price_cents / 100,
+                 expires_at=expires_at)
+
+
+def verify_quote(token: str, offer_id: int, now: float | None = None) -> float:
+    # Только проверка подписи и срока, без расчёта цены. Возвращает цену из котировки
+    try:
+        quoted_offer_id, price_cents, expires_at, signature = token.split(".")
+        payload = f"{int(quoted_offer_id)}.{int(price_cents)}.{int(expires_at)}"
+    except ValueError:
+        raise QuoteError("Malformed price quote")
+    # Сравнение байтов: compare_digest не принимает строки с не-ASCII символами (TypeError)
+    try:
+        signature = signature.encode()
+    except UnicodeError:
+        raise QuoteError("Malformed price quote")
+    if not hmac.compare_digest(signature, _sign(payload).encode()):
+        raise QuoteError("Invalid price quote signature")
+    if int(quoted_offer_id) != offer_id:
+        raise QuoteError("Price quote was issued for another offer")
+    if int(expires_at) < (time.time() if now is None else now):
+        raise QuoteError("Price quote has expired")
+    return int(price_cents) / 100
@@ -0,0 +1,216 @@
+import logging
+import math
+import os
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from fastapi import HTTPException, Request, status
+from jose import JWTError, jwt
+
+from metrics import Counter
+from utils import ALGORITHM, SECRET_KEY
+
+logger = logging.getLogger(__name__)
+
+# Хранилище корзин: memory:// — в памяти процесса (лимит на воркер), redis://... — общее для всех воркеров
+RATE_LIMIT_URL = os.getenv("RATE_LIMIT_URL", "memory://")
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes", "on")
+# Брать адрес клиента из X-Forwarded-For (только за доверенным прокси)
+RATE_LIMIT_TRUST_FORWARDED = os.getenv("RATE_LIMIT_TRUST_FORWARDED", "false").lower() in ("1", "true", "yes", "on")
+# Сколько корзин хранит процесс; вытесненная корзина начинается заново полной
+RATE_LIMIT_MEMORY_KEYS = int(os.getenv("RATE_LIMIT_MEMORY_KEYS", "100000"))
+
+rate_limit_allowed = Counter("rate_limit_allowed_total", "Requests admitted by the rate limiter", ("endpoint",))
+rate_limit_rejected = Counter(
+    "rate_limit_rejected_total", "Requests rejected by the rate limiter", ("endpoint", "limit")
+)
+rate_limit_errors = Counter("rate_limit_errors_total", "Rate limit store errors (requests were admitted)")
+
+
+@dataclass(frozen=True)
+class Limit:
+    rate: float  # Токенов в секунду
+    burst: int  # Ёмкость корзины
+
+    def __post_init__(self):
+        # rate <= 0 — деление на ноль в Retry-After и корзина, которая не наполняется; burst < 1 — отказ всем
+        if not (self.rate > 0 and math.isfinite(self.rate)) or self.burst < 1:
+            raise ValueError(f"Недопустимый лимит: rate={self.rate}, burst={self.burst} (нужны конечный rate > 0 и burst >= 1)")
+
+    @classmethod
+    def from_env(cls, name: str, default: str) -> "Limit":
+        # Формат "<токенов в секунду>:<ёмкость>", например "1:10"; ошибка формата — при старте процесса
+        value = os.getenv(name, default)
+        try:
+            rate, burst = value.split(":")
+            return cls(float(rate), int(burst))
+        except ValueError as e:
+            raise ValueError(f"{name}={value!r}: {e}") from e
+
+
+# Просмотры: с одного клиента и суммарно на одно предложение (защита popularity_factor от накрутки)
+VIEW_CLIENT_LIMIT = Limit.from_env("RATE_LIMIT_VIEW_CLIENT", "1:10")
+VIEW_OFFER_LIMIT = Limit.from_env("RATE_LIMIT_VIEW_OFFER", "200:1000")
+# Бронирования: с одного клиента и на одно «горячее» предложение
+BOOK_CLIENT_LIMIT = Limit.from_env("RATE_LIMIT_BOOK_CLIENT", "0.5:5")
+BOOK_OFFER_LIMIT = Limit.from_env("RATE_LIMIT_BOOK_OFFER", "20:50")
+
+
+class RateLimitStore(ABC):
+    # Атомарно берёт по токену из каждой корзины: либо из всех, либо ни из одной.
+    # Возвращает None при успехе или (индекс отказавшей корзины, через сколько секунд повторить)
+
+    @abstractmethod
+    async def take(self, buckets: list[tuple[str, Limit]]) -> tuple[int, float] | None:
+        ...
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryRateLimitStore(RateLimitStore):
+    # Без await внутри take: в одном event loop проверка и списание атомарны без блокировок
+
+    def __init__(self, maxsize: int = RATE_LIMIT_MEMORY_KEYS):
+        self._maxsize = maxsize
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()  # ключ -> (токены, время)
+
+    async def take(self, buckets: list[tuple[str, Limit]]) -> tuple[int, float] | None:
+        now = time.monotonic()
+        refilled = []
+        for index, (key, limit) in enumerate(buckets):
+            tokens, updated_at = self._buckets.get(key, (limit.burst, now))
+            tokens = min(limit.burst, tokens + (now - updated_at) * limit.rate)
+            if tokens < 1:
+                return index, (1 - tokens) / limit.rate
+            refilled.append(tokens)
+        for (key, _), tokens in zip(buckets, refilled):
+            self._buckets[key] = (tokens - 1, now)
+            self._buckets.move_to_end(key)
+        while len(self._buckets) > self._maxsize:
+            self._buckets.popitem(last=False)
+        return None
+
+
+class RedisRateLimitStore(RateLimitStore):
+    # Все корзины запроса проверяются одним Lua-скриптом (один round trip); время — TIME сервера Redis,
+    # поэтому расхождение часов воркеров не влияет. Корзина истекает, когда успела бы наполниться
+
+    _TAKE_SCRIPT = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local tokens = {}
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[2 * i - 1])
+    local burst = tonumber(ARGV[2 * i])
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local value = burst
+    if state[1] then
+        value = math.min(burst, tonumber(state[1]) + (now - tonumber(state[2])) * rate)
+    end
+    if value < 1 then
+        return {i, tostring((1 - value) / rate)}
+    end
+    tokens[i] = value
+end
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[2 * i - 1])
+    local burst = tonumber(ARGV[2 * i])
+    redis.call('HSET', key, 'tokens', tostring(tokens[i] - 1), 'ts', tostring(now))
+    redis.call('EXPIRE', key, math.ceil(burst / rate) + 1)
+end
+return {0, '0'}
+"""
+
+    def __init__(self, url: str, prefix: str = "ratelimit"):
+        import redis.asyncio as redis
+
+        self._redis = redis.Redis.from_url(url)
+        self._prefix = prefix
+        self._take = self._redis.register_script(self._TAKE_SCRIPT)
+
+    async def take(self, buckets: list[tuple[str, Limit]]) -> tuple[int, float] | None:
+        args = []
+        for _, limit in buckets:
+            args += [limit.rate, limit.burst]
+        index, retry_after = await self._take(keys=[f"{self._prefix}:{key}" for key, _ in buckets], args=args)
+        return None if int(index) == 0 else (int(index) - 1, float(retry_after))
+
+    async def close(self) -> None:
+        await self._redis.aclose()
+
+
+def create_rate_limit_store(url: str = RATE_LIMIT_URL) -> RateLimitStore:
+    if url.startswith("memory://"):
+        return MemoryRateLimitStore()
+    if url.startswith(("redis://", "rediss://")):
+        return RedisRateLimitStore(url)
+    raise ValueError(f"Неизвестное хранилище лимитов: {url}")
+
+
+def client_key(request: Request) -> str:
+    # Пользователь из Bearer-токена (только проверка подписи, без БД), иначе IP-адрес
+    authorization = request.headers.get("authorization", "")
+    if authorization[:7].lower() == "bearer ":
+        try:
+            subject = jwt.decode(authorization[7:], SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+        except JWTError:
+            subject = None
+        if subject:
+            return f"user:{subject}"
+    forwarded = request.headers.get("x-forwarded-for") if RATE_LIMIT_TRUST_FORWARDED else None
+    if forwarded:
+        return f"ip:{forwarded.split(',')[0].strip()}"
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+
+class RateLimiter:
+    # Ошибки хранилища не блокируют запросы: лимит временно не действует, растёт rate_limit_errors_total
+
+    def __init__(self, store: RateLimitStore, enabled: bool = RATE_LIMIT_ENABLED):
+        self.store = store
+        self.enabled = enabled
+
+    def use(self, store: RateLimitStore) -> None:
+        self.store = store
+
+    async def check(self, endpoint: str, buckets: list[tuple[str, str, Limit]]) -> None:
+        # buckets: (название лимита для метрик, ключ корзины, лимит)
+        if not self.enabled:
+            return
+        try:
+            rejected = await self.store.take([(f"{endpoint}:{key}", limit) for _, key, limit in buckets])
+        except Exception:
+            logger.exception(f"Rate limit check failed for {endpoint}")
+            rate_limit_errors.inc()
+            return
+        if rejected is None:
+            rate_limit_allowed.inc(endpoint=endpoint)
+            return
+        index, retry_after = rejected
+        rate_limit_rejected.inc(endpoint=endpoint, limit=buckets[index][0])
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many requests",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+
+    async def close(self) -> None:
+        await self.store.close()
+
+
+rate_limiter = RateLimiter(create_rate_limit_store())
+
+
+def offer_rate_limit(endpoint: str, per_client: Limit, per_offer: Limit):
+    # Зависимость маршрута с параметром пути offer_id. Подключается через dependencies=[...] в декораторе:
+    # такие зависимости выполняются раньше get_db и get_current_user, отказ не трогает БД
+    async def dependency(request: Request, offer_id: int) -> None:
+        await rate_limiter.check(endpoint, [
+            ("client", client_key(request), per_client),
+            ("offer", f"offer:{offer_id}", per_offer),
+        ])
+
+    return dependency
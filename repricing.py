@@ -0,0 +1,124 @@
+import logging
+import os
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from leaderboard import leaderboard, offer_entry
+from models import Room, RoomOffer
+from price_history import record_prices
+from pricing import dynamic_prices, popularity_from_views, to_epoch_seconds
+from rollups import windowed_view_counts
+
+logger = logging.getLogger(__name__)
+
+# Сколько предложений читаем и обновляем за один шаг
+REPRICE_CHUNK_SIZE = int(os.getenv("REPRICE_CHUNK_SIZE", "5000"))
+
+
+async def offer_id_shards(db: AsyncSession, shards: int) -> list[tuple[int, int]]:
+    # Делит диапазон id предложений на shards смежных отрезков [min_id, max_id]
+    result = await db.execute(select(func.min(RoomOffer.id), func.max(RoomOffer.id)))
+    lowest, highest = result.one()
+    if lowest is None:
+        return []
+    step = -(-(highest - lowest + 1) // max(1, shards))
+    return [(start, min(start + step - 1, highest)) for start in range(lowest, highest + 1, step)]
+
+
+async def _update_leaderboard(ids, changed, prices, popularity, room_ids, available, hotel_ids) -> None:
+    # Рейтинги (leaderboard): изменившиеся цены, плюс доступные предложения, которых в рейтинге нет
+    # (снова в продаже); распроданные предложения убираются из рейтинга
+    in_stock, sold_out, unchanged = [], [], []
+    for position in range(len(ids)):
+        if available[position] is not None and available[position] <= 0:
+            sold_out.append({"offer_id": int(ids[position]), "hotel_id": hotel_ids[position]})
+            continue
+        entry = offer_entry(int(ids[position]), hotel_ids[position], room_ids[position],
+                            float(prices[position]), float(popularity[position]))
+        (in_stock if changed[position] else unchanged).append(entry)
+    await leaderboard.apply(in_stock, sold_out, unchanged)
+
+
+async def reprice_offers(db: AsyncSession, chunk_size: int = REPRICE_CHUNK_SIZE,
+                         min_id: int | None = None, max_id: int | None = None) -> dict:
+    # min_id/max_id — пересчёт одного шарда (см. tasks.reprice_offer_shard), по умолчанию все предложения
+    started = time.perf_counter()
+    now = datetime.now(timezone.utc)
+    view_counts = await windowed_view_counts(db, now=now, min_id=min_id, max_id=max_id)
+    logger.info(f"Repricing: loaded view counts for {len(view_counts)} offers "
+                f"in {time.perf_counter() - started:.2f}s")
+
+    processed = updated = chunks = 0
+    last_id = 0 if min_id is None else min_id - 1
+    while True:
+        # Keyset-пагинация по id: каждый шаг читает только нужные колонки
+        query = (
+            select(
+                RoomOffer.id,
+                RoomOffer.initial_price,
+                RoomOffer.min_price,
+                RoomOffer.popularity_factor,
+                RoomOffer.current_price,
+                RoomOffer.created_at,
+                RoomOffer.room_id,
+                RoomOffer.available,
+                Room.hotel_id
+            )
+            .outerjoin(Room, Room.id == RoomOffer.room_id)
+            .where(RoomOffer.id > last_id)
+            .order_by(RoomOffer.id)
+            .limit(chunk_size)
+        )
+        if max_id is not None:
+            query = query.where(RoomOffer.id <= max_id)
+        result = await db.execute(query)
+        rows = result.all()
+        if not rows:
+            break
+        chunk_started = time.perf_counter()
+        (ids, initial_price, min_price, old_popularity, old_price, created_at,
+         room_ids, available, hotel_ids) = zip(*rows)
+
+        ids = np.array(ids, dtype=np.int64)
+        counts = np.array([view_counts.get(offer_id, 0) for offer_id in ids.tolist()], dtype=np.int64)
+        popularity = popularity_from_views(counts)
+        prices = dynamic_prices(
+            np.array(initial_price, dtype=np.float64),
+            np.array(min_price, dtype=np.float64),
+            popularity,
+            np.array([to_epoch_seconds(c) for c in created_at], dtype=np.float64),
+            now=now.timestamp()
+        )
+        old_popularity = np.array([p if p is not None else np.nan for p in old_popularity], dtype=np.float64)
+        changed = (popularity != old_popularity) | (prices != np.array(old_price, dtype=np.float64))
+
+        if changed.any():
+            # ORM bulk UPDATE по первичному ключу (executemany)
+            await db.execute(
+                update(RoomOffer),
+                [
+                    {"id": offer_id, "popularity_factor": pop, "current_price": price}
+                    for offer_id, pop, price in zip(
+                        ids[changed].tolist(), popularity[changed].tolist(), prices[changed].tolist()
+                    )
+                ]
+            )
+            # Точки истории цен пишутся в той же транзакции, что и новые цены
+            await record_prices(db, ids[changed].tolist(), prices[changed].tolist(), now)
+        await db.commit()
+        await _update_leaderboard(ids, changed, prices, popularity, room_ids, available, hotel_ids)
+
+        chunks += 1
+        processed += len(rows)
+        updated += int(changed.sum())
+        last_id = int(ids[-1])
+        logger.info(f"Repricing: chunk {chunks} ({len(rows)} offers, {int(changed.sum())} updated) "
+                    f"in {time.perf_counter() - chunk_started:.2f}s, total {processed}")
+
+    elapsed = time.perf_counter() - started
+    logger.info(f"Repricing finished: {processed} offers, {updated} updated, {chunks} chunks in {elapsed:.2f}s")
+    return {"processed": processed, "updated": updated, "chunks": chunks, "seconds": round(elapsed, 3)}
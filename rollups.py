@@ -0,0 +1,125 @@
+import logging
+import os
+from collections import Counter
+from datetime import datetime, timezone, timedelta
+from typing import Iterable
+
+from sqlalchemy import select, delete, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import OfferView, OfferViewRollup
+
+logger = logging.getLogger(__name__)
+
+# Размер интервала агрегации просмотров
+ROLLUP_BUCKET = timedelta(minutes=int(os.getenv("VIEW_ROLLUP_BUCKET_MINUTES", "5")))
+# Окно популярности: 12 часов = 144 интервала по 5 минут
+ROLLUP_WINDOW = timedelta(hours=12)
+# Сколько сырых просмотров удаляет один DELETE при очистке
+RETENTION_CHUNK_SIZE = int(os.getenv("VIEW_RETENTION_CHUNK_SIZE", "10000"))
+# Максимум строк в одном UPSERT агрегатов
+ROLLUP_UPSERT_CHUNK_SIZE = 5000
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def bucket_start(timestamp: datetime) -> datetime:
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return timestamp - (timestamp - _EPOCH) % ROLLUP_BUCKET
+
+
+def window_start(now: datetime | None = None) -> datetime:
+    # Первый интервал окна: текущий интервал плюс предыдущие, всего ROLLUP_WINDOW / ROLLUP_BUCKET
+    return bucket_start(now or datetime.now(timezone.utc)) - ROLLUP_WINDOW + ROLLUP_BUCKET
+
+
+async def add_views(db: AsyncSession, events: Iterable[tuple[int, datetime]]) -> None:
+    # Увеличивает счётчики интервалов многострочным UPSERT (без commit)
+    await _upsert_counts(db, Counter((offer_id, bucket_start(timestamp)) for offer_id, timestamp in events))
+
+
+async def _upsert_counts(db: AsyncSession, counts: dict[tuple[int, datetime], int]) -> None:
+    insert = pg_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+    items = list(counts.items())
+    # Ограничиваем размер одного VALUES, чтобы не упереться в лимит параметров драйвера
+    for offset in range(0, len(items), ROLLUP_UPSERT_CHUNK_SIZE):
+        stmt = insert(OfferViewRollup).values([
+            {"offer_id": offer_id, "bucket_start": bucket, "view_count": count}
+            for (offer_id, bucket), count in items[offset:offset + ROLLUP_UPSERT_CHUNK_SIZE]
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[OfferViewRollup.offer_id, OfferViewRollup.bucket_start],
+            set_={"view_count": OfferViewRollup.view_count + stmt.excluded.view_count}
+        )
+        await db.execute(stmt)
+
+
+async def windowed_view_counts(db: AsyncSession, offer_ids: Iterable[int] | None = None,
+                               now: datetime | None = None, min_id: int | None = None,
+                               max_id: int | None = None) -> dict[int, int]:
+    # Просмотры за окно: сумма не более 144 интервалов на предложение вместо COUNT(*) по offer_views
+    query = (
+        select(OfferViewRollup.offer_id, func.sum(OfferViewRollup.view_count))
+        .where(OfferViewRollup.bucket_start >= window_start(now))
+        .group_by(OfferViewRollup.offer_id)
+    )
+    if offer_ids is not None:
+        query = query.where(OfferViewRollup.offer_id.in_(list(offer_ids)))
+    # Диапазон id — для шарда пересчёта цен
+    if min_id is not None:
+        query = query.where(OfferViewRollup.offer_id >= min_id)
+    if max_id is not None:
+        query = query.where(OfferViewRollup.offer_id <= max_id)
+    result = await db.execute(query)
+    return {offer_id: int(count) for offer_id, count in result.all()}
+
+
+async def rebuild_rollups(db: AsyncSession, now: datetime | None = None) -> int:
+    # Заполняет интервалы окна из сырых offer_views (однократно при переходе на агрегаты)
+    since = window_start(now)
+    await db.execute(delete(OfferViewRollup).where(OfferViewRollup.bucket_start >= since))
+    result = await db.stream(
+        select(OfferView.offer_id, OfferView.timestamp).where(OfferView.timestamp >= since)
+    )
+    counts = Counter()
+    async for offer_id, timestamp in result:
+        counts[(offer_id, bucket_start(timestamp))] += 1
+    await _upsert_counts(db, counts)
+    await db.commit()
+    return sum(counts.values())
+
+
+async def purge_expired_views(db: AsyncSession, now: datetime | None = None,
+                              chunk_size: int = RETENTION_CHUNK_SIZE) -> dict:
+    # Удаляет сырые просмотры и интервалы старше окна; сырые удаляются частями по chunk_size
+    now = now or datetime.now(timezone.utc)
+    cutoff = window_start(now)
+    views_deleted = 0
+    while True:
+        expired_ids = select(OfferView.id).where(OfferView.timestamp < cutoff).limit(chunk_size)
+        result = await db.execute(delete(OfferView).where(OfferView.id.in_(expired_ids.scalar_subquery())))
+        await db.commit()
+        views_deleted += result.rowcount
+        if result.rowcount < chunk_size:
+            break
+    result = await db.execute(delete(OfferViewRollup).where(OfferViewRollup.bucket_start < cutoff))
+    await db.commit()
+    logger.info(f"Purged {views_deleted} raw offer views and {result.rowcount} rollup buckets older than {cutoff}")
+    return {"views_deleted": views_deleted, "rollups_deleted": result.rowcount}
+
+
+if __name__ == "__main__":
+    # python rollups.py — однократное заполнение агрегатов из сырых просмотров
+    import asyncio
+    from database import get_db_session, engine
+
+    async def _rebuild():
+        async with get_db_session() as db:
+            logger.info(f"Rebuilt rollups from {await rebuild_rollups(db)} raw views")
+        await engine.dispose()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_rebuild())
@@ -1,7 +1,209 @@
-from fastapi import APIRouter
+import csv
+import io
+import os
+import zlib
+from datetime import datetime
+from typing import AsyncIterator, Literal
+
+import orjson
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Select, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import get_db, get_db_session
+from metrics import Counter
+from models import Hotel, Room, RoomOffer, OfferPriceHistory, OfferView, OfferViewRollup, User
+from utils import get_current_user
 
 router = APIRouter()
 
+# Строк в одной порции серверного курсора (и в одном куске ответа)
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "1000"))
+EXPORT_GZIP_LEVEL = int(os.getenv("EXPORT_GZIP_LEVEL", "6"))
+
+export_rows = Counter("export_rows_total", "Rows streamed by business exports", ("export",))
+
+ExportFormat = Literal["ndjson", "csv"]
+
+_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+
+
 @router.get("/")
 def read_business():
-    return {"message": "Business endpoint"}
\ No newline at end of file
+    return {"message": "Business endpoint"}
+
+
+def _encode_ndjson(columns: list[str], rows) -> bytes:
+    return b"".join(orjson.dumps(dict(zip(columns, row)), option=orjson.OPT_UTC_Z) + b"\n" for row in rows)
+
+
+def _encode_csv(columns: list[str], rows) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(
+        [value.isoformat() if isinstance(value, datetime) else value for value in row] for row in rows
+    )
+    return buffer.getvalue().encode()
+
+
+async def _stream_export(name: str, query: Select, export_format: ExportFormat, gzip: bool) -> AsyncIterator[bytes]:
+    # Сессия открывается внутри генератора: зависимость get_db закрывается до начала отправки тела.
+    # db.stream + yield_per — серверный курсор, в памяти не больше одной порции строк
+    columns = [column.key for column in query.selected_columns]
+    encode = _encode_ndjson if export_format == "ndjson" else _encode_csv
+    compressor = zlib.compressobj(EXPORT_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS) if gzip else None
+
+    def emit(data: bytes) -> bytes:
+        return compressor.compress(data) if compressor else data
+
+    if export_format == "csv":
+        yield emit(_encode_csv(columns, [columns]))
+    async with get_db_session() as db:
+        result = await db.stream(query.execution_options(yield_per=EXPORT_CHUNK_SIZE))
+        async for rows in result.partitions():
+            export_rows.inc(len(rows), export=name)
+            chunk = emit(encode(columns, rows))
+            if chunk:
+                yield chunk
+    if compressor:
+        yield compressor.flush()
+
+
+async def _export_response(name: str, query: Select, export_format: ExportFormat,
+                           accept_encoding: str | None) -> StreamingResponse:
+    gzip = "gzip" in (accept_encoding or "").lower()
+    headers = {
+        "Content-Disposition": f'attachment; filename="{name}.{export_format}"',
+        "Vary": "Accept-Encoding",
+    }
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(_stream_export(name, query, export_format, gzip),
+                             media_type=_MEDIA_TYPES[export_format], headers=headers)
+
+
+async def _owner_hotel_filter(db: AsyncSession, current_user: User, hotel_id: int | None):
+    # Экспорт доступен только бизнес-пользователю и только по его отелям
+    if current_user.role != "business":
+        raise HTTPException(status_code=403, detail="Only business users can export data")
+    if hotel_id is not None:
+        result = await db.execute(select(Hotel.owner_id).filter(Hotel.id == hotel_id))
+        if result.scalar_one_or_none() != current_user.id:
+            raise HTTPException(status_code=404, detail="Hotel not found")
+        return Hotel.id == hotel_id
+    return Hotel.owner_id == current_user.id
+
+
+@router.get("/exports/offers")
+async def export_offers(
+    format: ExportFormat = "ndjson",
+    hotel_id: int | None = None,
+    accept_encoding: str | None = Header(None),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    owner_filter = await _owner_hotel_filter(db, current_user, hotel_id)
+    query = (
+        select(
+            Hotel.id.label("hotel_id"),
+            Hotel.name.label("hotel_name"),
+            Room.id.label("room_id"),
+            Room.room_number,
+            Room.room_type,
+            RoomOffer.id.label("offer_id"),
+            RoomOffer.start_date,
+            RoomOffer.end_date,
+            RoomOffer.initial_price,
+            RoomOffer.min_price,
+            RoomOffer.current_price,
+            RoomOffer.popularity_factor,
+            RoomOffer.available,
+            RoomOffer.created_at,
+        )
+        .join(Room, Room.hotel_id == Hotel.id)
+        .join(RoomOffer, RoomOffer.room_id == Room.id)
+        .where(owner_filter)
+        .order_by(RoomOffer.id)
+    )
+    return await _export_response("offers", query, format, accept_encoding)
+
+
+@router.get("/exports/views")
+async def export_views(
+    format: ExportFormat = "ndjson",
+    hotel_id: int | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    raw: bool = False,  # True — отдельные просмотры из offer_views, иначе счётчики по интервалам
+    accept_encoding: str | None = Header(None),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    owner_filter = await _owner_hotel_filter(db, current_user, hotel_id)
+    if raw:
+        time_column = OfferView.timestamp
+        # Порядок по первичному ключу (порядок вставки): план идёт по индексу и отдаёт первые строки сразу,
+        # без сортировки всей выборки, как было бы с ORDER BY offer_id, timestamp
+        query = select(
+            Hotel.id.label("hotel_id"),
+            Room.id.label("room_id"),
+            OfferView.offer_id,
+            OfferView.timestamp,
+        ).order_by(OfferView.id)
+        source = OfferView
+    else:
+        time_column = OfferViewRollup.bucket_start
+        query = select(
+            Hotel.id.label("hotel_id"),
+            Room.id.label("room_id"),
+            OfferViewRollup.offer_id,
+            OfferViewRollup.bucket_start,
+            OfferViewRollup.view_count,
+        ).order_by(OfferViewRollup.offer_id, OfferViewRollup.bucket_start)
+        source = OfferViewRollup
+    query = (
+        query.select_from(Hotel)
+        .join(Room, Room.hotel_id == Hotel.id)
+        .join(RoomOffer, RoomOffer.room_id == Room.id)
+        .join(source, source.offer_id == RoomOffer.id)
+        .where(owner_filter)
+    )
+    if since is not None:
+        query = query.where(time_column >= since)
+    if until is not None:
+        query = query.where(time_column < until)
+    return await _export_response("views" if raw else "view_counts", query, format, accept_encoding)
+
+
+@router.get("/exports/price-history")
+async def export_price_history(
+    format: ExportFormat = "ndjson",
+    hotel_id: int | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    accept_encoding: str | None = Header(None),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    # Полная (без прореживания) история цен предложений владельца
+    owner_filter = await _owner_hotel_filter(db, current_user, hotel_id)
+    query = (
+        select(
+            Hotel.id.label("hotel_id"),
+            Room.id.label("room_id"),
+            OfferPriceHistory.offer_id,
+            OfferPriceHistory.ts,
+            OfferPriceHistory.price,
+        )
+        .select_from(Hotel)
+        .join(Room, Room.hotel_id == Hotel.id)
+        .join(RoomOffer, RoomOffer.room_id == Room.id)
+        .join(OfferPriceHistory, OfferPriceHistory.offer_id == RoomOffer.id)
+        .where(owner_filter)
+        .order_by(OfferPriceHistory.offer_id, OfferPriceHistory.ts)
+    )
+    if since is not None:
+        query = query.where(OfferPriceHistory.ts >= since)
+    if until is not None:
+        query = query.where(OfferPriceHistory.ts < until)
+    return await _export_response("price_history", query, format, accept_encoding)
@@ -1,33 +1,60 @@
+from datetime import datetime, UTC
+import os
+
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, delete
-from models import Favorite, Room, User
+from sqlalchemy import and_, delete, func, insert, literal, select
+from models import Favorite, Hotel, Room, RoomOffer, User
 from database import get_db
+from schemas import FavoriteRoomResponse
 from utils import get_current_user
+from serialization import FastJSONResponse
+from cache import TTLCache
 
 router = APIRouter()
 
+# Список избранных room_id пользователя в памяти процесса — только для чтения (GET).
+# Ответы add/remove определяет БД (ограничение user_room_unique и rowcount DELETE), кэш после записи сбрасывается;
+# изменения из других процессов видны здесь не позже чем через FAVORITES_CACHE_TTL_SECONDS
+FAVORITES_CACHE_TTL_SECONDS = float(os.getenv("FAVORITES_CACHE_TTL_SECONDS", "60"))
+FAVORITES_CACHE_SIZE = int(os.getenv("FAVORITES_CACHE_SIZE", "10000"))
+
+_favorites_cache = TTLCache(maxsize=FAVORITES_CACHE_SIZE, ttl=FAVORITES_CACHE_TTL_SECONDS)
+
+
+def _is_unique_violation(error: IntegrityError) -> bool:
+    # Повтор пары (user_id, room_id). Postgres: SQLSTATE 23505 и имя ограничения — у asyncpg в исходном
+    # исключении (__cause__), у psycopg в diag; текст сообщения проверяется только для SQLite
+    orig = error.orig
+    if getattr(orig, "sqlstate", None) is not None:
+        diag = getattr(orig, "diag", None)
+        constraint = getattr(diag, "constraint_name", None) or getattr(orig.__cause__, "constraint_name", None)
+        return orig.sqlstate == "23505" and constraint in (None, "user_room_unique")
+    return "UNIQUE constraint failed: favorites.user_id, favorites.room_id" in str(orig)
+
 
 @router.post("/{room_id}", status_code=201)
 async def add_favorite(room_id: int, db: AsyncSession = Depends(get_db),
                        current_user: User = Depends(get_current_user)):
-    # Проверяем, существует ли номер
-    result = await db.execute(select(Room).filter(Room.id == room_id))
-    room = result.scalar_one_or_none()
-    if not room:
+    # INSERT ... SELECT: строка вставляется, только если номер существует; дубликат ловит user_room_unique
+    try:
+        result = await db.execute(
+            insert(Favorite).from_select(
+                ["user_id", "room_id"],
+                select(literal(current_user.id), Room.id).where(Room.id == room_id)
+            )
+        )
+        if result.rowcount == 0:
+            raise HTTPException(status_code=404, detail="Room not found")
+        await db.commit()
+    except IntegrityError as e:
+        await db.rollback()
+        if _is_unique_violation(e):
+            raise HTTPException(status_code=400, detail="Room already in favorites")
         raise HTTPException(status_code=404, detail="Room not found")
 
-    # Проверяем, есть ли уже в избранном
-    result = await db.execute(
-        select(Favorite).filter(Favorite.user_id == current_user.id, Favorite.room_id == room_id)
-    )
-    existing = result.scalar_one_or_none()
-    if existing:
-        raise HTTPException(status_code=400, detail="Room already in favorites")
-
-    favorite = Favorite(user_id=current_user.id, room_id=room_id)
-    db.add(favorite)
-    await db.commit()
+    _favorites_cache.delete(current_user.id)
     return {"detail": "Room added to favorites"}
 
 
@@ -35,21 +62,77 @@ async def add_favorite(room_id: int, db: AsyncSession = Depends(get_db),
 async def remove_favorite(room_id: int, db: AsyncSession = Depends(get_db),
                           current_user: User = Depends(get_current_user)):
     result = await db.execute(
-        select(Favorite).filter(Favorite.user_id == current_user.id, Favorite.room_id == room_id)
+        delete(Favorite).where(Favorite.user_id == current_user.id, Favorite.room_id == room_id)
     )
-    favorite = result.scalar_one_or_none()
-    if not favorite:
+    if result.rowcount == 0:
+        await db.rollback()
         raise HTTPException(status_code=404, detail="Favorite not found")
-
-    await db.delete(favorite)
     await db.commit()
+
+    _favorites_cache.delete(current_user.id)
     return
 
 
-@router.get("/", response_model=list[int])  # или список моделей RoomResponse, если хочешь детали
-async def get_favorites(db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def _favorite_details(db: AsyncSession, user_id: int) -> list[dict]:
+    # Один запрос: избранные номера + отель + лучшее предложение (row_number по цене внутри номера)
+    best = (
+        select(
+            RoomOffer.room_id,
+            RoomOffer.id,
+            RoomOffer.current_price,
+            RoomOffer.start_date,
+            RoomOffer.end_date,
+            RoomOffer.available,
+            func.row_number().over(
+                partition_by=RoomOffer.room_id, order_by=(RoomOffer.current_price, RoomOffer.id)
+            ).label("rank")
+        )
+        .join(Favorite, and_(Favorite.room_id == RoomOffer.room_id, Favorite.user_id == user_id))
+        .where(RoomOffer.available > 0, RoomOffer.end_date > datetime.now(UTC))
+        .subquery()
+    )
     result = await db.execute(
-        select(Favorite).filter(Favorite.user_id == current_user.id)
+        select(
+            Room.id, Room.room_number, Room.room_type,
+            Hotel.id, Hotel.name, Hotel.address, Hotel.rating,
+            best.c.id, best.c.current_price, best.c.start_date, best.c.end_date, best.c.available
+        )
+        .select_from(Favorite)
+        .join(Room, Room.id == Favorite.room_id)
+        .join(Hotel, Hotel.id == Room.hotel_id)
+        .outerjoin(best, and_(best.c.room_id == Room.id, best.c.rank == 1))
+        .where(Favorite.user_id == user_id)
+        .order_by(Favorite.id)
     )
-    favorites = result.scalars().all()
-    return [fav.room_id for fav in favorites]
+    return [
+        {
+            "room_id": room_id,
+            "room_number": room_number,
+            "room_type": room_type,
+            "hotel": {"id": hotel_id, "name": name, "address": address, "rating": rating},
+            "best_offer": None if offer_id is None else {
+                "id": offer_id, "current_price": price, "start_date": start_date,
+                "end_date": end_date, "available": available
+            },
+        }
+        for (room_id, room_number, room_type, hotel_id, name, address, rating,
+             offer_id, price, start_date, end_date, available) in result.all()
+    ]
+
+
+@router.get("/", response_model=list[int] | list[FavoriteRoomResponse])
+async def get_favorites(details: bool = False, db: AsyncSession = Depends(get_db),
+                        current_user: User = Depends(get_current_user)):
+    # details=true — номера с отелем и лучшим текущим предложением вместо списка room_id
+    if details:
+        favorites = await _favorite_details(db, current_user.id)
+        _favorites_cache.set(current_user.id, [favorite["room_id"] for favorite in favorites])
+        return FastJSONResponse(favorites)
+    room_ids = _favorites_cache.get(current_user.id)
+    if room_ids is None:
+        result = await db.execute(
+            select(Favorite.room_id).filter(Favorite.user_id == current_user.id).order_by(Favorite.id)
+        )
+        room_ids = result.scalars().all()
+        _favorites_cache.set(current_user.id, room_ids)
+    return FastJSONResponse(room_ids)
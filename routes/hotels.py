@@ -1,20 +1,60 @@
-from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect
-from sqlalchemy import select
-from schemas import HotelCreate, HotelResponse, RoomCreate, RoomResponse, RoomOfferCreate, RoomOfferResponse
-from models import Hotel, User, Room, RoomOffer
-from database import get_db
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, WebSocket, WebSocketDisconnect
+from sqlalchemy import insert, select, update, tuple_
+from sqlalchemy.exc import IntegrityError
+from schemas import HotelCreate, HotelResponse, RoomCreate, RoomResponse, RoomOfferCreate, RoomOfferResponse, RoomOfferPage
+from schemas import AvailableOffer, BulkCreateResponse, BulkItemError, LeaderboardEntry, PriceHistoryResponse
+from models import Hotel, User, Room, RoomOffer, Booking
+from database import get_db, get_db_session
 from utils import get_current_user
-import asyncio
+from price_feed import PRICE_FEED_MODE, PriceBroadcaster, price_message
+from view_buffer import view_buffer
+from pricing import PRICE_TICK_SECONDS, calculate_dynamic_price, popularity_from_views, price_tick
+from quotes import QuoteError, verify_quote
+from serialization import OFFER_COLUMNS, FastJSONResponse, add_quote, offer_row_to_dict
+from cache import cache
+from availability import availability_index, search_available
+from leaderboard import LEADERBOARD_MAX_SIZE, Board, leaderboard
+from price_history import PRICE_HISTORY_MAX_POINTS, downsampled_history
+from rollups import windowed_view_counts
+from ratelimit import BOOK_CLIENT_LIMIT, BOOK_OFFER_LIMIT, VIEW_CLIENT_LIMIT, VIEW_OFFER_LIMIT, offer_rate_limit
 from sqlalchemy.ext.asyncio import AsyncSession
-from datetime import datetime, timezone
-import math
-import random
-from sqlalchemy.sql import text
-import zoneinfo
+from datetime import datetime, timezone, UTC
+from typing import Literal
+import base64
+import json
 import logging
+import os
 
 router = APIRouter()
 
+# Ограничение размера одного пакетного запроса и строк в одном многострочном INSERT
+BULK_MAX_ITEMS = int(os.getenv("BULK_MAX_ITEMS", "10000"))
+BULK_INSERT_CHUNK_SIZE = 1000
+# Отели и номера почти не меняются; страницы списка предложений кэшируются ненадолго
+# (цены пересчитываются раз в минуту, остатки меняют бронирования)
+CATALOG_CACHE_TTL_SECONDS = float(os.getenv("CATALOG_CACHE_TTL_SECONDS", "300"))
+OFFER_LIST_CACHE_TTL_SECONDS = float(os.getenv("OFFER_LIST_CACHE_TTL_SECONDS", "2"))
+
+
+async def _hotel_owner_id(db: AsyncSession, hotel_id: int) -> int | None:
+    async def load():
+        result = await db.execute(select(Hotel.owner_id).filter(Hotel.id == hotel_id))
+        owner_id = result.scalar_one_or_none()
+        return None if owner_id is None else {"owner_id": owner_id}
+
+    hotel = await cache.get_or_load("hotels", str(hotel_id), load, CATALOG_CACHE_TTL_SECONDS)
+    return hotel["owner_id"] if hotel else None
+
+
+async def _room_hotel_id(db: AsyncSession, room_id: int) -> int | None:
+    async def load():
+        result = await db.execute(select(Room.hotel_id).filter(Room.id == room_id))
+        hotel_id = result.scalar_one_or_none()
+        return None if hotel_id is None else {"hotel_id": hotel_id}
+
+    room = await cache.get_or_load("rooms", str(room_id), load, CATALOG_CACHE_TTL_SECONDS)
+    return room["hotel_id"] if room else None
+
 
 @router.post("/", response_model=HotelResponse)
 async def create_hotel(hotel: HotelCreate, db: AsyncSession = Depends(get_db),
@@ -25,92 +65,370 @@ async def create_hotel(hotel: HotelCreate, db: AsyncSession = Depends(get_db),
     db.add(new_hotel)
     await db.commit()
     await db.refresh(new_hotel)
+    await cache.delete("hotels", str(new_hotel.id))
     return new_hotel
 
 
 @router.post("/rooms/", response_model=RoomResponse)
 async def create_room(room: RoomCreate, db: AsyncSession = Depends(get_db),
                       current_user: User = Depends(get_current_user)):
-    result = await db.execute(select(Hotel).filter(Hotel.id == room.hotel_id))
-    hotel = result.scalar_one_or_none()
-    if not hotel or hotel.owner_id != current_user.id:
+    if await _hotel_owner_id(db, room.hotel_id) != current_user.id:
         raise HTTPException(status_code=403, detail="You can only add rooms to your own hotels")
     new_room = Room(**room.dict())
     db.add(new_room)
     await db.commit()
     await db.refresh(new_room)
+    await cache.delete("rooms", str(new_room.id))
+    # Фильтры списка по hotel_id/room_type зависят от номеров
+    await cache.invalidate("offers")
     return new_room
 
 
 @router.post("/rooms/offers/", response_model=RoomOfferResponse)
 async def create_room_offer(offer: RoomOfferCreate, db: AsyncSession = Depends(get_db),
                             current_user: User = Depends(get_current_user)):
-    result = await db.execute(select(Room).filter(Room.id == offer.room_id))
-    room = result.scalar_one_or_none()
-    if not room:
+    # Владелец номера берётся из кэша каталога: без SELECT Room и SELECT Hotel на каждое предложение
+    hotel_id = await _room_hotel_id(db, offer.room_id)
+    if hotel_id is None:
         raise HTTPException(status_code=404, detail="Room not found")
-    result = await db.execute(select(Hotel).filter(Hotel.id == room.hotel_id))
-    hotel = result.scalar_one_or_none()
-    if hotel.owner_id != current_user.id:
+    if await _hotel_owner_id(db, hotel_id) != current_user.id:
         raise HTTPException(status_code=403, detail="You can only add offers to your own rooms")
     new_offer = RoomOffer(**offer.dict(), current_price=offer.initial_price, popularity_factor=1.0)
     db.add(new_offer)
     await db.commit()
     await db.refresh(new_offer)
+    await cache.invalidate("offers")
+    availability_index.invalidate()
     return new_offer
 
 
-@router.get("/rooms/offers/", response_model=list[RoomOfferResponse])
-async def get_room_offers(db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
-    result = await db.execute(select(RoomOffer))
-    offers = result.scalars().all()
-    return offers
+def _check_bulk_size(items: list) -> None:
+    if not items:
+        raise HTTPException(status_code=400, detail="No items provided")
+    if len(items) > BULK_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Too many items, at most {BULK_MAX_ITEMS} per request")
+
+
+async def _bulk_insert(db: AsyncSession, model, rows: list[dict]) -> list[int]:
+    # Многострочный INSERT ... RETURNING id порциями; id возвращаются в порядке строк
+    ids = []
+    for offset in range(0, len(rows), BULK_INSERT_CHUNK_SIZE):
+        result = await db.scalars(
+            insert(model).returning(model.id, sort_by_parameter_order=True),
+            rows[offset:offset + BULK_INSERT_CHUNK_SIZE]
+        )
+        ids.extend(result.all())
+    return ids
+
+
+async def _bulk_response(db: AsyncSession, model, accepted: list[tuple[int, dict]],
+                         errors: list[BulkItemError], total: int) -> dict:
+    # Все принятые элементы вставляются в одной транзакции; отклонённые перечислены в errors
+    ids: list[int | None] = [None] * total
+    if accepted:
+        try:
+            created = await _bulk_insert(db, model, [row for _, row in accepted])
+        except IntegrityError:
+            await db.rollback()
+            raise HTTPException(status_code=409, detail="Bulk insert conflicts with existing data")
+        await db.commit()
+        await cache.invalidate("offers")
+        availability_index.invalidate()
+        for (index, _), new_id in zip(accepted, created):
+            ids[index] = new_id
+    return {"ids": ids, "errors": errors}
+
+
+@router.post("/rooms/bulk", response_model=BulkCreateResponse)
+async def create_rooms_bulk(rooms: list[RoomCreate], db: AsyncSession = Depends(get_db),
+                            current_user: User = Depends(get_current_user)):
+    _check_bulk_size(rooms)
+    # Владение проверяется одним запросом на все отели пакета
+    result = await db.execute(
+        select(Hotel.id).where(Hotel.id.in_({room.hotel_id for room in rooms}), Hotel.owner_id == current_user.id)
+    )
+    owned = set(result.scalars().all())
+    accepted, errors = [], []
+    for index, room in enumerate(rooms):
+        if room.hotel_id not in owned:
+            errors.append(BulkItemError(index=index, detail="You can only add rooms to your own hotels"))
+            continue
+        accepted.append((index, room.dict()))
+    return await _bulk_response(db, Room, accepted, errors, len(rooms))
+
+
+@router.post("/rooms/offers/bulk", response_model=BulkCreateResponse)
+async def create_room_offers_bulk(offers: list[RoomOfferCreate], db: AsyncSession = Depends(get_db),
+                                  current_user: User = Depends(get_current_user)):
+    _check_bulk_size(offers)
+    # Номер -> владелец отеля одним запросом вместо Room и Hotel на каждое предложение
+    result = await db.execute(
+        select(Room.id, Hotel.owner_id)
+        .join(Hotel, Hotel.id == Room.hotel_id)
+        .where(Room.id.in_({offer.room_id for offer in offers}))
+    )
+    owners = dict(result.all())
+    now = datetime.now(UTC)
+    accepted, errors = [], []
+    for index, offer in enumerate(offers):
+        if offer.room_id not in owners:
+            errors.append(BulkItemError(index=index, detail="Room not found"))
+        elif owners[offer.room_id] != current_user.id:
+            errors.append(BulkItemError(index=index, detail="You can only add offers to your own rooms"))
+        elif offer.end_date <= offer.start_date:
+            errors.append(BulkItemError(index=index, detail="end_date must be after start_date"))
+        else:
+            accepted.append((index, {
+                **offer.dict(), "current_price": offer.initial_price, "popularity_factor": 1.0, "created_at": now
+            }))
+    return await _bulk_response(db, RoomOffer, accepted, errors, len(offers))
+
+
+def _encode_cursor(values: list) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+# Первое значение курсора — ключ сортировки последней строки: цена для sort=price, null для sort=id
+_CURSOR_SORT_KEYS = {"id": lambda value: value is None, "price": _is_number}
+
+
+def _decode_cursor(cursor: str, sort: str) -> list:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if (not isinstance(values, list) or len(values) != 2 or not _CURSOR_SORT_KEYS[sort](values[0])
+            or not isinstance(values[1], int) or isinstance(values[1], bool)):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+@router.get("/rooms/availability", response_model=list[AvailableOffer])
+async def search_availability(
+    start_date: datetime,
+    end_date: datetime,
+    limit: int = Query(50, ge=1, le=200),
+    room_type: str | None = None,
+    max_price: float | None = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    # Номера, у которых есть доступное предложение на весь период [start_date, end_date), по возрастанию цены
+    if end_date <= start_date:
+        raise HTTPException(status_code=400, detail="end_date must be after start_date")
+    return FastJSONResponse(await search_available(db, start_date, end_date, limit, room_type, max_price))
+
+
+@router.get("/leaderboard", response_model=list[LeaderboardEntry])
+async def get_leaderboard(
+    board: Board = "cheapest",  # cheapest — самые дешёвые, trending — самые популярные
+    hotel_id: int | None = None,  # Без hotel_id — общий рейтинг
+    limit: int = Query(20, ge=1, le=LEADERBOARD_MAX_SIZE),
+    current_user: User = Depends(get_current_user)
+):
+    # Топ доступных предложений из рейтинга, который строит и обновляет пересчёт цен; без запроса к БД.
+    # Пока рейтинг не построен, ответ пустой
+    return FastJSONResponse(await leaderboard.top(board, hotel_id, limit))
+
+
+@router.get("/rooms/offers/", response_model=RoomOfferPage)
+async def get_room_offers(
+    limit: int = Query(50, ge=1, le=200),
+    cursor: str | None = None,
+    sort: Literal["id", "price"] = "id",
+    start_date: datetime | None = None,  # Предложение пересекается с периодом [start_date, end_date)
+    end_date: datetime | None = None,
+    min_price: float | None = None,
+    max_price: float | None = None,
+    available_only: bool = False,
+    hotel_id: int | None = None,
+    room_type: str | None = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    # Страница без котировок кэшируется по всем параметрам (от пользователя не зависит);
+    # котировки выдаются заново на каждый запрос
+    cache_key = json.dumps([limit, cursor, sort, start_date and start_date.isoformat(),
+                            end_date and end_date.isoformat(), min_price, max_price, available_only,
+                            hotel_id, room_type])
+    page = await cache.get_or_load(
+        "offers", cache_key,
+        lambda: _load_offers_page(db, limit, cursor, sort, start_date, end_date, min_price, max_price,
+                                  available_only, hotel_id, room_type),
+        OFFER_LIST_CACHE_TTL_SECONDS
+    )
+    return FastJSONResponse({"items": [add_quote(item) for item in page["items"]],
+                             "next_cursor": page["next_cursor"]})
+
+
+async def _load_offers_page(db: AsyncSession, limit: int, cursor: str | None, sort: str,
+                            start_date: datetime | None, end_date: datetime | None,
+                            min_price: float | None, max_price: float | None, available_only: bool,
+                            hotel_id: int | None, room_type: str | None) -> dict:
+    # Колонки вместо ORM-объектов: без гидратации и валидации каждой строки (см. serialization.py)
+    query = select(*OFFER_COLUMNS)
+    if start_date is not None:
+        query = query.where(RoomOffer.end_date > start_date)
+    if end_date is not None:
+        query = query.where(RoomOffer.start_date < end_date)
+    if min_price is not None:
+        query = query.where(RoomOffer.current_price >= min_price)
+    if max_price is not None:
+        query = query.where(RoomOffer.current_price <= max_price)
+    if available_only:
+        query = query.where(RoomOffer.available > 0)
+    if hotel_id is not None or room_type is not None:
+        query = query.join(Room, Room.id == RoomOffer.room_id)
+        if hotel_id is not None:
+            query = query.where(Room.hotel_id == hotel_id)
+        if room_type is not None:
+            query = query.where(Room.room_type == room_type)
+
+    # Keyset-пагинация: продолжаем строго после последней строки предыдущей страницы
+    if sort == "price":
+        query = query.order_by(RoomOffer.current_price, RoomOffer.id)
+        if cursor:
+            last_price, last_id = _decode_cursor(cursor, sort)
+            query = query.where(tuple_(RoomOffer.current_price, RoomOffer.id) > (last_price, last_id))
+    else:
+        query = query.order_by(RoomOffer.id)
+        if cursor:
+            _, last_id = _decode_cursor(cursor, sort)
+            query = query.where(RoomOffer.id > last_id)
 
+    result = await db.execute(query.limit(limit + 1))
+    rows = result.all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = _encode_cursor([last.current_price if sort == "price" else None, last.id])
 
-def calculate_dynamic_price(offer: RoomOffer) -> float:
-    created_at = offer.created_at
-    if created_at.tzinfo is None:
-        created_at = created_at.replace(tzinfo=timezone.utc)
-    time_elapsed_hours = (datetime.now(timezone.utc) - created_at).total_seconds() / 3600
-    # Новая логика: базовая скорость 1.0, уменьшаем на 0.01 за каждое посещение (через popularity_factor)
-    k = max(0.1, 1.0 - ((offer.popularity_factor - 1.0) * 0.01))  # Минимальная скорость 0.1
-    base_price = offer.initial_price * math.exp(-k * time_elapsed_hours)
-    noise = base_price * random.uniform(-0.005, 0.005)
-    price = base_price + noise
-    return max(price, offer.min_price)
+    return {"items": [offer_row_to_dict(row) for row in rows], "next_cursor": next_cursor}
 
 
-@router.post("/rooms/offers/{offer_id}/book")
+@router.get("/rooms/offers/{offer_id}/price-history", response_model=PriceHistoryResponse)
+async def get_price_history(
+    offer_id: int,
+    since: datetime | None = None,  # По умолчанию — с создания предложения
+    until: datetime | None = None,  # По умолчанию — текущий момент
+    points: int = Query(200, ge=1, le=PRICE_HISTORY_MAX_POINTS),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    # История цены, сжатая на сервере до points интервалов (min/max/последняя цена в каждом)
+    result = await db.execute(select(RoomOffer.created_at).filter(RoomOffer.id == offer_id))
+    created_at = result.scalar_one_or_none()
+    if created_at is None:
+        raise HTTPException(status_code=404, detail="Offer not found")
+    # Даты без часового пояса считаются UTC, остальные переводятся в UTC (а не просто получают метку UTC)
+    since, until = ((value if value.tzinfo else value.replace(tzinfo=timezone.utc)).astimezone(timezone.utc)
+                    for value in (since or created_at, until or datetime.now(UTC)))
+    if until <= since:
+        raise HTTPException(status_code=400, detail="until must be after since")
+    bucket_seconds, history = await downsampled_history(db, offer_id, since, until, points)
+    return FastJSONResponse({"offer_id": offer_id, "since": since, "until": until,
+                             "bucket_seconds": bucket_seconds, "points": history})
+
+
+async def _find_booking(db: AsyncSession, user_id: int, idempotency_key: str) -> Booking | None:
+    result = await db.execute(
+        select(Booking).filter(Booking.user_id == user_id, Booking.idempotency_key == idempotency_key)
+    )
+    return result.scalar_one_or_none()
+
+
+def _booking_response(booking: Booking, offer_id: int) -> dict:
+    # Повтор запроса с тем же Idempotency-Key возвращает исходное бронирование
+    if booking.offer_id != offer_id:
+        raise HTTPException(status_code=409, detail="Idempotency key already used for another offer")
+    return {
+        "offer_id": booking.offer_id,
+        "user_id": booking.user_id,
+        "booked_price": round(booking.price, 2),
+        "booking_id": booking.id
+    }
+
+
+@router.post("/rooms/offers/{offer_id}/book",
+             dependencies=[Depends(offer_rate_limit("book", BOOK_CLIENT_LIMIT, BOOK_OFFER_LIMIT))])
 async def book_offer(
     offer_id: int,
-    booked_price: float,  # Новая переменная для цены из WebSocket
+    quote: str | None = None,  # Подписанная котировка из WebSocket-ленты или списка предложений
+    booked_price: float | None = None,  # Старый способ: цена без котировки, проверяется пересчётом
+    idempotency_key: str | None = Header(None, max_length=255),  # Заголовок Idempotency-Key
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     try:
+        if idempotency_key:
+            booking = await _find_booking(db, current_user.id, idempotency_key)
+            if booking:
+                return _booking_response(booking, offer_id)
+
+        if quote is not None:
+            # Проверка котировки: подпись и срок действия, без расчёта цены
+            try:
+                price = verify_quote(quote, offer_id)
+            except QuoteError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+        elif booked_price is not None:
+            # Читаем предложение без блокировки: проверка цены не держит строку
+            result = await db.execute(select(RoomOffer).filter(RoomOffer.id == offer_id))
+            offer = result.scalar_one_or_none()
+            if not offer:
+                raise HTTPException(status_code=404, detail="Offer not found")
+            if offer.available <= 0:
+                raise HTTPException(status_code=400, detail="Offer is no longer available")
+
+            # Рассчитываем текущую цену для проверки (шум тот же, что в WebSocket-ленте в этом тике)
+            current_price = calculate_dynamic_price(offer, tick=price_tick())
+            # Допустимая погрешность (например, 1% или фиксированная разница)
+            price_tolerance = 0.01 * current_price  # 1% от текущей цены
+            if abs(current_price - booked_price) > price_tolerance:
+                raise HTTPException(status_code=400, detail="Provided price does not match current price")
+            price = booked_price
+        else:
+            raise HTTPException(status_code=400, detail="Either quote or booked_price is required")
+
+        booking = Booking(
+            offer_id=offer_id, user_id=current_user.id, price=price, idempotency_key=idempotency_key
+        )
+        db.add(booking)
+        try:
+            await db.flush()
+        except IntegrityError:
+            # Параллельный повтор с тем же ключом уже создал бронирование
+            await db.rollback()
+            booking = await _find_booking(db, current_user.id, idempotency_key) if idempotency_key else None
+            if booking is None:
+                raise
+            return _booking_response(booking, offer_id)
+
+        # Условный UPDATE: строка блокируется только между этим запросом и commit
         result = await db.execute(
-            select(RoomOffer).filter(RoomOffer.id == offer_id).with_for_update()
+            update(RoomOffer)
+            .where(RoomOffer.id == offer_id, RoomOffer.available > 0)
+            .values(available=RoomOffer.available - 1)
+            .returning(RoomOffer.available)
         )
-        offer = result.scalar_one_or_none()
-        if not offer:
-            raise HTTPException(status_code=404, detail="Offer not found")
-        if offer.available <= 0:
+        if result.scalar_one_or_none() is None:
+            await db.rollback()
+            result = await db.execute(select(RoomOffer.id).filter(RoomOffer.id == offer_id))
+            if result.scalar_one_or_none() is None:
+                raise HTTPException(status_code=404, detail="Offer not found")
             raise HTTPException(status_code=400, detail="Offer is no longer available")
-
-        # Рассчитываем текущую цену для проверки
-        current_price = calculate_dynamic_price(offer)
-        # Допустимая погрешность (например, 1% или фиксированная разница)
-        price_tolerance = 0.01 * current_price  # 1% от текущей цены
-        if abs(current_price - booked_price) > price_tolerance:
-            raise HTTPException(status_code=400, detail="Provided price does not match current price")
-
-        offer.available -= 1
         await db.commit()
 
         return {
             "offer_id": offer_id,
             "user_id": current_user.id,
-            "booked_price": round(booked_price, 2)  # Используем переданную цену
+            "booked_price": round(price, 2),
+            "booking_id": booking.id
         }
 
     except HTTPException:
@@ -121,43 +439,48 @@ async def book_offer(
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.websocket("/ws/rooms/offers/{offer_id}")
-async def websocket_price(websocket: WebSocket, offer_id: int, db: AsyncSession = Depends(get_db)):
-    await websocket.accept()
-    try:
-        # Проверка существования предложения
+async def fetch_price_tick(offer_id: int) -> dict | None:
+    # Короткая сессия на один тик: соединение возвращается в пул сразу после чтения
+    async with get_db_session() as db:
         result = await db.execute(select(RoomOffer).filter(RoomOffer.id == offer_id))
         offer = result.scalar_one_or_none()
-        if not offer:
-            await websocket.send_json({"error": "Offer not found"})
-            await websocket.close()
-            return
-
-        # Фиксация просмотра
-        await db.execute(
-            text("""
-            INSERT INTO offer_views (offer_id, timestamp)
-            VALUES (:offer_id, :timestamp)
-            """),
-            {"offer_id": offer_id, "timestamp": datetime.now(zoneinfo.ZoneInfo("UTC"))}
-        )
-        await db.commit()
+    if not offer:
+        return None
+    return price_message(offer_id, round(calculate_dynamic_price(offer, tick=price_tick()), 2), offer.popularity_factor)
 
-        while True:
-            # Принудительное обновление объекта из базы
-            result = await db.execute(select(RoomOffer).filter(RoomOffer.id == offer_id))
-            offer = result.scalar_one_or_none()
-            if not offer:
+
+# В режиме bus цены приходят из шины (PriceBusRelay в main.lifespan), а не из собственных тикеров
+price_broadcaster = PriceBroadcaster(
+    fetch_price_tick if PRICE_FEED_MODE == "local" else None, interval=PRICE_TICK_SECONDS
+)
+
+
+@router.websocket("/ws/rooms/offers/{offer_id}")
+async def websocket_price(websocket: WebSocket, offer_id: int):
+    await websocket.accept()
+    try:
+        # Сессия нужна только на время рукопожатия
+        async with get_db_session() as db:
+            # Проверка существования предложения
+            result = await db.execute(select(RoomOffer.id).filter(RoomOffer.id == offer_id))
+            if result.scalar_one_or_none() is None:
                 await websocket.send_json({"error": "Offer not found"})
-                break
-            await db.refresh(offer)  # Обновляем объект
-            current_price = calculate_dynamic_price(offer)
-            await websocket.send_json({
-                "offer_id": offer_id,
-                "current_price": round(current_price, 2),
-                "popularity_factor": offer.popularity_factor
-            })
-            await asyncio.sleep(3)
+                await websocket.close()
+                return
+
+        # Фиксация просмотра (пакетная запись в фоне)
+        view_buffer.record(offer_id)
+
+        # Цены приходят от общего тикера предложения
+        queue = price_broadcaster.subscribe(offer_id)
+        try:
+            while True:
+                message = await queue.get()
+                await websocket.send_json(message)
+                if "error" in message:
+                    break
+        finally:
+            price_broadcaster.unsubscribe(offer_id, queue)
     except WebSocketDisconnect:
         pass
     except Exception as e:
@@ -168,43 +491,19 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-@router.post("/rooms/offers/{offer_id}/view", status_code=200)
+@router.post("/rooms/offers/{offer_id}/view", status_code=200,
+             dependencies=[Depends(offer_rate_limit("view", VIEW_CLIENT_LIMIT, VIEW_OFFER_LIMIT))])
 async def record_offer_view(offer_id: int, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(RoomOffer).filter(RoomOffer.id == offer_id))
-    offer = result.scalar_one_or_none()
-    if not offer:
+    result = await db.execute(select(RoomOffer.id).filter(RoomOffer.id == offer_id))
+    if result.scalar_one_or_none() is None:
         raise HTTPException(status_code=404, detail="Offer not found")
 
-    # Фиксация просмотра
-    await db.execute(
-        text("""
-        INSERT INTO offer_views (offer_id, timestamp)
-        VALUES (:offer_id, :timestamp)
-        """),
-        {"offer_id": offer_id, "timestamp": datetime.now(zoneinfo.ZoneInfo("UTC"))}
-    )
-
-    # Подсчитываем количество просмотров за последние 12 часов
-    result = await db.execute(
-        text("""
-        SELECT COUNT(*) FROM offer_views 
-        WHERE offer_id = :offer_id 
-        AND timestamp > NOW() - INTERVAL '12 hours'
-        """),
-        {"offer_id": offer_id}
-    )
-    view_count = result.scalar()
-
-    # Вычисляем новый popularity_factor (увеличивает стабильность цены)
-    new_popularity = round(min(10.0, 1.0 + (view_count * 0.1)), 2)  # Округление до 2 знаков
-    # Обновляем popularity_factor в базе
-    await db.execute(
-        text("""
-        UPDATE room_offers SET popularity_factor = :new_popularity WHERE id = :offer_id
-        """),
-        {"new_popularity": new_popularity, "offer_id": offer_id}
-    )
-    await db.commit()
+    # Фиксация просмотра: INSERT в offer_views и пересчёт popularity_factor выполняет буфер пакетами
+    view_buffer.record(offer_id)
 
-    logger.info(f"Updated popularity_factor to {new_popularity} for offer_id {offer_id} with view_count {view_count}")
+    # Просмотры за окно: агрегаты в БД плюс ещё не записанные буфером (включая этот);
+    # new_popularity — значение, которое запишет буфер
+    view_counts = await windowed_view_counts(db, [offer_id])
+    view_count = view_counts.get(offer_id, 0) + view_buffer.unwritten_views(offer_id)
+    new_popularity = float(popularity_from_views(view_count))
     return {"detail": "View recorded", "offer_id": offer_id, "view_count": view_count, "new_popularity": new_popularity}
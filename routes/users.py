@@ -5,7 +5,7 @@ from sqlalchemy import select
 from schemas import UserCreate, UserResponse
 from models import User
 from database import get_db
-from utils import hash_password, verify_password, create_access_token, get_current_user
+from utils import hash_password_async, verify_password_async, create_access_token, get_current_user, invalidate_user_cache
 
 router = APIRouter()
 
@@ -24,12 +24,13 @@ async def create_user(user: UserCreate, db: AsyncSession = Depends(get_db)):
     if user.role not in ["regular", "business"]:
         raise HTTPException(status_code=400, detail="Invalid role")
 
-    hashed_password = hash_password(user.password)
+    hashed_password = await hash_password_async(user.password)
     new_user = User(email=user.email, hashed_password=hashed_password, role=user.role)
 
     db.add(new_user)
     await db.commit()
     await db.refresh(new_user)
+    invalidate_user_cache(new_user.email)
 
     return new_user
 
@@ -38,10 +39,11 @@ async def login(user: UserLogin, db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(User).filter(User.email == user.email))
     db_user = result.scalar_one_or_none()
 
-    if not db_user or not verify_password(user.password, db_user.hashed_password):
+    if not db_user or not await verify_password_async(user.password, db_user.hashed_password):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
 
-    access_token = create_access_token(data={"sub": db_user.email})
+    # uid и role позволяют get_current_user обходиться без БД (AUTH_TRUST_TOKEN_CLAIMS)
+    access_token = create_access_token(data={"sub": db_user.email, "uid": db_user.id, "role": db_user.role})
 
     return {"access_token": access_token, "token_type": "bearer"}
 
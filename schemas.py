@@ -77,6 +77,93 @@ class RoomOfferResponse(RoomOfferBase):
     current_price: float
     popularity_factor: float
     created_at: datetime
+    quote: str | None = None  # Подписанная котировка current_price для бронирования
+    quote_expires_at: int | None = None
 
     class Config:
         from_attributes = True
+
+
+class RoomOfferPage(BaseModel):
+    items: list[RoomOfferResponse]
+    next_cursor: str | None = None  # Передайте в cursor, чтобы получить следующую страницу
+
+
+class BulkItemError(BaseModel):
+    index: int  # Позиция элемента во входном списке
+    detail: str
+
+
+class BulkCreateResponse(BaseModel):
+    ids: list[int | None]  # id созданной строки по позиции во входном списке, None — элемент отклонён
+    errors: list[BulkItemError]
+
+
+class FavoriteHotel(BaseModel):
+    id: int
+    name: str
+    address: str
+    rating: float | None = None
+
+
+class FavoriteOffer(BaseModel):
+    id: int
+    current_price: float
+    start_date: datetime
+    end_date: datetime
+    available: int
+
+
+class FavoriteRoomResponse(BaseModel):
+    room_id: int
+    room_number: str
+    room_type: str
+    hotel: FavoriteHotel
+    best_offer: FavoriteOffer | None = None  # Самое дешёвое доступное предложение, которое ещё не закончилось
+
+
+class AvailableRoom(BaseModel):
+    id: int
+    room_number: str
+    room_type: str
+
+
+class AvailableHotel(BaseModel):
+    id: int
+    name: str
+    address: str
+    rating: float | None = None
+
+
+class AvailableOffer(BaseModel):
+    offer_id: int
+    current_price: float
+    start_date: datetime
+    end_date: datetime
+    available: int
+    room: AvailableRoom
+    hotel: AvailableHotel
+
+
+class PriceHistoryPoint(BaseModel):
+    ts: datetime  # Начало интервала
+    min: float
+    max: float
+    last: float  # Последняя цена в интервале
+    count: int  # Сколько пересчётов попало в интервал
+
+
+class PriceHistoryResponse(BaseModel):
+    offer_id: int
+    since: datetime
+    until: datetime
+    bucket_seconds: int
+    points: list[PriceHistoryPoint]
+
+
+class LeaderboardEntry(BaseModel):
+    offer_id: int
+    hotel_id: int | None
+    room_id: int | None
+    current_price: float
+    popularity_factor: float | None
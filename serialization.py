@@ -0,0 +1,47 @@
+import orjson
+from fastapi.responses import JSONResponse
+from sqlalchemy.engine import Row
+
+from models import RoomOffer
+from quotes import issue_quote
+
+# Быстрый путь для больших ответов: строки из SELECT по колонкам сразу кодируются orjson,
+# без ORM-объектов и валидации Pydantic. Формат совпадает с RoomOfferResponse (тот же порядок
+# полей, даты в ISO 8601 с "Z" для UTC), поэтому response_model остаётся только для OpenAPI.
+
+OFFER_COLUMNS = (
+    RoomOffer.start_date,
+    RoomOffer.end_date,
+    RoomOffer.initial_price,
+    RoomOffer.min_price,
+    RoomOffer.available,
+    RoomOffer.id,
+    RoomOffer.room_id,
+    RoomOffer.current_price,
+    RoomOffer.popularity_factor,
+    RoomOffer.created_at,
+)
+_OFFER_FIELDS = tuple(column.key for column in OFFER_COLUMNS)
+
+
+class FastJSONResponse(JSONResponse):
+    # Даты сериализуются как у Pydantic: UTC — с суффиксом "Z"
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_UTC_Z)
+
+
+def offer_row_to_dict(row: Row) -> dict:
+    # Строка из select(*OFFER_COLUMNS) -> словарь RoomOfferResponse без котировки
+    return dict(zip(_OFFER_FIELDS, row))
+
+
+def add_quote(item: dict) -> dict:
+    # Котировка текущей цены; выдаётся на каждый ответ, в том числе для страниц из кэша
+    quote = issue_quote(item["id"], item["current_price"])
+    item["quote"] = quote.token
+    item["quote_expires_at"] = quote.expires_at
+    return item
+
+
+def offer_to_dict(row: Row) -> dict:
+    return add_quote(offer_row_to_dict(row))
@@ -0,0 +1,185 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Awaitable, Callable
+
+from celery import Celery, chord
+from celery.schedules import crontab
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from database import create_engine_from_env
+from instrumentation import track_queries
+from leaderboard import leaderboard
+from price_history import maintain_price_history
+from repricing import offer_id_shards, reprice_offers
+from rollups import purge_expired_views
+
+logger = logging.getLogger(__name__)
+
+# Брокер и хранилище результатов; для тестов: CELERY_BROKER_URL=memory://,
+# CELERY_RESULT_BACKEND=cache+memory://, CELERY_TASK_ALWAYS_EAGER=true (задачи выполняются в вызывающем процессе)
+CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", "redis://redis:6379/0")
+CELERY_RESULT_BACKEND = os.getenv("CELERY_RESULT_BACKEND", CELERY_BROKER_URL)
+CELERY_TASK_ALWAYS_EAGER = os.getenv("CELERY_TASK_ALWAYS_EAGER", "false").lower() in ("1", "true", "yes", "on")
+# На сколько диапазонов id делится пересчёт цен (шарды выполняются параллельно разными процессами воркера)
+REPRICE_SHARDS = int(os.getenv("REPRICE_SHARDS", "4"))
+# Блокировка от наложения запусков снимается по завершении, а при падении воркера — по истечении срока
+REPRICE_LOCK_TIMEOUT = int(os.getenv("REPRICE_LOCK_TIMEOUT", "900"))
+
+# Настройка Celery
+celery_app = Celery("tasks", broker=CELERY_BROKER_URL, backend=CELERY_RESULT_BACKEND)
+celery_app.conf.update(
+    task_serializer="json",
+    accept_content=["json"],
+    result_serializer="json",
+    timezone="UTC",
+    enable_utc=True,
+    task_always_eager=CELERY_TASK_ALWAYS_EAGER,
+    task_eager_propagates=CELERY_TASK_ALWAYS_EAGER,
+)
+# Настройка Celery Beat
+celery_app.conf.beat_schedule = {
+    "update-offers": {
+        "task": "tasks.update_all_offers",
+        "schedule": crontab(minute="*/1"),  # Каждую минуту для тестирования, можно изменить на 5
+    },
+    "purge-offer-views": {
+        "task": "tasks.purge_expired_offer_views",
+        "schedule": crontab(minute="*/30"),
+    },
+}
+
+
+class RepricingLock:
+    # Redis: SET NX EX + снятие только своим токеном; без Redis (eager/memory) — блокировка процесса
+
+    _RELEASE_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+    def __init__(self, url: str | None, key: str = "lock:reprice-offers", timeout: int = REPRICE_LOCK_TIMEOUT):
+        self._key = key
+        self._timeout = timeout
+        self._redis = None
+        if url and url.startswith(("redis://", "rediss://")):
+            import redis
+
+            self._redis = redis.Redis.from_url(url)
+        self._local_lock = threading.Lock()
+        self._local: tuple[str, float] | None = None
+
+    def acquire(self) -> str | None:
+        token = uuid.uuid4().hex
+        if self._redis is not None:
+            return token if self._redis.set(self._key, token, nx=True, ex=self._timeout) else None
+        with self._local_lock:
+            if self._local is not None and self._local[1] > time.monotonic():
+                return None
+            self._local = (token, time.monotonic() + self._timeout)
+            return token
+
+    def release(self, token: str) -> None:
+        if self._redis is not None:
+            self._redis.eval(self._RELEASE_SCRIPT, 1, self._key, token)
+            return
+        with self._local_lock:
+            if self._local is not None and self._local[0] == token:
+                self._local = None
+
+
+repricing_lock = RepricingLock(None if CELERY_TASK_ALWAYS_EAGER else CELERY_BROKER_URL)
+
+
+async def _with_session(job: Callable[[AsyncSession], Awaitable]):
+    # Каждый вызов asyncio.run в процессе воркера получает свой движок: пул привязан к event loop.
+    # Клиент рейтингов этого loop закрывается вместе с ним, иначе соединения остаются открытыми
+    engine = create_engine_from_env()
+    try:
+        async with async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)() as db:
+            return await job(db)
+    finally:
+        await engine.dispose()
+        await leaderboard.close()
+
+
+async def _reprice_shard(min_id: int, max_id: int) -> dict:
+    with track_queries("reprice_shard"):
+        return await _with_session(lambda db: reprice_offers(db, min_id=min_id, max_id=max_id))
+
+
+async def _prepare_repricing(db: AsyncSession) -> list[tuple[int, int]]:
+    # Секции истории цен создаются до того, как шарды начнут в неё писать. Сбой обслуживания не останавливает
+    # пересчёт: точки вне секций попадут в DEFAULT и будут перенесены при следующем создании секции
+    try:
+        await maintain_price_history(db)
+    except Exception:
+        await db.rollback()
+        logger.exception("Price history maintenance failed, repricing continues")
+    # Рейтинги строятся целиком при первом запуске и раз в LEADERBOARD_REBUILD_SECONDS, дальше шарды
+    # обновляют их инкрементально
+    await leaderboard.ensure(db)
+    return await offer_id_shards(db, REPRICE_SHARDS)
+
+
+# Пересчёт цен и популярности: координатор делит id на шарды и запускает их chord-ом
+@celery_app.task
+def update_all_offers():
+    token = repricing_lock.acquire()
+    if token is None:
+        logger.warning("Repricing is already running, skipping this run")
+        return {"skipped": True}
+    try:
+        shards = asyncio.run(_with_session(_prepare_repricing))
+        if not shards:
+            repricing_lock.release(token)
+            return {"shards": 0}
+        callback = finish_repricing.s(token=token, started_at=time.time())
+        callback.on_error(release_repricing_lock.si(token))
+        chord(reprice_offer_shard.s(min_id, max_id) for min_id, max_id in shards)(callback)
+    except Exception:
+        repricing_lock.release(token)
+        raise
+    logger.info(f"Repricing started: {len(shards)} shards {shards}")
+    return {"shards": len(shards)}
+
+
+@celery_app.task
+def reprice_offer_shard(min_id: int, max_id: int):
+    stats = asyncio.run(_reprice_shard(min_id, max_id))
+    logger.info(f"Repricing shard [{min_id}, {max_id}]: {stats['processed']} offers, "
+                f"{stats['updated']} updated in {stats['seconds']:.2f}s")
+    return {"min_id": min_id, "max_id": max_id, **stats}
+
+
+@celery_app.task
+def finish_repricing(shard_results: list[dict], token: str, started_at: float):
+    repricing_lock.release(token)
+    summary = {
+        "processed": sum(shard["processed"] for shard in shard_results),
+        "updated": sum(shard["updated"] for shard in shard_results),
+        "seconds": round(time.time() - started_at, 3),
+        "shards": sorted(shard_results, key=lambda shard: shard["min_id"]),
+    }
+    slowest = max(shard_results, key=lambda shard: shard["seconds"])
+    logger.info(f"Repricing finished: {summary['processed']} offers, {summary['updated']} updated "
+                f"in {summary['seconds']:.2f}s; slowest shard [{slowest['min_id']}, {slowest['max_id']}] "
+                f"{slowest['seconds']:.2f}s")
+    return summary
+
+
+@celery_app.task
+def release_repricing_lock(token: str):
+    # Ошибка в одном из шардов: снимаем блокировку, чтобы следующий запуск не ждал REPRICE_LOCK_TIMEOUT
+    logger.error("Repricing failed, releasing the lock")
+    repricing_lock.release(token)
+
+
+# Очистка сырых просмотров старше окна популярности (счётчики хранятся в offer_view_rollups)
+@celery_app.task
+def purge_expired_offer_views():
+    async def purge():
+        with track_queries("purge_offer_views"):
+            return await _with_session(purge_expired_views)
+
+    return asyncio.run(purge())
@@ -0,0 +1,104 @@
+import os
+import sys
+import tempfile
+import uuid
+from datetime import UTC, datetime, timedelta
+
+import pytest
+import pytest_asyncio
+
+# Настройки до импорта модулей приложения: database и utils читают окружение при импорте.
+# Общая БД — файл SQLite (задачи Celery открывают свой движок в каждом asyncio.run), Celery — eager,
+# шина цен, кэш, лимиты и рейтинги — в памяти процесса
+_DB_DIR = tempfile.mkdtemp(prefix="hotel-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{_DB_DIR}/app.db")
+os.environ.setdefault("SECRET_KEY", "test-secret")
+os.environ.setdefault("CELERY_BROKER_URL", "memory://")
+os.environ.setdefault("CELERY_RESULT_BACKEND", "cache+memory://")
+os.environ.setdefault("CELERY_TASK_ALWAYS_EAGER", "true")
+os.environ.setdefault("REPRICE_SHARDS", "2")
+for name in ("PRICE_BUS_URL", "CACHE_URL", "RATE_LIMIT_URL", "LEADERBOARD_URL"):
+    os.environ.setdefault(name, "memory://")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import delete  # noqa: E402
+from sqlalchemy.ext.asyncio import create_async_engine  # noqa: E402
+
+from migrate import upgrade  # noqa: E402
+
+# Ручной клиент WebSocket-ленты (python tests/test_websocket.py при запущенном сервере), не тест pytest
+collect_ignore = ["test_websocket.py"]
+
+
+@pytest_asyncio.fixture
+async def engine(tmp_path):
+    # Отдельная БД SQLite на тест, схема — через миграции
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/test.db")
+    await upgrade(engine)
+    yield engine
+    await engine.dispose()
+
+
+async def _clear_tables():
+    from database import AsyncSessionLocal, Base
+
+    async with AsyncSessionLocal() as db:
+        for table in reversed(Base.metadata.sorted_tables):
+            await db.execute(delete(table))
+        await db.commit()
+
+
+@pytest.fixture
+def client(monkeypatch):
+    # Приложение целиком на общей БД: схема — через AUTO_MIGRATE при старте, таблицы очищаются перед тестом,
+    # лимиты запросов выключены, кэш чтения — новый. Асинхронный код теста — через client.portal.call
+    import main
+    import migrate
+    from cache import MemoryCache, cache
+    from database import engine
+    from ratelimit import rate_limiter
+
+    monkeypatch.setattr(migrate, "AUTO_MIGRATE", True)
+    monkeypatch.setattr(rate_limiter, "enabled", False)
+    cache.use(MemoryCache())
+    with TestClient(main.app) as client:
+        client.portal.call(_clear_tables)
+        yield client
+        # Соединения aiosqlite привязаны к event loop клиента: закрываем их до его остановки
+        client.portal.call(engine.dispose)
+
+
+async def _seed_offer(available: int) -> dict:
+    from database import AsyncSessionLocal
+    from models import Hotel, Room, RoomOffer, User
+    from utils import create_access_token
+
+    email = f"owner-{uuid.uuid4().hex}@example.com"
+    now = datetime.now(UTC)
+    async with AsyncSessionLocal() as db:
+        user = User(email=email, hashed_password="x", role="business")
+        db.add(user)
+        await db.flush()
+        hotel = Hotel(name="H", address="A", owner_id=user.id)
+        db.add(hotel)
+        await db.flush()
+        room = Room(hotel_id=hotel.id, room_number="101", room_type="single")
+        db.add(room)
+        await db.flush()
+        offers = [
+            RoomOffer(room_id=room.id, start_date=now, end_date=now + timedelta(days=3), initial_price=100.0,
+                      current_price=100.0, min_price=50.0, popularity_factor=1.0, available=available)
+            for _ in range(2)
+        ]
+        db.add_all(offers)
+        await db.commit()
+        return {"offer_ids": [offer.id for offer in offers], "room_id": room.id,
+                "headers": {"Authorization": f"Bearer {create_access_token({'sub': email})}"}}
+
+
+@pytest.fixture
+def offers(client):
+    # Пользователь с отелем, номером (room_id) и двумя предложениями (по 2 места); headers — его Bearer-токен
+    return client.portal.call(_seed_offer, 2)
@@ -0,0 +1,40 @@
+from sqlalchemy import select
+
+from quotes import issue_quote
+
+
+async def _available(offer_id: int) -> int:
+    from database import AsyncSessionLocal
+    from models import RoomOffer
+
+    async with AsyncSessionLocal() as db:
+        return await db.scalar(select(RoomOffer.available).where(RoomOffer.id == offer_id))
+
+
+def _book(client, offers, offer_id: int, key: str):
+    return client.post(f"/api/hotels/rooms/offers/{offer_id}/book",
+                       headers={**offers["headers"], "Idempotency-Key": key},
+                       params={"quote": issue_quote(offer_id, 100.0).token})
+
+
+def test_replayed_idempotency_key_returns_original_booking(client, offers):
+    offer_id = offers["offer_ids"][0]
+    first = _book(client, offers, offer_id, "booking-1")
+    assert first.status_code == 200
+    assert client.portal.call(_available, offer_id) == 1
+
+    replay = _book(client, offers, offer_id, "booking-1")
+    assert replay.status_code == 200
+    assert replay.json() == first.json()
+    # Повтор не занимает второе место
+    assert client.portal.call(_available, offer_id) == 1
+
+
+def test_idempotency_key_reused_for_another_offer(client, offers):
+    first_offer, second_offer = offers["offer_ids"]
+    assert _book(client, offers, first_offer, "booking-2").status_code == 200
+
+    response = _book(client, offers, second_offer, "booking-2")
+    assert response.status_code == 409
+    assert response.json() == {"detail": "Idempotency key already used for another offer"}
+    assert client.portal.call(_available, second_offer) == 2
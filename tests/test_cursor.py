@@ -0,0 +1,38 @@
+import base64
+import json
+
+import pytest
+from fastapi import HTTPException
+
+from routes.hotels import _decode_cursor, _encode_cursor
+
+
+def _raw(payload) -> str:
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+@pytest.mark.parametrize("sort, values", [("id", [None, 42]), ("price", [99.5, 42]), ("price", [100, 7])])
+def test_round_trip(sort, values):
+    assert _decode_cursor(_encode_cursor(values), sort) == values
+
+
+@pytest.mark.parametrize("cursor", ["not base64!", _raw("text"), _raw([1.0]), _raw([1.0, 2, 3]), _raw({"id": 1})])
+def test_malformed_cursor(cursor):
+    with pytest.raises(HTTPException) as error:
+        _decode_cursor(cursor, "price")
+    assert error.value.status_code == 400
+
+
+@pytest.mark.parametrize("sort, values", [
+    ("price", [None, 1]),      # курсор sort=id в запросе sort=price
+    ("price", ["cheap", 1]),
+    ("price", [True, 1]),
+    ("id", [10.5, 1]),         # курсор sort=price в запросе sort=id
+    ("id", [None, "1"]),
+    ("id", [None, True]),
+    ("id", [None, 1.5]),
+])
+def test_sort_key_type_is_checked(sort, values):
+    with pytest.raises(HTTPException) as error:
+        _decode_cursor(_raw(values), sort)
+    assert error.value.status_code == 400
@@ -0,0 +1,36 @@
+from sqlalchemy.exc import IntegrityError
+
+from routes.favorites import _is_unique_violation
+
+
+class _PostgresError(Exception):
+    # Как ошибки драйверов Postgres в SQLAlchemy: sqlstate у обёртки, constraint_name — в diag или __cause__
+    def __init__(self, sqlstate, constraint_name=None):
+        super().__init__("duplicate key value violates unique constraint")
+        self.sqlstate = sqlstate
+        self.__cause__ = type("Cause", (Exception,), {"constraint_name": constraint_name})()
+
+
+def _integrity_error(orig):
+    return IntegrityError("INSERT INTO favorites", {}, orig)
+
+
+def test_unique_violation_detection():
+    assert _is_unique_violation(_integrity_error(_PostgresError("23505", "user_room_unique")))
+    assert not _is_unique_violation(_integrity_error(_PostgresError("23505", "favorites_pkey_other")))
+    assert not _is_unique_violation(_integrity_error(_PostgresError("23503")))
+    assert not _is_unique_violation(_integrity_error(Exception("FOREIGN KEY constraint failed")))
+
+
+def test_add_and_remove_favorite(client, offers):
+    headers, room_id = offers["headers"], offers["room_id"]
+    assert client.post(f"/api/favorites/{room_id}", headers=headers).status_code == 201
+
+    duplicate = client.post(f"/api/favorites/{room_id}", headers=headers)
+    assert duplicate.status_code == 400
+    assert duplicate.json() == {"detail": "Room already in favorites"}
+    assert client.get("/api/favorites/", headers=headers).json() == [room_id]
+
+    assert client.delete(f"/api/favorites/{room_id}", headers=headers).status_code == 204
+    assert client.delete(f"/api/favorites/{room_id}", headers=headers).status_code == 404
+    assert client.post(f"/api/favorites/{room_id + 1000}", headers=headers).status_code == 404
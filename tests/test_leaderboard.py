@@ -0,0 +1,86 @@
+import asyncio
+import random
+
+import pytest
+
+from leaderboard import Leaderboard, MemoryLeaderboard, RedisLeaderboard, offer_entry
+
+
+def _ids(entries):
+    return [entry["offer_id"] for entry in entries]
+
+
+@pytest.mark.asyncio
+async def test_top_per_board_and_hotel():
+    board = MemoryLeaderboard()
+    await board.replace([
+        offer_entry(1, 10, 100, 300.0, 1.0),
+        offer_entry(2, 10, 101, 100.0, 5.0),
+        offer_entry(3, 20, 200, 200.0, None),
+        offer_entry(4, 20, 201, 50.0, 2.0),
+    ])
+    assert _ids(await board.top("cheapest", None, 10)) == [4, 2, 3, 1]
+    assert _ids(await board.top("cheapest", 10, 10)) == [2, 1]
+    # popularity_factor None считается 1.0; при равном счёте — по offer_id
+    assert _ids(await board.top("trending", None, 10)) == [2, 4, 1, 3]
+    assert _ids(await board.top("cheapest", None, 2)) == [4, 2]
+    assert await board.top("cheapest", 999, 10) == []
+
+
+@pytest.mark.asyncio
+async def test_incremental_updates_match_full_sort():
+    board, expected = MemoryLeaderboard(), {}
+    await board.replace([])
+    rng = random.Random(7)
+    for _ in range(200):
+        entries = {}
+        for _ in range(rng.choice([1, 5, 300])):
+            offer_id = rng.randrange(400)
+            entries[offer_id] = offer_entry(offer_id, offer_id % 7, offer_id, round(rng.uniform(1, 500), 2),
+                                            rng.choice([None, rng.uniform(1, 10)]))
+        if rng.random() < 0.3:
+            await board.remove(list(entries.values()))
+            for offer_id in entries:
+                expected.pop(offer_id, None)
+        else:
+            await board.upsert(list(entries.values()))
+            expected.update(entries)
+        for hotel_id in (None, 3):
+            pool = [entry for entry in expected.values() if hotel_id is None or entry["hotel_id"] == hotel_id]
+            cheapest = sorted(pool, key=lambda entry: (entry["current_price"], entry["offer_id"]))
+            assert _ids(await board.top("cheapest", hotel_id, 10)) == _ids(cheapest[:10])
+            trending = sorted(pool, key=lambda entry: (-(entry["popularity_factor"] or 1.0), entry["offer_id"]))
+            assert _ids(await board.top("trending", hotel_id, 10)) == _ids(trending[:10])
+
+
+@pytest.mark.asyncio
+async def test_apply_adds_missing_offers_only_after_build():
+    leaderboard = Leaderboard(MemoryLeaderboard())
+    back_in_stock = offer_entry(5, 1, 1, 10.0, 1.0)
+    # Рейтинг ещё не построен: инкрементальные обновления пропускаются
+    await leaderboard.apply([], [], [back_in_stock])
+    assert await leaderboard.top("cheapest", None, 10) == []
+    assert await leaderboard.backend.built_at() is None
+
+    await leaderboard.backend.replace([offer_entry(1, 1, 1, 50.0, 1.0), offer_entry(2, 1, 2, 60.0, 1.0)])
+    await leaderboard.apply([offer_entry(1, 1, 1, 70.0, 1.0)], [{"offer_id": 2, "hotel_id": 1}], [back_in_stock])
+    assert _ids(await leaderboard.top("cheapest", None, 10)) == [5, 1]
+    # Неизменившееся предложение, которое уже есть в рейтинге, не перезаписывается
+    await leaderboard.apply([], [], [offer_entry(5, 1, 1, 999.0, 1.0)])
+    assert (await leaderboard.top("cheapest", None, 1))[0]["current_price"] == 10.0
+
+
+def test_redis_client_per_event_loop_is_closed():
+    # Каждый asyncio.run получает свой клиент; close() в том же loop закрывает его и забывает
+    # (соединение не открывается: клиент создаётся лениво, без обращений к Redis)
+    backend = RedisLeaderboard("redis://localhost:6399/0")
+
+    async def use_and_close():
+        client = backend._redis
+        assert backend._redis is client
+        await backend.close()
+        assert not backend._clients
+        return client
+
+    first, second = asyncio.run(use_and_close()), asyncio.run(use_and_close())
+    assert first is not second
@@ -0,0 +1,142 @@
+import pytest
+from sqlalchemy import inspect, select, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+import migrate
+import models  # noqa: F401  (регистрирует таблицы в Base.metadata)
+from database import Base
+from migrate import LATEST_VERSION, available_migrations, check_schema, current_version, schema_version, upgrade
+
+
+# Схема, которую создавал create_all до появления миграций (SQLite): таблицы уже существуют,
+# поэтому 0001 их пропускает (checkfirst), а недостающие индексы добавляет 0002
+BASELINE_SCHEMA = [
+    "CREATE TABLE users (id INTEGER NOT NULL, email VARCHAR, hashed_password VARCHAR, role VARCHAR, PRIMARY KEY (id))",
+    "CREATE UNIQUE INDEX ix_users_email ON users (email)",
+    "CREATE INDEX ix_users_id ON users (id)",
+    "CREATE TABLE hotels (id INTEGER NOT NULL, name VARCHAR, address VARCHAR, description VARCHAR, rating FLOAT, "
+    "owner_id INTEGER, PRIMARY KEY (id), FOREIGN KEY(owner_id) REFERENCES users (id))",
+    "CREATE INDEX ix_hotels_name ON hotels (name)",
+    "CREATE INDEX ix_hotels_id ON hotels (id)",
+    "CREATE TABLE rooms (id INTEGER NOT NULL, hotel_id INTEGER, room_number VARCHAR, room_type VARCHAR, "
+    "PRIMARY KEY (id), FOREIGN KEY(hotel_id) REFERENCES hotels (id))",
+    "CREATE INDEX ix_rooms_id ON rooms (id)",
+    "CREATE INDEX ix_rooms_room_number ON rooms (room_number)",
+    "CREATE TABLE room_offers (id INTEGER NOT NULL, room_id INTEGER, start_date DATETIME NOT NULL, "
+    "end_date DATETIME NOT NULL, initial_price FLOAT NOT NULL, current_price FLOAT NOT NULL, "
+    "min_price FLOAT NOT NULL, popularity_factor FLOAT, created_at DATETIME, available INTEGER, "
+    "PRIMARY KEY (id), FOREIGN KEY(room_id) REFERENCES rooms (id))",
+    "CREATE INDEX ix_room_offers_id ON room_offers (id)",
+    "CREATE TABLE favorites (id INTEGER NOT NULL, user_id INTEGER NOT NULL, room_id INTEGER NOT NULL, "
+    "PRIMARY KEY (id), CONSTRAINT user_room_unique UNIQUE (user_id, room_id), "
+    "FOREIGN KEY(user_id) REFERENCES users (id), FOREIGN KEY(room_id) REFERENCES rooms (id))",
+    "CREATE INDEX ix_favorites_id ON favorites (id)",
+    "CREATE TABLE offer_views (id INTEGER NOT NULL, offer_id INTEGER NOT NULL, timestamp DATETIME NOT NULL, "
+    "PRIMARY KEY (id), FOREIGN KEY(offer_id) REFERENCES room_offers (id))",
+    "CREATE INDEX ix_offer_views_id ON offer_views (id)",
+]
+
+
+@pytest.fixture
+def sqlite_url(tmp_path):
+    return f"sqlite+aiosqlite:///{tmp_path}/migrate.db"
+
+
+def _schema(sync_conn) -> dict:
+    inspector = inspect(sync_conn)
+    return {
+        table: (
+            sorted((column["name"], str(column["type"]), column["nullable"]) for column in inspector.get_columns(table)),
+            sorted((index["name"], tuple(index["column_names"]), bool(index["unique"]))
+                   for index in inspector.get_indexes(table)),
+        )
+        for table in inspector.get_table_names() if table != "schema_version"
+    }
+
+
+def _indexes(sync_conn) -> dict:
+    return {table: indexes for table, (_, indexes) in _schema(sync_conn).items()}
+
+
+@pytest.mark.asyncio
+async def test_upgrade_from_empty_and_rerun(sqlite_url):
+    engine = create_async_engine(sqlite_url)
+    try:
+        assert await current_version(engine) == 0
+        applied = await upgrade(engine)
+        assert applied == [number for number, _ in available_migrations()]
+        assert await current_version(engine) == LATEST_VERSION
+        # Повторный запуск ничего не применяет
+        assert await upgrade(engine) == []
+        async with engine.connect() as conn:
+            versions = (await conn.execute(select(schema_version.c.version))).scalars().all()
+        assert versions == applied
+    finally:
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_upgrade_step_by_step(sqlite_url):
+    engine = create_async_engine(sqlite_url)
+    try:
+        assert await upgrade(engine, target=1) == [1]
+        assert await current_version(engine) == 1
+        assert await upgrade(engine) == [number for number, _ in available_migrations() if number > 1]
+    finally:
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_migrated_schema_matches_models(sqlite_url, tmp_path):
+    # Миграции заморожены (свои определения таблиц), поэтому сверяем их результат с текущими моделями
+    migrated = create_async_engine(sqlite_url)
+    from_models = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/models.db")
+    try:
+        await upgrade(migrated)
+        async with from_models.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with migrated.connect() as conn:
+            migrated_schema = await conn.run_sync(_schema)
+        async with from_models.connect() as conn:
+            models_schema = await conn.run_sync(_schema)
+        assert migrated_schema == models_schema
+    finally:
+        await migrated.dispose()
+        await from_models.dispose()
+
+
+@pytest.mark.asyncio
+async def test_upgrade_baseline_database(sqlite_url, tmp_path):
+    # База, созданная create_all до миграций: после upgrade те же индексы, что у моделей
+    baseline = create_async_engine(sqlite_url)
+    from_models = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/models.db")
+    try:
+        async with baseline.begin() as conn:
+            for statement in BASELINE_SCHEMA:
+                await conn.execute(text(statement))
+        await upgrade(baseline)
+        async with from_models.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with baseline.connect() as conn:
+            upgraded = await conn.run_sync(_indexes)
+        async with from_models.connect() as conn:
+            expected = await conn.run_sync(_indexes)
+        assert upgraded == expected
+    finally:
+        await baseline.dispose()
+        await from_models.dispose()
+
+
+@pytest.mark.asyncio
+async def test_check_schema(sqlite_url, monkeypatch):
+    engine = create_async_engine(sqlite_url)
+    try:
+        monkeypatch.setattr(migrate, "SCHEMA_CHECK", "strict")
+        with pytest.raises(RuntimeError, match="expected"):
+            await check_schema(engine)
+        monkeypatch.setattr(migrate, "SCHEMA_CHECK", "warn")
+        assert await check_schema(engine) == 0
+        monkeypatch.setattr(migrate, "AUTO_MIGRATE", True)
+        assert await check_schema(engine) == LATEST_VERSION
+    finally:
+        await engine.dispose()
@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import OfferPriceHistory
+from price_history import downsampled_history, drop_expired_history
+
+T0 = datetime(2030, 1, 1, tzinfo=timezone.utc)
+
+
+async def _add_points(engine, points: list[tuple[int, float, float]]):
+    async with AsyncSession(engine) as db:
+        await db.execute(insert(OfferPriceHistory), [
+            {"offer_id": offer_id, "ts": T0 + timedelta(seconds=offset), "price": price}
+            for offer_id, offset, price in points
+        ])
+        await db.commit()
+
+
+@pytest.mark.asyncio
+async def test_downsampling_buckets(engine):
+    await _add_points(engine, [
+        (1, 0, 100.0), (1, 4, 80.0), (1, 9, 90.0),  # интервал 0
+        (1, 25, 70.0),                               # интервал 2
+        (1, 99, 60.0),                               # интервал 9
+        (1, 100, 1.0),                               # за пределами [since, until)
+        (2, 5, 5.0),                                 # другое предложение
+    ])
+    async with AsyncSession(engine) as db:
+        width, history = await downsampled_history(db, 1, T0, T0 + timedelta(seconds=100), points=10)
+    assert width == 10
+    assert history == [
+        {"ts": T0, "min": 80.0, "max": 100.0, "last": 90.0, "count": 3},
+        {"ts": T0 + timedelta(seconds=20), "min": 70.0, "max": 70.0, "last": 70.0, "count": 1},
+        {"ts": T0 + timedelta(seconds=90), "min": 60.0, "max": 60.0, "last": 60.0, "count": 1},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_downsampling_never_exceeds_points(engine):
+    await _add_points(engine, [(1, offset, float(offset)) for offset in range(0, 1000, 3)])
+    since = T0 + timedelta(milliseconds=300)
+    until = T0 + timedelta(seconds=999, milliseconds=700)
+    async with AsyncSession(engine) as db:
+        for points in (1, 7, 100, 1000):
+            width, history = await downsampled_history(db, 1, since, until, points)
+            assert len(history) <= points
+            assert sum(bucket["count"] for bucket in history) == 333
+            assert history[-1]["last"] == 999.0
+
+
+@pytest.mark.asyncio
+async def test_drop_expired_history(engine):
+    await _add_points(engine, [(1, 0, 1.0), (1, 86400 * 10, 2.0)])
+    async with engine.begin() as conn:
+        dropped = await drop_expired_history(conn, now=T0 + timedelta(days=12), retention_days=5)
+    assert dropped == 1
+    async with AsyncSession(engine) as db:
+        _, history = await downsampled_history(db, 1, T0, T0 + timedelta(days=30), points=10)
+    assert [bucket["last"] for bucket in history] == [2.0]
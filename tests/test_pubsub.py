@@ -0,0 +1,36 @@
+import asyncio
+
+import pytest
+
+import pubsub
+from pubsub import InMemoryPriceBus
+
+
+@pytest.mark.asyncio
+async def test_publish_reaches_every_listener():
+    bus = InMemoryPriceBus()
+    first, second = bus.listen(), bus.listen()
+    # Подписка регистрируется при первом шаге генератора
+    pending = [asyncio.create_task(anext(first)), asyncio.create_task(anext(second))]
+    await asyncio.sleep(0)
+    await bus.publish([{"offer_id": 1, "price": 10.0}, {"offer_id": 2, "price": 20.0}])
+    assert [await task for task in pending] == [{"offer_id": 1, "price": 10.0}] * 2
+    assert await anext(first) == {"offer_id": 2, "price": 20.0}
+    await first.aclose()
+    await second.aclose()
+    assert not bus._listeners
+
+
+@pytest.mark.asyncio
+async def test_active_offers_expire(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(pubsub.time, "monotonic", lambda: now[0])
+    bus = InMemoryPriceBus(active_ttl=10)
+    await bus.announce([1, 2])
+    now[0] += 5
+    await bus.announce([2, 3])
+    assert sorted(await bus.active_offers()) == [1, 2, 3]
+    now[0] += 6
+    assert sorted(await bus.active_offers()) == [2, 3]
+    now[0] += 5
+    assert await bus.active_offers() == []
@@ -0,0 +1,57 @@
+import pytest
+
+from quotes import QuoteError, issue_quote, verify_quote
+
+NOW = 1_900_000_000
+
+
+def test_valid_quote():
+    quote = issue_quote(7, 123.456, ttl=30, now=NOW)
+    assert quote.price == 123.46
+    assert verify_quote(quote.token, 7, now=NOW + 30) == 123.46
+
+
+@pytest.mark.parametrize("tamper", [
+    lambda token: token.replace(".12346.", ".100.", 1),    # другая цена
+    lambda token: token[:-1] + ("A" if token[-1] != "A" else "B"),  # другая подпись
+    lambda token: token.rsplit(".", 1)[0] + ".",           # без подписи
+])
+def test_tampered_quote(tamper):
+    token = issue_quote(7, 123.456, ttl=30, now=NOW).token
+    with pytest.raises(QuoteError, match="signature"):
+        verify_quote(tamper(token), 7, now=NOW)
+
+
+def test_expired_quote():
+    token = issue_quote(7, 100.0, ttl=30, now=NOW).token
+    with pytest.raises(QuoteError, match="expired"):
+        verify_quote(token, 7, now=NOW + 31)
+
+
+def test_quote_for_another_offer():
+    token = issue_quote(7, 100.0, ttl=30, now=NOW).token
+    with pytest.raises(QuoteError, match="another offer"):
+        verify_quote(token, 8, now=NOW)
+
+
+@pytest.mark.parametrize("token", ["garbage", "1.2.3", "a.b.c.d", "7.100.1900000030.подпись", "7.100.1900000030.\udc80"])
+def test_malformed_or_non_ascii_quote(token):
+    with pytest.raises(QuoteError):
+        verify_quote(token, 7, now=NOW)
+
+
+def test_book_with_non_ascii_quote_is_rejected(client, offers):
+    offer_id = offers["offer_ids"][0]
+    response = client.post(f"/api/hotels/rooms/offers/{offer_id}/book", headers=offers["headers"],
+                           params={"quote": f"{offer_id}.10000.{NOW}.подпись"})
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Invalid price quote signature"}
+
+
+def test_book_with_quote(client, offers):
+    offer_id = offers["offer_ids"][0]
+    token = issue_quote(offer_id, 99.9).token
+    response = client.post(f"/api/hotels/rooms/offers/{offer_id}/book", headers=offers["headers"],
+                           params={"quote": token})
+    assert response.status_code == 200
+    assert response.json()["booked_price"] == 99.9
@@ -0,0 +1,75 @@
+import pytest
+
+import ratelimit
+from ratelimit import Limit, MemoryRateLimitStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(ratelimit.time, "monotonic", clock)
+    return clock
+
+
+@pytest.mark.asyncio
+async def test_burst_then_refill(clock):
+    store = MemoryRateLimitStore()
+    limit = Limit(rate=2, burst=3)
+    for _ in range(3):
+        assert await store.take([("client", limit)]) is None
+    index, retry_after = await store.take([("client", limit)])
+    assert index == 0
+    assert retry_after == pytest.approx(0.5)
+    clock.now += 0.5
+    assert await store.take([("client", limit)]) is None
+    # Корзина не наполняется больше burst
+    clock.now += 100
+    for _ in range(3):
+        assert await store.take([("client", limit)]) is None
+    assert await store.take([("client", limit)]) is not None
+
+
+@pytest.mark.asyncio
+async def test_take_is_all_or_nothing(clock):
+    store = MemoryRateLimitStore()
+    roomy, tight = Limit(rate=1, burst=10), Limit(rate=1, burst=1)
+    assert await store.take([("client", roomy), ("offer", tight)]) is None
+    rejected = await store.take([("client", roomy), ("offer", tight)])
+    assert rejected is not None and rejected[0] == 1
+    # Отказ по второй корзине не списал токен из первой: осталось 9 из 10
+    for _ in range(9):
+        assert await store.take([("client", roomy)]) is None
+    assert await store.take([("client", roomy)]) is not None
+
+
+@pytest.mark.asyncio
+async def test_evicted_bucket_starts_full(clock):
+    store = MemoryRateLimitStore(maxsize=2)
+    limit = Limit(rate=1, burst=1)
+    assert await store.take([("a", limit)]) is None
+    assert await store.take([("a", limit)]) is not None
+    await store.take([("b", limit)])
+    await store.take([("c", limit)])
+    assert await store.take([("a", limit)]) is None
+
+
+@pytest.mark.parametrize("rate, burst", [(0, 10), (-1, 10), (float("inf"), 10), (float("nan"), 10), (1, 0)])
+def test_invalid_limit(rate, burst):
+    with pytest.raises(ValueError):
+        Limit(rate, burst)
+
+
+def test_limit_from_env(monkeypatch):
+    monkeypatch.setenv("TEST_LIMIT", "0.5:5")
+    assert Limit.from_env("TEST_LIMIT", "1:1") == Limit(0.5, 5)
+    monkeypatch.setenv("TEST_LIMIT", "5")
+    with pytest.raises(ValueError, match="TEST_LIMIT"):
+        Limit.from_env("TEST_LIMIT", "1:1")
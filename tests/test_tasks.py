@@ -0,0 +1,81 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import delete, func, select, update
+
+import tasks
+from database import AsyncSessionLocal, engine
+from leaderboard import leaderboard
+from migrate import upgrade
+from models import Hotel, OfferPriceHistory, Room, RoomOffer, User
+
+
+async def _seed() -> list[int]:
+    await upgrade(engine)
+    async with AsyncSessionLocal() as db:
+        for model in (OfferPriceHistory, RoomOffer, Room, Hotel, User):
+            await db.execute(delete(model))
+        user = User(email="owner@example.com", hashed_password="x", role="business")
+        db.add(user)
+        await db.flush()
+        hotel = Hotel(name="H", address="A", owner_id=user.id)
+        db.add(hotel)
+        await db.flush()
+        room = Room(hotel_id=hotel.id, room_number="101", room_type="single")
+        db.add(room)
+        await db.flush()
+        # Созданы давно: динамическая цена отличается от начальной
+        created_at = datetime.now(timezone.utc) - timedelta(days=30)
+        offers = [
+            RoomOffer(room_id=room.id, start_date=created_at, end_date=created_at + timedelta(days=60),
+                      initial_price=100.0 + i, current_price=100.0 + i, min_price=50.0, popularity_factor=1.0,
+                      available=0 if i == 2 else 1, created_at=created_at)
+            for i in range(5)
+        ]
+        db.add_all(offers)
+        await db.commit()
+        ids = [offer.id for offer in offers]
+    await engine.dispose()
+    return ids
+
+
+async def _query(statement):
+    async with AsyncSessionLocal() as db:
+        result = (await db.execute(statement)).all()
+        await db.commit()
+    await engine.dispose()
+    return result
+
+
+@pytest.fixture
+def offer_ids():
+    return asyncio.run(_seed())
+
+
+def test_eager_repricing_updates_prices_history_and_leaderboard(offer_ids):
+    # Celery в режиме eager: координатор, шарды chord-а и завершение выполняются в этом процессе
+    assert tasks.update_all_offers.delay().get() == {"shards": 2}
+
+    prices = dict(asyncio.run(_query(select(RoomOffer.id, RoomOffer.current_price))))
+    assert all(prices[offer_id] < 100.0 + i for i, offer_id in enumerate(offer_ids))
+    history = asyncio.run(_query(select(func.count()).select_from(OfferPriceHistory)))
+    assert history[0][0] == len(offer_ids)
+
+    # Рейтинг построен координатором; распроданное предложение в него не входит
+    top = asyncio.run(leaderboard.top("cheapest", None, 10))
+    assert sorted(entry["offer_id"] for entry in top) == sorted(offer_ids[:2] + offer_ids[3:])
+
+    # Снова в продаже с той же ценой: следующий пересчёт добавляет его в рейтинг
+    asyncio.run(_query(update(RoomOffer).where(RoomOffer.id == offer_ids[2]).values(available=1)
+                       .returning(RoomOffer.id)))
+    tasks.update_all_offers.delay().get()
+    top = asyncio.run(leaderboard.top("cheapest", None, 10))
+    assert offer_ids[2] in [entry["offer_id"] for entry in top]
+    # Блокировка от наложения запусков снята
+    token = tasks.repricing_lock.acquire()
+    try:
+        assert token is not None
+    finally:
+        if token is not None:
+            tasks.repricing_lock.release(token)
@@ -0,0 +1,101 @@
+import math
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from view_buffer import ViewEventBuffer
+
+
+class _RecordingBuffer(ViewEventBuffer):
+    # Запись пакета подменена: пакеты запоминаются, ошибки задаются функцией fail(batch)
+    def __init__(self, fail=lambda batch: None, **kwargs):
+        super().__init__(**kwargs)
+        self.batches = []
+        self._fail = fail
+
+    async def _write(self, batch):
+        self._fail(batch)
+        self.batches.append([offer_id for offer_id, _ in batch])
+
+
+@pytest.mark.asyncio
+async def test_flush_writes_in_batches():
+    buffer = _RecordingBuffer(max_batch=2)
+    for offer_id in (1, 1, 2, 3, 3):
+        buffer.record(offer_id)
+    assert buffer.unwritten_views(1) == 2
+
+    assert await buffer.flush() == 5
+    assert buffer.batches == [[1, 1], [2, 3], [3]]
+    assert buffer.pending == 0 and buffer.flushed == 5
+    assert buffer.unwritten_views(1) == 0
+
+
+@pytest.mark.asyncio
+async def test_transient_error_retries_the_same_batch():
+    failures = [OperationalError("INSERT INTO offer_views", {}, Exception("connection refused"))]
+
+    def fail(batch):
+        if failures:
+            raise failures.pop()
+
+    buffer = _RecordingBuffer(fail, max_batch=10)
+    buffer.record(1)
+    buffer.record(2)
+    with pytest.raises(OperationalError):
+        await buffer.flush()
+    # Пакет не потерян и по-прежнему учитывается в ответах record_offer_view
+    assert buffer.pending == 2 and buffer.unwritten_views(1) == 1
+
+    assert await buffer.flush() == 2
+    assert buffer.batches == [[1, 2]]
+    assert buffer.rejected == 0 and buffer.unwritten_views(1) == 0
+
+
+@pytest.mark.asyncio
+async def test_rejected_event_is_isolated():
+    # Событие для удалённого предложения (нарушение FK) отбрасывается, остальные события пакета записываются
+    def fail(batch):
+        if any(offer_id == 13 for offer_id, _ in batch):
+            raise IntegrityError("INSERT INTO offer_views", {}, Exception("FOREIGN KEY constraint failed"))
+
+    buffer = _RecordingBuffer(fail, max_batch=10)
+    for offer_id in (1, 2, 13, 3, 4):
+        buffer.record(offer_id)
+
+    assert await buffer.flush() == 4
+    assert sorted(offer_id for batch in buffer.batches for offer_id in batch) == [1, 2, 3, 4]
+    assert buffer.rejected == 1 and buffer.pending == 0
+    assert buffer.unwritten_views(13) == 0
+
+
+async def _flush_and_read(buffer: ViewEventBuffer, offer_id: int):
+    from database import AsyncSessionLocal
+    from models import OfferView, RoomOffer
+
+    await buffer.flush()
+    async with AsyncSessionLocal() as db:
+        views = await db.scalar(select(func.count()).select_from(OfferView).where(OfferView.offer_id == offer_id))
+        popularity = await db.scalar(select(RoomOffer.popularity_factor).where(RoomOffer.id == offer_id))
+    return views, popularity
+
+
+def test_flush_updates_popularity_like_repricing(client, offers):
+    # Буфер и пересчёт цен считают popularity_factor по одной формуле: log(просмотры + 1), не больше 5
+    offer_id = offers["offer_ids"][0]
+    buffer = ViewEventBuffer()
+    for _ in range(3):
+        buffer.record(offer_id)
+
+    views, popularity = client.portal.call(_flush_and_read, buffer, offer_id)
+    assert views == 3
+    assert popularity == pytest.approx(math.log(4))
+
+
+def test_view_response_uses_the_same_formula(client, offers):
+    offer_id = offers["offer_ids"][1]
+    response = client.post(f"/api/hotels/rooms/offers/{offer_id}/view")
+    assert response.status_code == 200
+    body = response.json()
+    assert body["new_popularity"] == pytest.approx(math.log(body["view_count"] + 1))
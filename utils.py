@@ -7,6 +7,12 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from database import get_db
 from models import User
+from cache import TTLCache
+from metrics import Counter, Gauge
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+import asyncio
+import time
 from dotenv import load_dotenv
 import os
 
@@ -20,9 +26,57 @@ if not SECRET_KEY:
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# Кэш пользователей по subject токена (email)
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "60"))
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+# Доверять id и роли из claims токена без обращения к БД.
+# Изменение роли тогда вступает в силу только с новым токеном (не дольше ACCESS_TOKEN_EXPIRE_MINUTES)
+AUTH_TRUST_TOKEN_CLAIMS = os.getenv("AUTH_TRUST_TOKEN_CLAIMS", "false").lower() in ("1", "true", "yes")
+
+# Пул потоков для bcrypt: хеширование не блокирует event loop (bcrypt отпускает GIL).
+# PASSWORD_HASH_WORKERS=0 — считать прямо в event loop, как раньше
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "4"))
+# Сколько операций может ждать свободный поток; сверх лимита — 503 (0 — без ограничения)
+PASSWORD_QUEUE_LIMIT = int(os.getenv("PASSWORD_QUEUE_LIMIT", "256"))
+
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 bearer_scheme = HTTPBearer()
 
+_password_executor = (
+    ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+    if PASSWORD_HASH_WORKERS > 0 else None
+)
+password_jobs_in_flight = Gauge(
+    "password_jobs_in_flight", "Password hash/verify jobs submitted to the pool and not finished yet"
+)
+password_jobs_running = Gauge("password_jobs_running", "Password hash/verify jobs currently running")
+# Ожидающие = отправленные − выполняемые; считается при выдаче метрик
+password_queue_depth = Gauge(
+    "password_queue_depth", "Password hash/verify jobs waiting for a worker",
+    callback=lambda: password_jobs_in_flight.value() - password_jobs_running.value()
+)
+password_jobs = Counter("password_jobs_total", "Password hash/verify jobs by operation", ("operation",))
+password_job_seconds = Counter(
+    "password_job_seconds_total", "Time spent hashing and verifying passwords", ("operation",)
+)
+password_jobs_rejected = Counter("password_jobs_rejected_total", "Password jobs rejected because the queue was full")
+
+
+@dataclass(frozen=True)
+class AuthenticatedUser:
+    # Данные текущего пользователя, которых достаточно обработчикам (без ORM-сессии)
+    id: int
+    email: str
+    role: str
+
+
+_user_cache = TTLCache(maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL_SECONDS)
+
+
+def invalidate_user_cache(email: str) -> None:
+    # Вызывать при любом изменении пользователя (роль, email, удаление)
+    _user_cache.delete(email)
+
 
 def hash_password(password: str) -> str:
     return pwd_context.hash(password)
@@ -32,6 +86,44 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+def _timed_password_job(operation: str, func, *args):
+    password_jobs_running.inc()
+    started = time.perf_counter()
+    try:
+        return func(*args)
+    finally:
+        password_jobs_running.dec()
+        password_jobs.inc(operation=operation)
+        password_job_seconds.inc(time.perf_counter() - started, operation=operation)
+
+
+async def _run_password_job(operation: str, func, *args):
+    if _password_executor is None:
+        return _timed_password_job(operation, func, *args)
+    waiting = password_jobs_in_flight.value() - password_jobs_running.value()
+    if PASSWORD_QUEUE_LIMIT and waiting >= PASSWORD_QUEUE_LIMIT:
+        password_jobs_rejected.inc()
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Server is busy, try again later")
+    password_jobs_in_flight.inc()
+    try:
+        future = _password_executor.submit(_timed_password_job, operation, func, *args)
+    except BaseException:
+        password_jobs_in_flight.dec()
+        raise
+    # Счётчик уменьшается, когда задача завершилась или отменена до старта: если клиент отключился,
+    # отмена await отменяет и ещё не начатую задачу в пуле (wrap_future), и счётчик не «утекает»
+    future.add_done_callback(lambda _: password_jobs_in_flight.dec())
+    return await asyncio.wrap_future(future)
+
+
+async def hash_password_async(password: str) -> str:
+    return await _run_password_job("hash", hash_password, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run_password_job("verify", verify_password, plain_password, hashed_password)
+
+
 def create_access_token(data: dict) -> str:
     to_encode = data.copy()
     expire = datetime.now(UTC) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -57,8 +149,17 @@ async def get_current_user(
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    result = await db.execute(select(User).filter(User.email == email))
-    user = result.scalar_one_or_none()
-    if user is None:
+
+    if AUTH_TRUST_TOKEN_CLAIMS and "uid" in payload and "role" in payload:
+        return AuthenticatedUser(id=payload["uid"], email=email, role=payload["role"])
+
+    user = _user_cache.get(email)
+    if user is not None:
+        return user
+    result = await db.execute(select(User.id, User.email, User.role).filter(User.email == email))
+    row = result.one_or_none()
+    if row is None:
         raise credentials_exception
+    user = AuthenticatedUser(id=row.id, email=row.email, role=row.role)
+    _user_cache.set(email, user)
     return user
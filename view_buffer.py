@@ -0,0 +1,167 @@
+import asyncio
+import logging
+import os
+from collections import Counter
+from datetime import datetime, timezone
+
+from sqlalchemy import insert, update
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from database import get_db_session
+from models import OfferView, RoomOffer
+from pricing import popularity_from_views
+from rollups import add_views, windowed_view_counts
+
+logger = logging.getLogger(__name__)
+
+# Пакет сбрасывается, когда набралось столько событий...
+VIEW_BUFFER_MAX_BATCH = int(os.getenv("VIEW_BUFFER_MAX_BATCH", "500"))
+# ...или прошло столько секунд
+VIEW_BUFFER_FLUSH_SECONDS = float(os.getenv("VIEW_BUFFER_FLUSH_SECONDS", "1"))
+# Верхняя граница буфера: при недоступной БД теряем не больше стольких самых старых событий
+VIEW_BUFFER_MAX_PENDING = int(os.getenv("VIEW_BUFFER_MAX_PENDING", "100000"))
+
+
+def _is_transient(error: Exception) -> bool:
+    # Недоступность БД: пакет повторяется целиком. Прочие ошибки (нарушение FK для удалённого предложения,
+    # неверные данные) не пройдут и при повторе
+    if isinstance(error, DBAPIError):
+        return error.connection_invalidated or isinstance(error, (OperationalError, InterfaceError))
+    return isinstance(error, (OSError, PoolTimeoutError, asyncio.TimeoutError))
+
+
+class ViewEventBuffer:
+    # Буфер просмотров: запросы только добавляют событие в память,
+    # запись в offer_views и пересчёт popularity_factor идут пакетами в фоне
+
+    def __init__(self, max_batch: int = VIEW_BUFFER_MAX_BATCH,
+                 flush_interval: float = VIEW_BUFFER_FLUSH_SECONDS,
+                 max_pending: int = VIEW_BUFFER_MAX_PENDING):
+        self._max_batch = max_batch
+        self._flush_interval = flush_interval
+        self._max_pending = max_pending
+        self._pending: list[tuple[int, datetime]] = []
+        # Части пакета, отвергнутого из-за данных: пишутся по отдельности (делением пополам),
+        # пока не останутся одиночные события, которые отбрасываются
+        self._isolating: list[list[tuple[int, datetime]]] = []
+        # Ещё не записанные просмотры по предложениям (для ответа record_offer_view)
+        self._unwritten: Counter[int] = Counter()
+        self._flush_lock = asyncio.Lock()
+        self._wake: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self.flushed = 0
+        self.dropped = 0
+        self.rejected = 0
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending) + sum(len(batch) for batch in self._isolating)
+
+    def unwritten_views(self, offer_id: int) -> int:
+        return self._unwritten[offer_id]
+
+    def record(self, offer_id: int, timestamp: datetime | None = None) -> None:
+        self._pending.append((offer_id, timestamp or datetime.now(timezone.utc)))
+        self._unwritten[offer_id] += 1
+        self._trim()
+        if len(self._pending) >= self._max_batch and self._wake is not None:
+            self._wake.set()
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        # Вызывается из lifespan: останавливаем фоновый цикл и сбрасываем остаток
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception(f"Final view buffer flush failed, {self.pending} events lost")
+
+    async def flush(self) -> int:
+        written = 0
+        async with self._flush_lock:
+            while self._isolating or self._pending:
+                if self._isolating:
+                    batch = self._isolating.pop()
+                else:
+                    batch = self._pending[:self._max_batch]
+                    del self._pending[:len(batch)]
+                try:
+                    await self._write(batch)
+                except Exception as error:
+                    if _is_transient(error):
+                        # Повторим этот же пакет на следующем сбросе
+                        self._isolating.append(batch)
+                        raise
+                    if len(batch) == 1:
+                        self._forget(batch)
+                        self.rejected += 1
+                        logger.exception(f"View event for offer_id {batch[0][0]} rejected, dropping it")
+                    else:
+                        # Первая половина — последней в стеке, пишется первой
+                        middle = len(batch) // 2
+                        self._isolating += [batch[middle:], batch[:middle]]
+                        logger.warning(f"View batch of {len(batch)} events rejected ({error!r}), splitting it")
+                    continue
+                self._forget(batch)
+                written += len(batch)
+                self.flushed += len(batch)
+        return written
+
+    def _forget(self, events: list[tuple[int, datetime]]) -> None:
+        for offer_id, _ in events:
+            self._unwritten[offer_id] -= 1
+            if self._unwritten[offer_id] <= 0:
+                del self._unwritten[offer_id]
+
+    def _trim(self) -> None:
+        overflow = len(self._pending) - self._max_pending
+        if overflow > 0:
+            self._forget(self._pending[:overflow])
+            del self._pending[:overflow]
+            self.dropped += overflow
+            logger.warning(f"View buffer overflow: dropped {overflow} oldest view events")
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self._flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception(f"View buffer flush failed, {self.pending} events pending")
+
+    async def _write(self, batch: list[tuple[int, datetime]]) -> None:
+        offer_ids = {offer_id for offer_id, _ in batch}
+        async with get_db_session() as db:
+            # Один многострочный INSERT на пакет
+            await db.execute(
+                insert(OfferView).values([
+                    {"offer_id": offer_id, "timestamp": timestamp} for offer_id, timestamp in batch
+                ])
+            )
+            # Агрегаты по интервалам обновляются в той же транзакции
+            await add_views(db, batch)
+            # Пересчёт popularity_factor только для затронутых предложений, по той же формуле, что и пересчёт цен
+            view_counts = await windowed_view_counts(db, offer_ids)
+            ids = sorted(offer_ids)
+            popularity = popularity_from_views([view_counts.get(offer_id, 0) for offer_id in ids])
+            await db.execute(
+                update(RoomOffer),
+                [{"id": offer_id, "popularity_factor": float(value)} for offer_id, value in zip(ids, popularity)]
+            )
+            await db.commit()
+        logger.info(f"Flushed {len(batch)} view events for {len(offer_ids)} offers")
+
+
+view_buffer = ViewEventBuffer()